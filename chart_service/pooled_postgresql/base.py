@@ -0,0 +1,41 @@
+"""
+Бэкенд PostgreSQL с пулом соединений внутри процесса.
+
+Соединение берется из пула при первом запросе к БД и возвращается в пул
+вместо закрытия в конце HTTP-запроса (CONN_MAX_AGE = 0). Работает одинаково
+для WSGI и ASGI: у каждого потока свое соединение Django, а пул общий для
+всех потоков процесса. Параметры пула задаются в OPTIONS['pool'].
+"""
+import atexit
+from functools import partial
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base
+
+from .pool import close_pools, get_pool
+
+
+atexit.register(close_pools)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        if self.settings_dict['CONN_MAX_AGE'] != 0:
+            raise ImproperlyConfigured('Пул соединений требует CONN_MAX_AGE = 0.')
+        conn_params = super().get_connection_params()
+        # Параметры пула не передаются в psycopg2.connect()
+        conn_params.pop('pool', None)
+        return conn_params
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict['OPTIONS'].get('pool', {}))
+
+    def get_new_connection(self, conn_params):
+        return self.pool.getconn(partial(super().get_new_connection, conn_params))
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.putconn(self.connection)
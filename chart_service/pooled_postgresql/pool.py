@@ -0,0 +1,166 @@
+"""
+Потокобезопасный пул соединений psycopg2 с ограничением размера,
+проверкой соединения при выдаче и максимальным временем жизни.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """Свободное соединение не появилось за отведенное время"""
+
+
+class ConnectionPool:
+    """
+    Пул соединений одной базы данных.
+
+    max_size - максимум открытых соединений (выданных и свободных);
+    timeout - сколько секунд ждать свободного соединения;
+    max_lifetime - через сколько секунд соединение закрывается вместо возврата в пул;
+    health_checks - проверять соединение запросом SELECT 1 перед выдачей.
+    """
+
+    def __init__(self, max_size=10, timeout=10, max_lifetime=1800, health_checks=True):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_checks = health_checks
+        self._idle = deque()
+        # Время открытия соединений (выданных и свободных)
+        self._created = {}
+        self._condition = threading.Condition()
+
+    @property
+    def size(self):
+        """Число открытых соединений"""
+        with self._condition:
+            return len(self._created)
+
+    def stats(self):
+        with self._condition:
+            return {'size': len(self._created), 'idle': len(self._idle), 'max_size': self.max_size}
+
+    def getconn(self, connect):
+        """Свободное соединение пула или новое, открытое функцией connect()"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._condition:
+                while not self._idle and len(self._created) >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(
+                            f'Нет свободных соединений в пуле ({self.max_size}) за {self.timeout} с'
+                        )
+                    self._condition.wait(remaining)
+                conn = self._idle.pop() if self._idle else None
+                if conn is None:
+                    # Место под новое соединение резервируется до подключения, чтобы не превысить max_size
+                    reserved = object()
+                    self._created[reserved] = None
+            if conn is None:
+                return self._open(connect, reserved)
+            if self._usable(conn):
+                return conn
+            self._discard(conn)
+
+    def putconn(self, conn):
+        """Возвращает соединение в пул; сломанное или устаревшее соединение закрывается"""
+        if self._reset(conn) and not self._expired(conn):
+            with self._condition:
+                self._idle.append(conn)
+                self._condition.notify()
+        else:
+            self._discard(conn)
+
+    def closeall(self):
+        """Закрывает свободные соединения; выданные закроются при возврате"""
+        with self._condition:
+            idle, self._idle = list(self._idle), deque()
+        for conn in idle:
+            self._discard(conn)
+
+    def _open(self, connect, reserved):
+        try:
+            conn = connect()
+        except BaseException:
+            with self._condition:
+                del self._created[reserved]
+                self._condition.notify()
+            raise
+        with self._condition:
+            del self._created[reserved]
+            self._created[conn] = time.monotonic()
+        return conn
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._condition:
+            self._created.pop(conn, None)
+            self._condition.notify()
+
+    def _expired(self, conn):
+        with self._condition:
+            created_at = self._created.get(conn)
+        return created_at is None or (
+            self.max_lifetime and time.monotonic() - created_at > self.max_lifetime
+        )
+
+    def _usable(self, conn):
+        if conn.closed or self._expired(conn):
+            return False
+        if not self.health_checks:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if not conn.autocommit:
+                conn.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def _reset(self, conn):
+        """Откатывает незавершенную транзакцию; False, если соединение непригодно"""
+        if conn.closed:
+            return False
+        status = conn.info.transaction_status
+        if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if status != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                return False
+        return True
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, options):
+    """
+    Пул для псевдонима базы данных.
+    Пулы не переходят в дочерние процессы после fork (gunicorn --preload и т.п.).
+    """
+    key = (os.getpid(), alias)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(**options)
+        return pool
+
+
+def close_pools():
+    with _pools_lock:
+        pools = [pool for (pid, _), pool in _pools.items() if pid == os.getpid()]
+    for pool in pools:
+        pool.closeall()
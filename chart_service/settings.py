@@ -1,5 +1,7 @@
 from pathlib import Path
-from decouple import config
+import copy
+
+from decouple import Csv, config
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -19,10 +21,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'sales.metrics.QueryMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'sales.routing.ReadYourWritesMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -55,9 +59,80 @@ DATABASES = {
         'PASSWORD': config('DB_PASSWORD', default='postgres'),
         'HOST': config('DB_HOST', default='localhost'),
         'PORT': config('DB_PORT', default='5432'),
+        # Постоянные соединения (по умолчанию выключены): соединение держит каждый поток, в ASGI -
+        # каждый поток sync_to_async, и число соединений растет с размером пула потоков.
+        # Для переиспользования соединений предназначен DB_POOL
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=0, cast=int),
+        'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
+    }
+}
+
+# Пул соединений общий для всех потоков процесса (WSGI и ASGI): соединение
+# берется из пула на время запроса и возвращается в него вместо закрытия
+if config('DB_POOL', default=False, cast=bool):
+    DATABASES['default'].update({
+        'ENGINE': 'chart_service.pooled_postgresql',
+        'CONN_MAX_AGE': 0,
+        'OPTIONS': {
+            'pool': {
+                'max_size': config('DB_POOL_MAX_SIZE', default=20, cast=int),
+                'timeout': config('DB_POOL_TIMEOUT', default=10, cast=float),
+                'max_lifetime': config('DB_POOL_MAX_LIFETIME', default=1800, cast=int),
+                'health_checks': config('DB_POOL_HEALTH_CHECKS', default=True, cast=bool),
+            },
+        },
+    })
+
+# Реплики только для чтения: "хост[:порт][/база]" через запятую. Диаграммы и таблица
+# читаются с реплик (sales/routing.py). Для локальной проверки репликой может быть
+# вторая база на том же сервере, например DB_REPLICAS=localhost/sales_charts_replica
+DATABASE_REPLICAS = []
+for index, replica in enumerate(config('DB_REPLICAS', default='', cast=Csv()), start=1):
+    address, _, name = replica.partition('/')
+    host, _, port = address.partition(':')
+    alias = f'replica{index}'
+    DATABASES[alias] = copy.deepcopy(DATABASES['default'])
+    DATABASES[alias].update({
+        'HOST': host or DATABASES['default']['HOST'],
+        'PORT': port or DATABASES['default']['PORT'],
+        'NAME': name or DATABASES['default']['NAME'],
+        # В тестах реплика - та же тестовая база
+        'TEST': {'MIRROR': 'default'},
+    })
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['sales.routing.ReplicaRouter']
+# Реплика с отставанием больше стольких секунд не используется
+REPLICA_MAX_LAG = config('DB_REPLICA_MAX_LAG', default=5, cast=float)
+# Как часто проверять отставание реплик, секунд
+REPLICA_CHECK_INTERVAL = config('DB_REPLICA_CHECK_INTERVAL', default=5, cast=float)
+# Сколько секунд после записи пользователь читает из основной базы
+REPLICA_STICKY_SECONDS = config('DB_REPLICA_STICKY_SECONDS', default=10, cast=int)
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
     }
 }
 
+# Кэш ответов API диаграмм: 'lru' - в памяти процесса, 'django' - через CACHES (общий для процессов)
+CHART_CACHE_BACKEND = config('CHART_CACHE_BACKEND', default='lru')
+CHART_CACHE_SIZE = config('CHART_CACHE_SIZE', default=256, cast=int)
+CHART_CACHE_ALIAS = config('CHART_CACHE_ALIAS', default='default')
+CHART_CACHE_TIMEOUT = config('CHART_CACHE_TIMEOUT', default=3600, cast=int)
+
+# Аналитические представления PostgreSQL обновляются автоматически после стольких изменений данных (0 - только командой refresh_analytics)
+ANALYTICS_REFRESH_THRESHOLD = config('ANALYTICS_REFRESH_THRESHOLD', default=500, cast=int)
+
+# Токен доступа к /metrics/ для сборщика метрик (заголовок Authorization: Bearer <токен>)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Токены загрузки данных через /api/sales/batch/ (через запятую; пусто - API отключен)
+INGEST_TOKENS = config('INGEST_TOKENS', default='', cast=lambda value: [token.strip() for token in value.split(',') if token.strip()])
+# Максимальное число записей в одном пакете
+INGEST_MAX_RECORDS = config('INGEST_MAX_RECORDS', default=5000, cast=int)
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -1,19 +1,29 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db import transaction
+from .forms import MonthlySalesForm
 from .models import MonthlySales
+from . import bulk
 
 
 @admin.register(MonthlySales)
 class MonthlySalesAdmin(admin.ModelAdmin):
-    list_display = ['year', 'get_month_display', 'product_name', 'quantity', 'revenue', 'edit_link']
-    list_filter = ['year', 'month', 'product_name']
-    search_fields = ['product_name', 'year']  # Поиск по товару и году
+    list_display = ['year', 'get_month_display', 'product', 'quantity', 'revenue', 'edit_link']
+    list_select_related = ['product']  # Названия товаров - в том же запросе, что и записи
+    # Фильтр по товару выводил бы все названия списком - товар ищется через поиск
+    list_filter = ['year', 'month']
+    search_fields = ['product__name']  # Поиск по товару (триграммный индекс products.name в PostgreSQL) и году
     ordering = ['-year', '-month']
     
-    # Поля для формы добавления/редактирования
+    # Табличное редактирование количества и выручки прямо в списке
+    list_editable = list(bulk.EDITABLE_FIELDS)
+    actions = ['bulk_delete']
+    
+    # Поля для формы добавления/редактирования; товар задается названием, как в форме сайта
+    form = MonthlySalesForm
     fields = ['year', 'month', 'product_name', 'quantity', 'revenue']
     
     # Делаем поля кликабельными для редактирования
-    list_display_links = ['year', 'get_month_display', 'product_name']
+    list_display_links = ['year', 'get_month_display', 'product']
     
     # Отображение названия месяца вместо числа в списке
     def get_month_display(self, obj):
@@ -28,3 +38,39 @@ class MonthlySalesAdmin(admin.ModelAdmin):
         url = reverse('admin:sales_monthlysales_change', args=[obj.pk])
         return format_html('<a href="{}">Изменить</a>', url)
     edit_link.short_description = 'Действия'
+    
+    def get_search_results(self, request, queryset, search_term):
+        # Год ищется точным сравнением, а не LIKE по числу, приведенному к строке
+        term = search_term.strip()
+        if term.isdigit() and len(term) == 4:
+            return queryset.filter(year=int(term)), False
+        return super().get_search_results(request, queryset, search_term)
+    
+    def get_actions(self, request):
+        # Стандартное удаление загружает записи и обновляет сводные таблицы по одной
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+    
+    @admin.action(description='Удалить выбранные записи', permissions=['delete'])
+    def bulk_delete(self, request, queryset):
+        """Удаление выбранных (или всех отфильтрованных) записей одним запросом DELETE"""
+        deleted = bulk.delete_sales(queryset)
+        self.message_user(request, f'Удалено записей: {deleted}.', messages.SUCCESS)
+    
+    def save_model(self, request, obj, form, change):
+        # При сохранении списка изменения копятся и записываются одним bulk_update
+        pending = getattr(request, '_bulk_changes', None)
+        if change and pending is not None:
+            pending[obj.pk] = {field: getattr(obj, field) for field in bulk.EDITABLE_FIELDS}
+            return
+        super().save_model(request, obj, form, change)
+    
+    def changelist_view(self, request, extra_context=None):
+        if request.method != 'POST' or '_save' not in request.POST:
+            return super().changelist_view(request, extra_context)
+        request._bulk_changes = {}
+        with transaction.atomic():
+            response = super().changelist_view(request, extra_context)
+            bulk.update_sales(request._bulk_changes)
+        return response
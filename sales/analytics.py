@@ -0,0 +1,92 @@
+"""
+Аналитические представления: выручка по кварталам, рейтинг месяцев и средние
+продажи товаров. В PostgreSQL это материализованные представления; они
+обновляются REFRESH ... CONCURRENTLY (чтение не блокируется) командой
+refresh_analytics или автоматически, когда после прошлого обновления накопилось
+ANALYTICS_REFRESH_THRESHOLD изменений данных. В остальных СУБД представления
+обычные и обновления не требуют.
+"""
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import DatasetState
+
+
+VIEWS = ('sales_quarterly_revenue', 'sales_month_revenue', 'sales_product_averages')
+
+# Ключ advisory-блокировки: одно обновление одновременно во всех процессах
+REFRESH_LOCK_ID = 0x5A1E5
+
+_refresh_thread_lock = threading.Lock()
+_writes_lock = threading.Lock()
+_writes = 0
+
+
+def is_materialized():
+    return connection.vendor == 'postgresql'
+
+
+def pending_changes():
+    """Число изменений данных после последнего обновления представлений"""
+    state = DatasetState.objects.filter(pk=1).values_list('version', 'analytics_version').first()
+    return state[0] - state[1] if state else 0
+
+
+def refresh(concurrently=True):
+    """
+    Обновляет материализованные представления.
+    Возвращает False, если обновление не требуется (не PostgreSQL)
+    или его уже выполняет другой процесс.
+    """
+    if not is_materialized():
+        return False
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_xact_lock(%s)', [REFRESH_LOCK_ID])
+        if not cursor.fetchone()[0]:
+            return False
+        # Версия до обновления: изменения во время обновления останутся в очереди
+        version = DatasetState.objects.values_list('version', flat=True).get(pk=1)
+        mode = 'CONCURRENTLY ' if concurrently else ''
+        for name in VIEWS:
+            cursor.execute(f'REFRESH MATERIALIZED VIEW {mode}{name}')
+        DatasetState.objects.filter(pk=1).update(analytics_version=version, analytics_refreshed_at=timezone.now())
+    return True
+
+
+def refresh_if_needed():
+    """Обновляет представления, если изменений накопилось не меньше порога"""
+    threshold = settings.ANALYTICS_REFRESH_THRESHOLD
+    if threshold and pending_changes() >= threshold:
+        return refresh()
+    return False
+
+
+def _refresh_in_background():
+    # Одно фоновое обновление на процесс; соединение потока закрывается по окончании
+    if not _refresh_thread_lock.acquire(blocking=False):
+        return
+    try:
+        refresh_if_needed()
+    finally:
+        connection.close()
+        _refresh_thread_lock.release()
+
+
+def _after_write():
+    # Порог проверяется по базе не после каждой записи, а после каждой десятой его части в этом процессе
+    global _writes
+    with _writes_lock:
+        _writes += 1
+        if _writes < max(1, settings.ANALYTICS_REFRESH_THRESHOLD // 10):
+            return
+        _writes = 0
+    threading.Thread(target=_refresh_in_background, name='analytics-refresh', daemon=True).start()
+
+
+def schedule_refresh():
+    """Учитывает запись данных; после фиксации транзакции при необходимости обновляет представления в фоне"""
+    if is_materialized() and settings.ANALYTICS_REFRESH_THRESHOLD:
+        transaction.on_commit(_after_write)
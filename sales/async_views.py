@@ -0,0 +1,118 @@
+"""
+Асинхронные версии API диаграмм и страницы таблицы (для запуска через ASGI).
+
+Django 4.2 выполняет асинхронные ORM-запросы последовательно в одном потоке,
+поэтому независимые запросы одного HTTP-запроса (линейный график, итоги по
+товарам, страница таблицы, списки фильтров) запускаются в отдельных потоках
+со своими соединениями и ждутся вместе через asyncio.gather.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import render
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
+
+from .filters import filter_sales, get_filters
+from .pagination import KeysetPaginator
+from . import cache, catalog, charts, formats, http, metrics, routing
+from .views import MONTHS, SALES_ORDERING, _chart_params, _filter_query, _get_keyset_page, _page_links
+
+
+def db_task(func, *args):
+    """Корутина, выполняющая func(*args) с запросами к БД в отдельном потоке"""
+    def run():
+        try:
+            with metrics.track_queries():
+                return func(*args)
+        finally:
+            # Соединение потока закрывается или переиспользуется по правилам CONN_MAX_AGE
+            close_old_connections()
+    return sync_to_async(run, thread_sensitive=False)()
+
+
+async def _not_modified(request, etag_func):
+    """Ответ 304, если If-None-Match совпадает с текущим ETag, иначе None и ETag ответа"""
+    request._dataset_state = await db_task(cache.get_state)
+    etag = quote_etag(await sync_to_async(etag_func)(request))
+    return get_conditional_response(request, etag=etag), etag
+
+
+async def _compute_chart(chart_type, year, products, series, top_n):
+    if chart_type == 'all' and not products and series == 'total' and not top_n:
+        # Помесячные итоги и итоги по товарам читаются одновременно
+        line, totals = await asyncio.gather(
+            db_task(charts.rollup_line_chart, year),
+            db_task(charts.rollup_product_totals, year),
+        )
+        bar, pie = charts.build_product_charts(totals)
+        return {'line': line, 'bar': bar, 'pie': pie}
+    return await db_task(charts.get_chart, chart_type, year, products, series, top_n)
+
+
+@routing.read_from_replica
+@http.compress_response
+async def get_chart_data(request):
+    """Асинхронный API для получения данных для диаграмм"""
+    params = _chart_params(request)
+    if isinstance(params, str):
+        return JsonResponse({'error': params}, status=400)
+    fmt = formats.negotiate(request)
+    if fmt is None:
+        return JsonResponse({'error': 'Invalid format'}, status=400)
+
+    response, etag = await _not_modified(request, http.chart_etag)
+    if response is None:
+        backend = cache.get_backend()
+        key = cache.make_key('chart', cache.request_version(request), *params, fmt)
+        content = await sync_to_async(backend.get)(key)
+        if content is None:
+            data = await _compute_chart(*params)
+            with metrics.stage(request, 'serialize'):
+                content = formats.encode(data, params[0], fmt)
+            await sync_to_async(backend.set)(key, content)
+        response = HttpResponse(content, content_type=formats.MEDIA_TYPES[fmt])
+        http.set_data_version(request, response)
+
+    response['ETag'] = etag
+    patch_cache_control(response, no_cache=True)
+    patch_vary_headers(response, ('Accept',))
+    return response
+
+
+@routing.read_from_replica
+async def sales_table(request):
+    """Асинхронная страница с таблицей данных"""
+    # Пользователь загружается заранее: в шаблоне обращение к БД из event loop запрещено
+    await sync_to_async(lambda: request.user.is_authenticated)()
+
+    response, etag = await _not_modified(request, http.page_etag)
+    if response is None:
+        year, month, products = get_filters(request)
+        queryset = filter_sales(year=year, month=month, products=products).select_related('product')
+        paginator = KeysetPaginator(queryset, SALES_ORDERING, 20, with_total=True)
+        # Страница записей и годы для фильтра выбираются одновременно
+        sales_data, years = await asyncio.gather(
+            db_task(_get_keyset_page, request, paginator),
+            db_task(catalog.get_years, request),
+        )
+        filter_query = _filter_query(year, month, products)
+        context = {
+            'sales_data': sales_data,
+            'years': years,
+            'catalog_version': cache.request_catalog_version(request),
+            'months': MONTHS,
+            'selected_year': year,
+            'selected_month': month,
+            'selected_products': products,
+            'filter_query': filter_query,
+            'page_links': _page_links(filter_query, sales_data),
+        }
+        with metrics.stage(request, 'template'):
+            response = render(request, 'sales/table.html', context)
+
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,41 @@
+"""Общие функции для замеров производительности"""
+import math
+
+
+def percentile(values, percent):
+    """Перцентиль (метод ближайшего ранга) непустого списка значений"""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(latencies, elapsed):
+    """Сводка по задержкам (в секундах) и общему времени прогона"""
+    return {
+        'requests': len(latencies),
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'max_ms': round(max(latencies) * 1000, 2),
+    }
+
+
+def latency_stats(latencies):
+    """Среднее и перцентили задержек (в секундах) в миллисекундах"""
+    return {
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'max_ms': round(max(latencies) * 1000, 2),
+    }
+
+
+def compare(baseline, current, keys=('p50_ms', 'p99_ms', 'throughput_rps')):
+    """Изменение показателей относительно базового прогона, в процентах"""
+    changes = {}
+    for key in keys:
+        before, after = baseline.get(key), current.get(key)
+        if before and after is not None:
+            changes[key] = round((after - before) / before * 100, 1)
+    return changes
@@ -0,0 +1,85 @@
+"""
+Массовые операции над записями о продажах (страница управления и админка).
+
+Удаление выполняется одним DELETE ... RETURNING, правка страницы таблицы - одним
+bulk_update. Обе операции минуют сигналы модели, поэтому в той же транзакции
+к сводным таблицам применяются приращения затронутых записей (rollups.apply_deltas),
+увеличивается версия данных и пополняется лента изменений. Сводные таблицы не
+пересчитываются по таблице продаж: стоимость операции зависит от числа записей в
+ней, а не от размера затронутых годов.
+"""
+from django.db import connections, transaction
+
+from .models import MonthlySales, Product
+from . import changes, rollups
+
+
+# Поля, доступные для табличного редактирования: ключ записи (год, месяц, товар)
+# меняется только через форму одной записи
+EDITABLE_FIELDS = ('quantity', 'revenue')
+
+
+def delete_sales(queryset):
+    """Удаляет записи запроса одним DELETE ... RETURNING; возвращает число удаленных записей"""
+    connection = connections[queryset.db]
+    table = connection.ops.quote_name(MonthlySales._meta.db_table)
+    sql, params = queryset.order_by().values('pk').query.get_compiler(using=queryset.db).as_sql()
+    revenue_field = MonthlySales._meta.get_field('revenue')
+    with transaction.atomic(using=queryset.db):
+        # Удаляемые строки блокирует сам DELETE, и итоги считаются ровно по удаленному:
+        # записи не загружаются как объекты, post_delete для каждой записи не рассылается
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} WHERE id IN ({sql}) RETURNING year, month, product_id, quantity, revenue',
+                params,
+            )
+            deleted_rows = cursor.fetchall()
+        if not deleted_rows:
+            return 0
+        # Итоги удаленных записей по ячейкам (год, месяц, товар): вычитаются из
+        # сводных таблиц, ячейки пополняют ленту изменений
+        cells = {}
+        for year, month, product_id, quantity, revenue in deleted_rows:
+            total = cells.setdefault((year, month, product_id), [0, 0, 0])
+            total[0] += quantity
+            total[1] += revenue_field.to_python(revenue)
+            total[2] += 1
+        names = dict(Product.objects.filter(pk__in={key[2] for key in cells}).values_list('id', 'name'))
+        rollups.apply_deltas(
+            (year, month, names[product_id], -quantity, -revenue, -rows)
+            for (year, month, product_id), (quantity, revenue, rows) in cells.items()
+        )
+        changes.record((year, month, names[product_id]) for year, month, product_id in cells)
+        Product.objects.prune(names)
+    return len(deleted_rows)
+
+
+def update_sales(values):
+    """
+    Сохраняет новые значения полей EDITABLE_FIELDS: values - {pk: {поле: значение}}.
+    Изменившиеся записи обновляются одним bulk_update; возвращает их число.
+    """
+    with transaction.atomic():
+        # Блокируются только записи о продажах, строки справочника товаров читаются без блокировки
+        sales = MonthlySales.objects.select_for_update(of=('self',)).select_related('product').filter(
+            pk__in=values
+        ).only('id', 'year', 'month', 'product__name', *EDITABLE_FIELDS)
+        changed = []
+        deltas = []
+        for sale in sales:
+            new_values = values[sale.pk]
+            if any(getattr(sale, field) != new_values[field] for field in EDITABLE_FIELDS):
+                # Приращения считаются по заблокированным значениям до изменения
+                deltas.append((
+                    sale.year, sale.month, sale.product_name,
+                    new_values['quantity'] - sale.quantity, new_values['revenue'] - sale.revenue, 0,
+                ))
+                for field in EDITABLE_FIELDS:
+                    setattr(sale, field, new_values[field])
+                changed.append(sale)
+        if not changed:
+            return 0
+        MonthlySales.objects.bulk_update(changed, EDITABLE_FIELDS)
+        rollups.apply_deltas(deltas)
+        changes.record((sale.year, sale.month, sale.product_name) for sale in changed)
+    return len(changed)
@@ -0,0 +1,179 @@
+"""
+Кэш ответов API с версионированием по состоянию данных.
+
+Ключ кэша включает номер версии набора данных (DatasetState.version), который
+увеличивается в той же транзакции, что и любое изменение MonthlySales. Поэтому
+после записи старые ключи просто перестают запрашиваться и устаревшие данные
+никогда не возвращаются - явная очистка кэша не нужна.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import DatasetState
+
+
+# Отправляется при каждом увеличении версии данных (внутри транзакции записи)
+dataset_changed = Signal()
+
+
+class LRUBackend:
+    """Ограниченный по размеру кэш в памяти процесса"""
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return None
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class DjangoCacheBackend:
+    """
+    Общий для процессов кэш на базе кэш-фреймворка Django
+    (memcached, redis, файловый кэш - в зависимости от настройки CACHES).
+    """
+
+    def __init__(self, alias='default', timeout=3600):
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value):
+        self.cache.set(key, value, self.timeout)
+
+    def clear(self):
+        self.cache.clear()
+
+
+_backend = None
+
+
+def get_backend():
+    """Бэкенд кэша согласно настройке CHART_CACHE_BACKEND ('lru' или 'django')"""
+    global _backend
+    if _backend is None:
+        if settings.CHART_CACHE_BACKEND == 'django':
+            _backend = DjangoCacheBackend(settings.CHART_CACHE_ALIAS, settings.CHART_CACHE_TIMEOUT)
+        else:
+            _backend = LRUBackend(settings.CHART_CACHE_SIZE)
+    return _backend
+
+
+def reset_backend():
+    """Сбрасывает выбранный бэкенд (нужно после изменения настроек, например в тестах)"""
+    global _backend
+    _backend = None
+
+
+def _token(counter, changed_at):
+    """
+    Токен версии: кроме счетчика включает время изменения. Если транзакция с
+    увеличением счетчика была откачена, следующая запись получит тот же номер,
+    но другое время, и ключи кэша не совпадут.
+    """
+    return f'{counter}.{int(changed_at.timestamp() * 1000000)}'
+
+
+def get_state():
+    """Токены версии данных и версии справочника фильтров (один запрос по первичному ключу)"""
+    fields = ('version', 'updated_at', 'catalog_version', 'catalog_updated_at')
+    state = DatasetState.objects.filter(pk=1).values_list(*fields).first()
+    if state is None:
+        obj = DatasetState.objects.get_or_create(pk=1)[0]
+        state = tuple(getattr(obj, field) for field in fields)
+    version, updated_at, catalog_version, catalog_updated_at = state
+    return _token(version, updated_at), _token(catalog_version, catalog_updated_at)
+
+
+def get_version():
+    """Токен текущей версии набора данных"""
+    return get_state()[0]
+
+
+def _request_state(request):
+    """Состояние данных, прочитанное один раз за запрос (ETag, ключи кэша и фильтры используют одно значение)"""
+    if not hasattr(request, '_dataset_state'):
+        request._dataset_state = get_state()
+    return request._dataset_state
+
+
+def request_version(request):
+    return _request_state(request)[0]
+
+
+def request_catalog_version(request):
+    return _request_state(request)[1]
+
+
+def bump_version():
+    """Увеличивает версию набора данных; вызывается в транзакции записи"""
+    updated = DatasetState.objects.filter(pk=1).update(version=F('version') + 1, updated_at=timezone.now())
+    if not updated:
+        DatasetState.objects.get_or_create(pk=1, defaults={'version': 1})
+    dataset_changed.send(sender=DatasetState)
+
+
+def bump_catalog_version():
+    """Увеличивает версию справочника фильтров (появился или исчез товар или год)"""
+    updated = DatasetState.objects.filter(pk=1).update(
+        catalog_version=F('catalog_version') + 1, catalog_updated_at=timezone.now()
+    )
+    if not updated:
+        DatasetState.objects.get_or_create(pk=1, defaults={'catalog_version': 1})
+
+
+def make_key(namespace, version, *parts):
+    """Ключ кэша; части ключа должны быть уже нормализованы"""
+    digest = hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+    return f'sales:{namespace}:{version}:{digest}'
+
+
+def normalize_filters(year=None, products=None):
+    """Нормализует фильтры: год - число или None, товары - отсортированный кортеж без повторов"""
+    return (int(year) if year else None, tuple(sorted(set(products or ()))))
+
+
+def get_or_compute(namespace, parts, compute, version=None):
+    """
+    Возвращает закэшированное значение для (namespace, parts) текущей версии данных,
+    при промахе вычисляет его функцией compute и сохраняет.
+    """
+    backend = get_backend()
+    if version is None:
+        version = get_version()
+    key = make_key(namespace, version, *parts)
+    value = backend.get(key)
+    if value is None:
+        value = compute()
+        backend.set(key, value)
+    return value
@@ -0,0 +1,86 @@
+"""
+Справочник значений для фильтров: годы и товары.
+
+Годы встраиваются в страницы, а товаров может быть десятки тысяч, поэтому
+они не выводятся списком, а ищутся через /api/products/ (автодополнение).
+В PostgreSQL поиск использует GIN-индекс pg_trgm по product_totals
+(миграция 0009): подстрока и похожие написания (опечатки) ищутся по индексу,
+совпадения с начала названия выводятся первыми.
+"""
+from django.db import connections, router
+from django.db.models import Case, IntegerField, Value, When
+
+from .models import MonthlyTotal, ProductTotal
+from . import cache
+
+
+MAX_QUERY_LENGTH = 100
+
+# Товары: сначала совпадение с начала названия, затем подстрока, затем похожие по триграммам
+SEARCH_SQL = """
+    SELECT product_name FROM product_totals
+    WHERE product_name ILIKE %(contains)s OR %(query)s <%% product_name
+    ORDER BY product_name ILIKE %(prefix)s DESC,
+             product_name ILIKE %(contains)s DESC,
+             word_similarity(%(query)s, product_name) DESC,
+             product_name
+    LIMIT %(limit)s OFFSET %(offset)s
+"""
+
+
+def _load_years():
+    return list(MonthlyTotal.objects.values_list('year', flat=True).distinct().order_by('-year'))
+
+
+def get_years(request):
+    """
+    Годы (по убыванию) для выпадающих списков.
+    Читаются из сводной таблицы и кэшируются до изменения версии справочника,
+    поэтому страницы не выполняют DISTINCT по таблице monthly_sales.
+    """
+    return cache.get_or_compute('catalog', ('years',), _load_years, version=cache.request_catalog_version(request))
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _search(query, limit, offset):
+    if not query:
+        names = ProductTotal.objects.order_by('product_name').values_list('product_name', flat=True)
+        return list(names[offset:offset + limit])
+    # Поиск читает ту же базу, что и ORM-запросы к сводным таблицам (реплика в представлениях для чтения)
+    connection = connections[router.db_for_read(ProductTotal)]
+    if connection.vendor == 'postgresql':
+        escaped = _escape_like(query)
+        with connection.cursor() as cursor:
+            cursor.execute(SEARCH_SQL, {
+                'query': query,
+                'prefix': f'{escaped}%',
+                'contains': f'%{escaped}%',
+                'limit': limit,
+                'offset': offset,
+            })
+            return [row[0] for row in cursor.fetchall()]
+    names = ProductTotal.objects.filter(product_name__icontains=query).annotate(
+        prefix=Case(When(product_name__istartswith=query, then=Value(0)), default=Value(1), output_field=IntegerField())
+    ).order_by('prefix', 'product_name').values_list('product_name', flat=True)
+    return list(names[offset:offset + limit])
+
+
+def search_products(request, query='', limit=20, offset=0):
+    """
+    Страница результатов поиска товаров: {'results': [...], 'has_more': bool}.
+    Пустой запрос - все товары по алфавиту. Результаты кэшируются до изменения
+    версии справочника.
+    """
+    query = query.strip()[:MAX_QUERY_LENGTH]
+
+    def compute():
+        # Лишняя строка показывает, есть ли следующая страница
+        names = _search(query, limit + 1, offset)
+        return {'results': names[:limit], 'has_more': len(names) > limit}
+
+    return cache.get_or_compute(
+        'products', (query.lower(), limit, offset), compute, version=cache.request_catalog_version(request)
+    )
@@ -0,0 +1,123 @@
+"""
+Лента изменений данных о продажах для инкрементального обновления диаграмм.
+
+Каждая запись в monthly_sales добавляет в sales_changes измененные ячейки
+(год, месяц, товар) с номером версии данных (DatasetState.version) из той же
+транзакции. Увеличение версии блокирует строку dataset_state до конца
+транзакции, поэтому версии фиксируются строго по порядку: клиент, получивший
+изменения до версии N, при следующем запросе ?since=N не пропустит ни одной
+более поздней записи.
+
+По ячейкам ленты delta() возвращает новые итоги только затронутых месяцев и
+товаров - страница диаграмм подменяет эти значения вместо загрузки всех
+трех диаграмм. Значения абсолютные, поэтому повторное применение безопасно.
+Строка ленты без ячейки - сброс (полный пересчет, архивация года, очистка
+старой части ленты): клиенту нужно загрузить диаграммы заново.
+"""
+from django.db.models import Q, Sum
+
+from .charts import _product_totals, month_index, month_labels
+from .filters import filter_sales
+from .models import DatasetState, MonthlyTotal, SalesChange
+
+
+# Если изменилось больше ячеек, дешевле загрузить диаграммы заново
+MAX_CELLS = 500
+
+
+def current_version():
+    """Номер текущей версии данных"""
+    return DatasetState.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+
+
+def record(cells):
+    """
+    Добавляет в ленту ячейки (год, месяц, товар) с текущей версией данных.
+    Вызывается в транзакции записи после cache.bump_version().
+    """
+    cells = list(dict.fromkeys(cells))
+    if not cells:
+        return
+    version = current_version()
+    SalesChange.objects.bulk_create(
+        SalesChange(version=version, year=year, month=month, product_name=product_name)
+        for year, month, product_name in cells
+    )
+
+
+def record_reset():
+    """Отмечает в ленте изменение всех данных; вызывается в транзакции записи"""
+    SalesChange.objects.create(version=current_version())
+
+
+def prune(keep_versions):
+    """
+    Удаляет из ленты изменения старше keep_versions последних версий и оставляет
+    на их месте сброс: клиенты с более старой версией загрузят диаграммы заново.
+    Возвращает число удаленных строк.
+    """
+    boundary = current_version() - keep_versions
+    if boundary <= 0:
+        return 0
+    deleted, _ = SalesChange.objects.filter(version__lte=boundary).delete()
+    if deleted:
+        SalesChange.objects.create(version=boundary)
+    return deleted
+
+
+def _month_values(months, products):
+    """Выручка по месяцам months ((год, месяц)); с фильтром товаров - по таблице продаж"""
+    if products:
+        queryset = filter_sales(products=products)
+    else:
+        queryset = MonthlyTotal.objects.all()
+    queryset = queryset.filter(
+        year__in={year for year, _ in months}, month__in={month for _, month in months}
+    ).values_list('year', 'month').annotate(total_revenue=Sum('revenue')).order_by()
+    return {(year, month): revenue for year, month, revenue in queryset if (year, month) in months}
+
+
+def delta(since, year=None, products=None, reset_on_change=False):
+    """
+    Изменения диаграмм после версии since для фильтров year / products:
+    новые значения линейного графика по подписям месяцев и итоги затронутых
+    товаров; removed - товары, у которых не осталось записей. reset=True -
+    диаграммы нужно загрузить заново (в том числе при reset_on_change, когда
+    диаграмма не поддерживает точечное обновление, например ряды по товарам).
+    """
+    version = current_version()
+    result = {'version': version, 'reset': False, 'line': [], 'products': [], 'removed': []}
+    if since >= version:
+        return result
+
+    feed = SalesChange.objects.filter(version__gt=since, version__lte=version)
+    # Сброс (строка без ячейки) попадает в выборку при любых фильтрах
+    if year:
+        feed = feed.filter(Q(year=int(year)) | Q(year__isnull=True))
+    if products:
+        feed = feed.filter(Q(product_name__in=products) | Q(product_name__isnull=True))
+    cells = list(feed.order_by().values_list('year', 'month', 'product_name').distinct()[:MAX_CELLS + 1])
+    if not cells:
+        return result
+    if reset_on_change or len(cells) > MAX_CELLS or any(cell[0] is None for cell in cells):
+        result['reset'] = True
+        return result
+
+    months = {(cell_year, month) for cell_year, month, _ in cells}
+    revenues = _month_values(months, products)
+    for cell_year, month in sorted(months):
+        index = month_index(cell_year, month)
+        result['line'].append({
+            'label': month_labels(index, index)[0],
+            'value': float(revenues.get((cell_year, month), 0)),
+        })
+
+    names = {product_name for _, _, product_name in cells}
+    totals = _product_totals(year).filter(product_name__in=names).order_by('product_name').values_list(
+        'product_name', 'quantity', 'revenue'
+    )
+    for product_name, quantity, revenue in totals:
+        names.discard(product_name)
+        result['products'].append({'label': product_name, 'quantity': quantity, 'revenue': float(revenue)})
+    result['removed'] = sorted(names)
+    return result
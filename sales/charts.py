@@ -0,0 +1,406 @@
+"""Построение данных для диаграмм Chart.js"""
+import colorsys
+from functools import lru_cache
+
+from django.db import connections
+from django.db.models import Case, CharField, F, Sum, Value, When
+
+from .filters import filter_sales
+from .models import MonthlySales, MonthlyTotal, ProductTotal, ProductYearTotal, product_name_subquery
+
+
+MONTH_NAMES = dict(MonthlySales.MONTHS)
+
+# Базовые цвета диаграмм; для большего числа рядов генерируются новые оттенки
+BASE_COLORS = [
+    (255, 99, 132),
+    (54, 162, 235),
+    (255, 206, 86),
+    (75, 192, 192),
+    (153, 102, 255),
+    (255, 159, 64),
+]
+
+# Цвет ряда "Другие"
+OTHER_COLOR = (201, 203, 207)
+OTHER_LABEL = 'Другие'
+
+CHART_TYPES = ('line', 'bar', 'pie', 'all')
+SERIES_MODES = ('total', 'product')
+DEFAULT_TOP_N = 10
+MAX_TOP_N = 50
+
+
+@lru_cache(maxsize=None)
+def series_color(index):
+    """Цвет ряда с номером index: базовые цвета, затем оттенки с шагом золотого угла"""
+    if index < len(BASE_COLORS):
+        return BASE_COLORS[index]
+    hue = (index * 0.381966) % 1
+    return tuple(round(channel * 255) for channel in colorsys.hls_to_rgb(hue, 0.55, 0.65))
+
+
+def rgba(color, alpha):
+    return f'rgba({color[0]}, {color[1]}, {color[2]}, {alpha})'
+
+
+def palette(names, alpha):
+    """Цвета для рядов names; ряд "Другие" (None) - серый"""
+    return [
+        rgba(OTHER_COLOR if name is None else series_color(index), alpha)
+        for index, name in enumerate(names)
+    ]
+
+
+def other_index(names):
+    """Номер ряда "Другие" (None) в names или None; по нему клиент отличает ряд от товара с таким названием"""
+    return names.index(None) if None in names else None
+
+
+def month_index(year, month):
+    """Сквозной номер месяца: год * 12 + (месяц - 1)"""
+    return year * 12 + month - 1
+
+
+@lru_cache(maxsize=256)
+def month_labels(first, last):
+    """Подписи оси для месяцев с номерами first..last; строки создаются один раз и кэшируются"""
+    return tuple(f"{MONTH_NAMES[index % 12 + 1]} {index // 12}" for index in range(first, last + 1))
+
+
+def month_series(queryset, year=None):
+    """
+    Помесячная выручка (год, месяц, выручка) из запроса с колонками year, month, выручка.
+    В PostgreSQL пропущенные месяцы дополняются нулями в самой БД: generate_series
+    по диапазону месяцев соединяется с агрегатом. В остальных СУБД возвращаются
+    только месяцы с данными - пропуски заполняет build_line_chart.
+    """
+    # SQL выполняется в базе запроса (реплика в представлениях только для чтения)
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return list(queryset)
+    sql, params = queryset.query.get_compiler(using=queryset.db).as_sql()
+    if year:
+        bounds, bound_params = '%s, %s', [month_index(int(year), 1), month_index(int(year), 12)]
+    else:
+        bounds = '(SELECT MIN(year * 12 + month - 1) FROM agg), (SELECT MAX(year * 12 + month - 1) FROM agg)'
+        bound_params = []
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            WITH agg (year, month, revenue) AS ({sql})
+            SELECT g.idx / 12, g.idx % 12 + 1, COALESCE(agg.revenue, 0)
+            FROM generate_series({bounds}) AS g (idx)
+            LEFT JOIN agg ON agg.year * 12 + agg.month - 1 = g.idx
+            ORDER BY g.idx
+        """, [*params, *bound_params])
+        return cursor.fetchall()
+
+
+def build_line_chart(rows, year=None):
+    """
+    Линейный график - выручка по месяцам.
+    rows - последовательность (год, месяц, выручка), отсортированная по году и месяцу.
+    Если выбран год - ось из 12 месяцев этого года, иначе от первого до последнего
+    месяца с данными; месяцы без данных получают 0.
+    """
+    if year:
+        first, last = month_index(int(year), 1), month_index(int(year), 12)
+    elif rows:
+        first, last = month_index(*rows[0][:2]), month_index(*rows[-1][:2])
+    else:
+        first, last = 0, -1
+
+    labels = list(month_labels(first, last))
+    values = [0] * len(labels)
+    for row_year, row_month, revenue in rows:
+        values[month_index(row_year, row_month) - first] = revenue
+
+    return {
+        'labels': labels,
+        'datasets': [{
+            'label': 'Выручка (руб.)',
+            'data': values,
+            'borderColor': 'rgb(75, 192, 192)',
+            'backgroundColor': 'rgba(75, 192, 192, 0.2)',
+            'tension': 0.1
+        }]
+    }
+
+
+def build_bar_chart(rows):
+    """
+    Гистограмма - количество продаж по товарам.
+    rows - пары (товар, количество); товар None - ряд "Другие".
+    """
+    names = [product for product, _ in rows]
+    return {
+        'labels': [OTHER_LABEL if product is None else product for product in names],
+        'datasets': [{
+            'label': 'Количество проданных единиц',
+            'data': [quantity for _, quantity in rows],
+            'backgroundColor': palette(names, 0.7),
+            'borderColor': palette(names, 1),
+            'borderWidth': 1
+        }],
+        'other': other_index(names),
+    }
+
+
+def build_pie_chart(rows):
+    """
+    Круговая диаграмма - доля выручки по товарам.
+    rows - пары (товар, выручка); товар None - ряд "Другие".
+    """
+    names = [product for product, _ in rows]
+    return {
+        'labels': [OTHER_LABEL if product is None else product for product in names],
+        'datasets': [{
+            'label': 'Выручка (руб.)',
+            'data': [revenue for _, revenue in rows],
+            'backgroundColor': palette(names, 0.8),
+            'borderWidth': 2
+        }],
+        'other': other_index(names),
+    }
+
+
+def line_chart(queryset, year=None):
+    """Выручка по месяцам из отфильтрованного набора записей"""
+    data = queryset.values_list('year', 'month').annotate(
+        total_revenue=Sum('revenue')
+    ).order_by('year', 'month')
+    return build_line_chart(month_series(data, year), year)
+
+
+def bar_chart(queryset):
+    """Количество продаж по товарам из отфильтрованного набора записей"""
+    data = queryset.values('product_id').annotate(
+        total_quantity=Sum('quantity')
+    ).annotate(name=product_name_subquery()).order_by('-total_quantity', 'name')
+    return build_bar_chart([(item['name'], item['total_quantity']) for item in data])
+
+
+def pie_chart(queryset):
+    """Выручка по товарам из отфильтрованного набора записей"""
+    data = queryset.values('product_id').annotate(
+        total_revenue=Sum('revenue')
+    ).annotate(name=product_name_subquery()).order_by('-total_revenue', 'name')
+    return build_pie_chart([(item['name'], item['total_revenue']) for item in data])
+
+
+def dashboard_charts(queryset, year=None):
+    """
+    Все три диаграммы за один проход по данным.
+    Выполняется один GROUP BY (год, месяц, ключ товара), а помесячные и
+    потоварные итоги досчитываются в Python.
+    """
+    data = queryset.values_list('year', 'month', 'product_id').annotate(
+        total_revenue=Sum('revenue'),
+        total_quantity=Sum('quantity'),
+    ).annotate(name=product_name_subquery()).order_by()
+
+    by_month = {}
+    quantity_by_product = {}
+    revenue_by_product = {}
+    for row_year, row_month, _, revenue, quantity, product in data:
+        key = (row_year, row_month)
+        by_month[key] = by_month.get(key, 0) + revenue
+        quantity_by_product[product] = quantity_by_product.get(product, 0) + quantity
+        revenue_by_product[product] = revenue_by_product.get(product, 0) + revenue
+
+    line_rows = [(y, m, revenue) for (y, m), revenue in sorted(by_month.items())]
+    bar_rows = sorted(quantity_by_product.items(), key=lambda item: (-item[1], item[0]))
+    pie_rows = sorted(revenue_by_product.items(), key=lambda item: (-item[1], item[0]))
+
+    return {
+        'line': build_line_chart(line_rows, year),
+        'bar': build_bar_chart(bar_rows),
+        'pie': build_pie_chart(pie_rows),
+    }
+
+
+def _product_totals(year=None):
+    """Итоги по товарам из сводных таблиц"""
+    if year:
+        return ProductYearTotal.objects.filter(year=int(year))
+    return ProductTotal.objects.all()
+
+
+def rollup_line_chart(year=None):
+    """Выручка по месяцам из сводной таблицы monthly_totals"""
+    queryset = MonthlyTotal.objects.all()
+    if year:
+        queryset = queryset.filter(year=int(year))
+    rows = queryset.order_by('year', 'month').values_list('year', 'month', 'revenue')
+    return build_line_chart(month_series(rows, year), year)
+
+
+def rollup_bar_chart(year=None):
+    """Количество продаж по товарам из сводных таблиц"""
+    rows = _product_totals(year).order_by('-quantity', 'product_name').values_list('product_name', 'quantity')
+    return build_bar_chart(list(rows))
+
+
+def rollup_pie_chart(year=None):
+    """Выручка по товарам из сводных таблиц"""
+    rows = _product_totals(year).order_by('-revenue', 'product_name').values_list('product_name', 'revenue')
+    return build_pie_chart(list(rows))
+
+
+def rollup_product_totals(year=None):
+    """Итоги по товарам (товар, количество, выручка) из сводных таблиц"""
+    return list(_product_totals(year).values_list('product_name', 'quantity', 'revenue'))
+
+
+def _product_order(item):
+    # По убыванию значения, ряд "Другие" - последним
+    name, value = item
+    return name is None, -value, name or ''
+
+
+def build_product_charts(totals):
+    """Гистограмма и круговая диаграмма по итогам товаров (товар, количество, выручка)"""
+    bar_rows = sorted(((name, quantity) for name, quantity, _ in totals), key=_product_order)
+    pie_rows = sorted(((name, revenue) for name, _, revenue in totals), key=_product_order)
+    return build_bar_chart(bar_rows), build_pie_chart(pie_rows)
+
+
+def _top_products(queryset, top_n):
+    """Подзапрос: top_n товаров с наибольшей выручкой (ключи для monthly_sales, названия для сводных таблиц)"""
+    if queryset.model is MonthlySales:
+        return queryset.values('product_id').annotate(
+            total_revenue=Sum('revenue')
+        ).annotate(name=product_name_subquery()).order_by('-total_revenue', 'name').values('product_id')[:top_n]
+    return queryset.values('product_name').annotate(
+        total_revenue=Sum('revenue')
+    ).order_by('-total_revenue', 'product_name').values('product_name')[:top_n]
+
+
+def _series(queryset, top_n):
+    """Выражение ряда: название товара из top_n или NULL для остальных ("Другие")"""
+    if queryset.model is MonthlySales:
+        # Отбор top_n - по ключу товара, название берется из справочника
+        condition = When(product__in=_top_products(queryset, top_n), then=F('product__name'))
+    else:
+        condition = When(product_name__in=_top_products(queryset, top_n), then=F('product_name'))
+    return Case(condition, default=Value(None), output_field=CharField())
+
+
+def top_product_totals(queryset, top_n):
+    """
+    Итоги (товар, количество, выручка) по top_n товарам и одна строка None
+    по всем остальным. Свертка хвоста выполняется в том же SQL-запросе.
+    queryset - записи monthly_sales или сводной таблицы итогов по товарам.
+    """
+    return list(
+        queryset.annotate(series=_series(queryset, top_n)).values_list('series').annotate(
+            total_quantity=Sum('quantity'),
+            total_revenue=Sum('revenue'),
+        ).order_by()
+    )
+
+
+def product_line_chart(queryset, year=None, top_n=DEFAULT_TOP_N):
+    """
+    Линейный график с отдельным рядом для каждого из top_n товаров и рядом "Другие".
+    Данные выбираются одним GROUP BY (год, месяц, ряд) и разворачиваются в ряды в Python.
+    """
+    rows = list(
+        queryset.annotate(series=_series(queryset, top_n)).values_list('year', 'month', 'series').annotate(
+            total_revenue=Sum('revenue')
+        ).order_by()
+    )
+    if year:
+        first, last = month_index(int(year), 1), month_index(int(year), 12)
+    elif rows:
+        indexes = [month_index(row_year, row_month) for row_year, row_month, _, _ in rows]
+        first, last = min(indexes), max(indexes)
+    else:
+        first, last = 0, -1
+
+    labels = list(month_labels(first, last))
+    totals = {}
+    values = {}
+    for row_year, row_month, name, revenue in rows:
+        if name not in values:
+            values[name] = [0] * len(labels)
+            totals[name] = 0
+        values[name][month_index(row_year, row_month) - first] = revenue
+        totals[name] += revenue
+
+    names = [name for name, _ in sorted(totals.items(), key=_product_order)]
+    datasets = []
+    for name, border, background in zip(names, palette(names, 1), palette(names, 0.2)):
+        datasets.append({
+            'label': OTHER_LABEL if name is None else name,
+            'data': values[name],
+            'borderColor': border,
+            'backgroundColor': background,
+            'tension': 0.1
+        })
+    return {'labels': labels, 'datasets': datasets, 'other': other_index(names)}
+
+
+def top_n_charts(chart_type, year=None, products=None, series='total', top_n=DEFAULT_TOP_N):
+    """
+    Диаграммы с ограниченным числом рядов: top_n товаров по выручке и "Другие".
+    Для линейного графика в режиме series='product' - ряд на каждый товар,
+    иначе - суммарная выручка, как обычно.
+    """
+    result = {}
+    if chart_type in ('line', 'all'):
+        if series == 'product':
+            result['line'] = product_line_chart(filter_sales(year=year, products=products), year, top_n)
+        else:
+            result['line'] = get_chart('line', year, products)
+    if chart_type in ('bar', 'pie', 'all'):
+        # Без фильтра по товарам итоги берутся из сводных таблиц
+        source = filter_sales(year=year, products=products) if products else _product_totals(year)
+        result['bar'], result['pie'] = build_product_charts(top_product_totals(source, top_n))
+    return result if chart_type == 'all' else result[chart_type]
+
+
+def rollup_dashboard_charts(year=None):
+    """Все три диаграммы по сводным таблицам: помесячные итоги и итоги по товарам"""
+    bar, pie = build_product_charts(rollup_product_totals(year))
+    return {
+        'line': rollup_line_chart(year),
+        'bar': bar,
+        'pie': pie,
+    }
+
+
+def get_chart(chart_type, year=None, products=None, series='total', top_n=None):
+    """
+    Данные диаграммы заданного типа ('line', 'bar', 'pie' или 'all').
+    Без фильтра по товарам данные читаются из сводных таблиц (O(месяцев + товаров) строк),
+    с фильтром - агрегируются по monthly_sales. series='product' или top_n
+    включают ряды по товарам с ограничением их числа (см. top_n_charts).
+    Для неизвестного типа возвращает None.
+    """
+    if chart_type not in CHART_TYPES:
+        return None
+    if series == 'product' or top_n:
+        return top_n_charts(chart_type, year, products, series, top_n or DEFAULT_TOP_N)
+
+    if not products:
+        builders = {
+            'line': rollup_line_chart,
+            'bar': rollup_bar_chart,
+            'pie': rollup_pie_chart,
+            'all': rollup_dashboard_charts,
+        }
+        builder = builders.get(chart_type)
+        return builder(year) if builder else None
+
+    queryset = filter_sales(year=year, products=products)
+
+    if chart_type == 'line':
+        return line_chart(queryset, year)
+    elif chart_type == 'bar':
+        return bar_chart(queryset)
+    elif chart_type == 'pie':
+        return pie_chart(queryset)
+    elif chart_type == 'all':
+        return dashboard_charts(queryset, year)
+    return None
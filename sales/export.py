@@ -0,0 +1,77 @@
+"""
+Потоковая выгрузка данных о продажах в CSV и NDJSON.
+
+Записи читаются серверным курсором (QuerySet.iterator) и отдаются клиенту
+пачками по мере чтения, поэтому выгрузка любого размера занимает постоянную
+память и первые байты уходят сразу. Формат совпадает с форматом импорта.
+"""
+import csv
+import io
+import json
+import zlib
+
+from .importer import FIELDS
+
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson; charset=utf-8', 'ndjson'),
+}
+
+CHUNK_SIZE = 2000
+
+
+def iter_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(FIELDS)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_ndjson(rows):
+    lines = []
+    for year, month, product_name, quantity, revenue in rows:
+        lines.append(json.dumps({
+            'year': year,
+            'month': month,
+            'product_name': product_name,
+            'quantity': quantity,
+            'revenue': str(revenue),  # строкой, чтобы не терять точность Decimal
+        }, ensure_ascii=False))
+        if len(lines) >= CHUNK_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def encode(chunks):
+    for chunk in chunks:
+        if chunk:
+            yield chunk.encode('utf-8')
+
+
+def gzip_stream(chunks):
+    """Сжатие gzip на лету, без буферизации всего ответа"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_sales(queryset, fmt, compress=False):
+    """Итератор байтов выгрузки записей queryset в формате fmt ('csv' или 'ndjson')"""
+    # Название товара - из справочника; порядок колонок совпадает с FIELDS
+    rows = queryset.values_list('year', 'month', 'product__name', 'quantity', 'revenue').iterator(
+        chunk_size=CHUNK_SIZE
+    )
+    chunks = encode(iter_csv(rows) if fmt == 'csv' else iter_ndjson(rows))
+    return gzip_stream(chunks) if compress else chunks
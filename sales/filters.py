@@ -0,0 +1,28 @@
+"""Общие фильтры записей о продажах для всех представлений"""
+from .models import MonthlySales, Product
+
+
+def get_filters(request, products_param='products'):
+    """
+    Значения фильтров (год, месяц, товары) из GET-параметров в исходном строковом виде,
+    как их ожидают шаблоны. API диаграмм передает товары в параметре 'products[]'.
+    """
+    return request.GET.get('year'), request.GET.get('month'), request.GET.getlist(products_param)
+
+
+def filter_sales(queryset=None, year=None, month=None, products=None):
+    """
+    Применяет фильтры год -> месяц -> товары.
+    Порядок условий соответствует индексам monthly_sales (см. MonthlySales.Meta.indexes).
+    Товары задаются названиями, а записи фильтруются по целочисленному ключу:
+    названия ищутся подзапросом только в справочнике products.
+    """
+    if queryset is None:
+        queryset = MonthlySales.objects.all()
+    if year:
+        queryset = queryset.filter(year=int(year))
+    if month:
+        queryset = queryset.filter(month=int(month))
+    if products:
+        queryset = queryset.filter(product__in=Product.objects.filter(name__in=products).values('id'))
+    return queryset
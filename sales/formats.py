@@ -0,0 +1,133 @@
+"""
+Компактные форматы ответа API диаграмм.
+
+json     - объекты Chart.js со стилями (по умолчанию);
+columnar - колоночный JSON без стилей: подписи, имена рядов и массивы целых
+           значений (выручка в копейках, количество в штуках);
+binary   - те же колонки в бинарном виде: заголовок JSON и значения float64
+           (целые копейки) подряд, читаются в браузере через Float64Array.
+
+Формат выбирается параметром format= или заголовком Accept.
+"""
+import json
+import struct
+import sys
+from array import array
+from decimal import Decimal
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+MEDIA_TYPES = {
+    'json': 'application/json',
+    'columnar': 'application/vnd.sales.chart+json',
+    'binary': 'application/vnd.sales.chart+binary',
+}
+
+BINARY_MAGIC = b'SCHB'
+BINARY_VERSION = 1
+
+# Множитель значений: выручка в копейках, количество в штуках
+SCALES = {'line': 100, 'bar': 1, 'pie': 100}
+
+
+def negotiate(request):
+    """Формат ответа из параметра format= или заголовка Accept; None для неизвестного format="""
+    fmt = request.GET.get('format')
+    if fmt:
+        return fmt if fmt in MEDIA_TYPES else None
+    accept = request.headers.get('Accept', '')
+    for name in ('binary', 'columnar'):
+        if MEDIA_TYPES[name] in accept:
+            return name
+    return 'json'
+
+
+def dumps(data):
+    """Компактный JSON; orjson, если установлен"""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def scaled(value, scale):
+    """Целое значение в единицах scale; выручка (Decimal) умножается без перехода через float"""
+    return int((Decimal(value) * scale).to_integral_value())
+
+
+class ChartJSONEncoder(DjangoJSONEncoder):
+    """Формат json: Decimal - числом, как ожидает Chart.js, а не строкой"""
+
+    def default(self, o):
+        if isinstance(o, Decimal):
+            return float(o)
+        return super().default(o)
+
+
+def to_columns(chart, kind):
+    """
+    Колонки одной диаграммы Chart.js: подписи, имена рядов, целые значения рядов
+    и other - номер ряда (line) или подписи (bar, pie) "Другие" либо None.
+    """
+    scale = SCALES[kind]
+    return {
+        'labels': chart['labels'],
+        'series': [dataset['label'] for dataset in chart['datasets']],
+        'values': [[scaled(value, scale) for value in dataset['data']] for dataset in chart['datasets']],
+        'scale': scale,
+        'other': chart.get('other'),
+    }
+
+
+def to_columnar(data, chart_type):
+    """Колоночное представление ответа get_chart (одна диаграмма или словарь 'all')"""
+    if chart_type == 'all':
+        return {kind: to_columns(chart, kind) for kind, chart in data.items()}
+    return to_columns(data, chart_type)
+
+
+def pack_binary(columnar, chart_type):
+    """
+    Бинарный формат: 'SCHB', uint32 LE длина заголовка, заголовок JSON,
+    выравнивание нулями до 8 байт, затем значения float64 LE. В заголовке для
+    каждой диаграммы вместо values указаны offset и length - номер первого
+    значения и длина каждого ряда в области данных.
+    """
+    charts = columnar if chart_type == 'all' else {chart_type: columnar}
+    values = array('d')
+    header = {'version': BINARY_VERSION, 'charts': {}}
+    for kind, columns in charts.items():
+        header['charts'][kind] = {
+            'labels': columns['labels'],
+            'series': columns['series'],
+            'scale': columns['scale'],
+            'other': columns['other'],
+            'offset': len(values),
+            'length': len(columns['labels']),
+        }
+        for series in columns['values']:
+            values.extend(series)
+    if sys.byteorder != 'little':
+        values.byteswap()
+
+    header_bytes = dumps(header)
+    prefix_length = len(BINARY_MAGIC) + 4 + len(header_bytes)
+    padding = b'\0' * (-prefix_length % 8)
+    return b''.join((
+        BINARY_MAGIC, struct.pack('<I', len(header_bytes)), header_bytes, padding, values.tobytes(),
+    ))
+
+
+def encode(data, chart_type, fmt):
+    """Тело ответа в формате fmt"""
+    if fmt == 'json':
+        return json.dumps(data, cls=ChartJSONEncoder).encode('utf-8')
+    columnar = to_columnar(data, chart_type)
+    if fmt == 'columnar':
+        return dumps(columnar)
+    return pack_binary(columnar, chart_type)
@@ -6,6 +6,16 @@ import datetime
 class MonthlySalesForm(forms.ModelForm):
     """Форма для добавления/редактирования продаж"""
     
+    # Товар вводится названием, при сохранении оно заменяется ключом справочника товаров
+    product_name = forms.CharField(
+        max_length=200,
+        label='Название товара',
+        widget=forms.TextInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'Например: Ноутбук'
+        }),
+    )
+    
     class Meta:
         current_year = datetime.datetime.now().year
         max_year = current_year
@@ -19,10 +29,6 @@ class MonthlySalesForm(forms.ModelForm):
                 'max':  str(max_year)
             }),
             'month': forms.Select(attrs={'class': 'form-select'}),
-            'product_name': forms.TextInput(attrs={
-                'class': 'form-control',
-                'placeholder': 'Например: Ноутбук'
-            }),
             'quantity': forms.NumberInput(attrs={
                 'class': 'form-control',
                 'placeholder': 'Например: 100',
@@ -38,7 +44,51 @@ class MonthlySalesForm(forms.ModelForm):
         labels = {
             'year': 'Год',
             'month': 'Месяц',
-            'product_name': 'Название товара',
             'quantity': 'Количество проданных единиц',
             'revenue': 'Выручка (руб.)',
-        }
\ No newline at end of file
+        }
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.product_id:
+            self.initial.setdefault('product_name', self.instance.product_name)
+    
+    def validate_unique(self):
+        super().validate_unique()
+        # Товара нет среди полей модели в форме - уникальность (год, месяц, товар) проверяется по названию
+        data = self.cleaned_data
+        if not {'year', 'month', 'product_name'} <= data.keys():
+            return
+        duplicate = MonthlySales.objects.filter(
+            year=data['year'], month=data['month'], product__name=data['product_name']
+        ).exclude(pk=self.instance.pk)
+        if duplicate.exists():
+            self.add_error(None, self.instance.unique_error_message(MonthlySales, ('year', 'month', 'product')))
+    
+    def save(self, commit=True):
+        self.instance.product_name = self.cleaned_data['product_name']
+        return super().save(commit)
+
+
+class BulkEditForm(forms.ModelForm):
+    """Строка табличного редактирования на странице управления: количество и выручка записи"""
+    
+    id = forms.IntegerField(widget=forms.HiddenInput)
+    
+    class Meta:
+        model = MonthlySales
+        fields = ['quantity', 'revenue']
+        widgets = {
+            'quantity': forms.NumberInput(attrs={
+                'class': 'form-control form-control-sm',
+                'min': '1'
+            }),
+            'revenue': forms.NumberInput(attrs={
+                'class': 'form-control form-control-sm',
+                'min': '0.01',
+                'step': '0.01'
+            }),
+        }
+
+
+BulkEditFormSet = forms.formset_factory(BulkEditForm, extra=0)
@@ -0,0 +1,102 @@
+"""Условные HTTP-запросы (ETag / 304), сжатие ответов API диаграмм и таблицы, проверка токенов API"""
+import gzip
+import hashlib
+import hmac
+import re
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.utils.cache import patch_vary_headers
+
+from . import cache, formats
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Ответы меньше этого размера не сжимаются: выигрыш меньше накладных расходов
+MIN_COMPRESS_SIZE = 200
+
+# Кодировки из Accept-Encoding, кроме явно запрещенных (q=0)
+ENCODING_RE = re.compile(r'\b(br|gzip)\b(?!\s*;\s*q=0(?:\.0*)?\s*(?:,|$))')
+
+
+def _etag(request, *extra):
+    """Строгий ETag из версии данных, пути и отсортированных параметров запроса"""
+    params = sorted((key, tuple(sorted(values))) for key, values in request.GET.lists())
+    source = repr((cache.request_version(request), request.path, params) + extra)
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+
+def chart_etag(request, *args, **kwargs):
+    """ETag ответа API диаграмм - зависит от данных, фильтров и формата (он может прийти в Accept)"""
+    return _etag(request, formats.negotiate(request))
+
+
+def page_etag(request, *args, **kwargs):
+    """ETag HTML-страницы: разметка еще зависит от пользователя (меню в base.html)"""
+    return _etag(request, request.user.pk)
+
+
+def set_data_version(request, response):
+    """Номер версии данных ответа: с него страница диаграмм запрашивает ленту изменений (?since=)"""
+    response['X-Data-Version'] = cache.request_version(request).split('.')[0]
+
+
+def bearer_token_valid(request, tokens):
+    """Заголовок Authorization: Bearer <токен> содержит один из токенов (сравнение за постоянное время)"""
+    header = request.headers.get('Authorization', '')
+    if not header.startswith('Bearer '):
+        return False
+    supplied = header[len('Bearer '):].encode('utf-8')
+    return any(hmac.compare_digest(supplied, token.encode('utf-8')) for token in tokens if token)
+
+
+def _encoding(request):
+    """Лучшее поддерживаемое сжатие из Accept-Encoding: 'br', 'gzip' или None"""
+    accepted = set(ENCODING_RE.findall(request.headers.get('Accept-Encoding', '')))
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    return 'gzip' if 'gzip' in accepted else None
+
+
+def _compress(request, response):
+    patch_vary_headers(response, ('Accept-Encoding',))
+    encoding = _encoding(request)
+    if (
+        encoding is None
+        or response.streaming
+        or response.status_code != 200
+        or response.has_header('Content-Encoding')
+        or len(response.content) < MIN_COMPRESS_SIZE
+    ):
+        return response
+
+    if encoding == 'br':
+        content = brotli.compress(response.content, quality=5)
+    else:
+        content = gzip.compress(response.content, compresslevel=6, mtime=0)
+    response.content = content
+    response['Content-Length'] = str(len(content))
+    response['Content-Encoding'] = encoding
+    # Сжатое представление побайтно отличается от исходного - ETag становится слабым
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response['ETag'] = 'W/' + etag
+    return response
+
+
+def compress_response(view):
+    """Декоратор: сжатие ответа brotli (если установлен) или gzip по Accept-Encoding"""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            return _compress(request, await view(request, *args, **kwargs))
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        return _compress(request, view(request, *args, **kwargs))
+    return wrapper
@@ -0,0 +1,293 @@
+"""
+Потоковая загрузка данных о продажах из CSV / JSONL.
+
+Строки читаются и проверяются порциями по правилам MonthlySalesForm, поэтому
+память ограничена размером порции независимо от размера файла. В PostgreSQL
+порция загружается командой COPY во временную таблицу и сливается с
+monthly_sales одним INSERT ... ON CONFLICT по ключу (year, month, product_id);
+новые названия товаров предварительно добавляются в справочник products, в той
+же транзакции сводные таблицы получают приращения и увеличивается версия данных. В остальных СУБД используется bulk_create с update_conflicts.
+Строки, значения которых не изменились, не перезаписываются: повторная
+загрузка тех же данных не меняет версию данных и не сбрасывает кэш.
+"""
+import csv
+import io
+import json
+
+from django.db import connection, transaction
+
+from .forms import MonthlySalesForm
+from .models import MonthlySales, Product
+from . import cache, changes, rollups
+
+
+FIELDS = ('year', 'month', 'product_name', 'quantity', 'revenue')
+
+STAGING_TABLE = 'monthly_sales_import'
+DELTA_TABLE = 'monthly_sales_import_delta'
+
+# Исходы загрузки строки
+CREATED = 'created'
+UPDATED = 'updated'
+UNCHANGED = 'unchanged'
+
+
+class MonthlySalesImportForm(MonthlySalesForm):
+    """Проверка строки импорта: правила формы, но без проверки уникальности - запись обновляется"""
+
+    def validate_unique(self):
+        pass
+
+
+def iter_csv(stream):
+    """Записи из CSV с заголовком year,month,product_name,quantity,revenue; нумерация строк файла с 2"""
+    reader = csv.DictReader(stream)
+    for line_no, row in enumerate(reader, start=2):
+        yield line_no, row
+
+
+def iter_jsonl(stream):
+    """Записи из файла JSON Lines (по объекту на строку)"""
+    for line_no, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            yield line_no, {'__error__': f'Некорректный JSON: {exc}'}
+            continue
+        yield line_no, record if isinstance(record, dict) else {'__error__': 'Ожидался JSON-объект'}
+
+
+def iter_records(stream, fmt):
+    """Записи файла в формате 'csv' или 'jsonl'"""
+    if fmt == 'csv':
+        return iter_csv(stream)
+    elif fmt == 'jsonl':
+        return iter_jsonl(stream)
+    raise ValueError(f'Неизвестный формат: {fmt}')
+
+
+def detect_format(filename):
+    """Формат по расширению файла"""
+    return 'jsonl' if filename.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def validate_record(record):
+    """
+    Проверка записи по правилам формы: (строка (year, month, product_name, quantity, revenue), None)
+    или (None, {поле: [ошибки]})
+    """
+    if '__error__' in record:
+        return None, {'__all__': [record['__error__']]}
+    form = MonthlySalesImportForm(data={field: record.get(field) for field in FIELDS})
+    if not form.is_valid():
+        return None, {field: list(messages) for field, messages in form.errors.items()}
+    data = form.cleaned_data
+    return tuple(data[field] for field in FIELDS), None
+
+
+class ImportResult:
+    """Итоги импорта: число обработанных и загруженных строк, ошибки по строкам"""
+
+    def __init__(self, max_errors):
+        self.max_errors = max_errors
+        self.processed = 0
+        self.imported = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, line_no, errors):
+        self.error_count += 1
+        # Список ошибок ограничен, чтобы файл из одних ошибок не занял всю память
+        if len(self.errors) < self.max_errors:
+            self.errors.append((line_no, errors))
+
+    def as_dict(self):
+        return {
+            'processed': self.processed,
+            'imported': self.imported,
+            'error_count': self.error_count,
+            'errors': [{'line': line_no, 'errors': errors} for line_no, errors in self.errors],
+        }
+
+
+class SalesImporter:
+    """Загрузчик записей MonthlySales порциями с upsert по (year, month, товар)"""
+
+    def __init__(self, chunk_size=10000, max_errors=1000):
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+
+    def run(self, records):
+        """Загружает записи (пары (номер строки, dict)) и возвращает ImportResult"""
+        result = ImportResult(self.max_errors)
+        chunk = {}
+        for line_no, record in records:
+            result.processed += 1
+            row = self.clean(line_no, record, result)
+            if row is None:
+                continue
+            result.imported += 1
+            # Повтор ключа внутри порции: побеждает последняя строка, как при последовательной загрузке
+            chunk[row[:3]] = row
+            if len(chunk) >= self.chunk_size:
+                self.load(list(chunk.values()))
+                chunk = {}
+        if chunk:
+            self.load(list(chunk.values()))
+        return result
+
+    def clean(self, line_no, record, result):
+        """Проверенная строка (year, month, product_name, quantity, revenue) или None с записью ошибки"""
+        if '__error__' in record:
+            result.add_error(line_no, {'__all__': [record['__error__']]})
+            return None
+        row, errors = validate_record(record)
+        if errors:
+            result.add_error(line_no, errors)
+        return row
+
+    def load(self, rows):
+        """
+        Загружает порцию проверенных строк без повторов ключа.
+        Возвращает исход по ключам: {(year, month, product_name): CREATED / UPDATED / UNCHANGED}.
+        """
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                return self._load_postgresql(rows)
+            return self._load_generic(rows)
+
+    def _load_generic(self, rows):
+        product_ids = Product.objects.ids_for(row[2] for row in rows)
+        existing = {
+            (year, month, product_id): (quantity, revenue)
+            for year, month, product_id, quantity, revenue in MonthlySales.objects.filter(
+                year__in={row[0] for row in rows},
+                month__in={row[1] for row in rows},
+                product__in=set(product_ids.values()),
+            ).values_list('year', 'month', 'product_id', 'quantity', 'revenue')
+        }
+        outcomes = {}
+        changed = []
+        for row in rows:
+            previous = existing.get((row[0], row[1], product_ids[row[2]]))
+            if previous is None:
+                outcomes[row[:3]] = CREATED
+            elif previous == row[3:]:
+                outcomes[row[:3]] = UNCHANGED
+                continue
+            else:
+                outcomes[row[:3]] = UPDATED
+            changed.append(row)
+
+        if changed:
+            MonthlySales.objects.bulk_create(
+                [
+                    MonthlySales(
+                        year=year, month=month, product_id=product_ids[product_name],
+                        quantity=quantity, revenue=revenue,
+                    )
+                    for year, month, product_name, quantity, revenue in changed
+                ],
+                update_conflicts=True,
+                unique_fields=['year', 'month', 'product'],
+                update_fields=['quantity', 'revenue'],
+            )
+            rollups.refresh(
+                years={row[0] for row in changed},
+                products={row[2] for row in changed},
+            )
+            changes.record(row[:3] for row in changed)
+        return outcomes
+
+    def _load_postgresql(self, rows):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} (
+                    year integer, month integer, product_name varchar(200),
+                    quantity integer, revenue numeric(12, 2), product_id integer
+                ) ON COMMIT DELETE ROWS
+            """)
+            cursor.execute(f"""
+                CREATE TEMP TABLE IF NOT EXISTS {DELTA_TABLE} (
+                    year integer, month integer, product_name varchar(200),
+                    quantity bigint, revenue numeric(18, 2), rows integer
+                ) ON COMMIT DELETE ROWS
+            """)
+            # Внутри внешней транзакции (ATOMIC_REQUESTS, API пакетной загрузки) COMMIT между
+            # порциями нет - строки прошлой порции удаляются явно, иначе приращения учтутся дважды
+            cursor.execute(f'TRUNCATE {STAGING_TABLE}, {DELTA_TABLE}')
+            cursor.copy_expert(
+                f"COPY {STAGING_TABLE} ({', '.join(FIELDS)}) FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+            # Новые товары - в справочник, записи порции получают ключи товаров
+            cursor.execute(f"""
+                INSERT INTO products (name) SELECT DISTINCT product_name FROM {STAGING_TABLE}
+                ON CONFLICT (name) DO NOTHING
+            """)
+            cursor.execute(f"""
+                UPDATE {STAGING_TABLE} AS s SET product_id = p.id
+                FROM products AS p WHERE p.name = s.product_name
+            """)
+            # Параллельные записи ждут окончания порции, чтобы приращения были точными; чтение не блокируется
+            cursor.execute('LOCK TABLE monthly_sales IN SHARE ROW EXCLUSIVE MODE')
+
+            # Приращения для сводных таблиц: новые значения минус старые
+            cursor.execute(f"""
+                INSERT INTO {DELTA_TABLE} (year, month, product_name, quantity, revenue, rows)
+                SELECT s.year, s.month, s.product_name,
+                       s.quantity - COALESCE(m.quantity, 0),
+                       s.revenue - COALESCE(m.revenue, 0),
+                       CASE WHEN m.id IS NULL THEN 1 ELSE 0 END
+                FROM {STAGING_TABLE} s
+                LEFT JOIN monthly_sales m
+                    ON m.year = s.year AND m.month = s.month AND m.product_id = s.product_id
+            """)
+            cursor.execute(f"""
+                SELECT year, month, product_name, rows, quantity <> 0 OR revenue <> 0 FROM {DELTA_TABLE}
+            """)
+            outcomes = {
+                (year, month, product_name): CREATED if rows else UPDATED if changed else UNCHANGED
+                for year, month, product_name, rows, changed in cursor.fetchall()
+            }
+            rollup_groups = [
+                ('monthly_totals', ('year', 'month')),
+                ('product_totals', ('product_name',)),
+                ('product_year_totals', ('product_name', 'year')),
+            ]
+            for table, keys in rollup_groups:
+                key_list = ', '.join(keys)
+                cursor.execute(f"""
+                    INSERT INTO {table} ({key_list}, quantity, revenue, rows)
+                    SELECT {key_list}, SUM(quantity), SUM(revenue), SUM(rows)
+                    FROM {DELTA_TABLE}
+                    WHERE rows <> 0 OR quantity <> 0 OR revenue <> 0
+                    GROUP BY {key_list}
+                    ON CONFLICT ({key_list}) DO UPDATE SET
+                        quantity = {table}.quantity + EXCLUDED.quantity,
+                        revenue = {table}.revenue + EXCLUDED.revenue,
+                        rows = {table}.rows + EXCLUDED.rows
+                """)
+            cursor.execute(f"""
+                INSERT INTO monthly_sales (year, month, product_id, quantity, revenue)
+                SELECT year, month, product_id, quantity, revenue FROM {STAGING_TABLE}
+                ON CONFLICT (year, month, product_id) DO UPDATE SET
+                    quantity = EXCLUDED.quantity,
+                    revenue = EXCLUDED.revenue
+                WHERE (monthly_sales.quantity, monthly_sales.revenue)
+                    IS DISTINCT FROM (EXCLUDED.quantity, EXCLUDED.revenue)
+            """)
+
+        if any(outcome != UNCHANGED for outcome in outcomes.values()):
+            cache.bump_version()
+            changes.record(key for key, outcome in outcomes.items() if outcome != UNCHANGED)
+        if CREATED in outcomes.values():
+            cache.bump_catalog_version()
+        return outcomes
@@ -0,0 +1,67 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client
+
+from sales import cache
+from sales.benchmarks import summarize
+
+
+SYNC_URL = '/api/chart-data/'
+ASYNC_URL = '/api/async/chart-data/'
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность синхронного (WSGI) и асинхронного (ASGI) '
+        'API диаграмм при параллельных запросах'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Число запросов на каждый вариант')
+        parser.add_argument('--concurrency', type=int, default=16, help='Число одновременных запросов')
+        parser.add_argument('--query', default='type=all', help='Параметры запроса API')
+        parser.add_argument('--cold', action='store_true', help='Очищать кэш ответов перед каждым запросом')
+
+    def handle(self, *args, **options):
+        query = options['query']
+        results = {
+            'sync': self.run_sync(f'{SYNC_URL}?{query}', options),
+            'async': asyncio.run(self.run_async(f'{ASYNC_URL}?{query}', options)),
+        }
+        self.stdout.write(json.dumps(results, indent=2, ensure_ascii=False))
+
+    def run_sync(self, url, options):
+        """Синхронные представления: пул потоков, как у многопоточного WSGI-сервера"""
+        def request(_):
+            if options['cold']:
+                cache.get_backend().clear()
+            start = time.perf_counter()
+            Client().get(url)
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            latencies = list(executor.map(request, range(options['requests'])))
+        return summarize(latencies, time.perf_counter() - start)
+
+    async def run_async(self, url, options):
+        """Асинхронные представления: корутины в одном event loop, как у ASGI-сервера"""
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(options['concurrency'])
+        latencies = []
+
+        async def request():
+            async with semaphore:
+                if options['cold']:
+                    cache.get_backend().clear()
+                start = time.perf_counter()
+                await client.get(url)
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(request() for _ in range(options['requests'])))
+        return summarize(latencies, time.perf_counter() - start)
@@ -0,0 +1,194 @@
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from urllib.parse import urlencode
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from sales import cache
+from sales.benchmarks import compare, latency_stats
+from sales.models import MonthlySales, MonthlyTotal, ProductTotal
+
+
+# Показатели, по которым сравниваются прогоны; рост значения - ухудшение
+COMPARED_KEYS = ('p50_ms', 'p95_ms', 'queries', 'peak_memory_kb')
+
+BENCHMARK_USER = 'benchmark'
+
+
+def build_scenarios(year, products):
+    """Сценарии (имя, URL, нужен ли вход) для представлений и комбинаций фильтров"""
+    filters = {
+        'none': [],
+        'year': [('year', year)],
+        'products': [('products[]', product) for product in products],
+        'year+products': [('year', year)] + [('products[]', product) for product in products],
+    }
+    table_filters = {
+        'none': [],
+        'year': [('year', year)],
+        'year+month': [('year', year), ('month', 1)],
+        'products': [('products', product) for product in products],
+        'last_page': [('last', 1)],
+    }
+    scenarios = []
+    for chart_type in ('line', 'bar', 'pie', 'all'):
+        for name, params in filters.items():
+            scenarios.append((f'chart:{chart_type}:{name}', '/api/chart-data/', [('type', chart_type)] + params, False))
+    scenarios += [
+        ('chart:all:series=product', '/api/chart-data/', [('type', 'all'), ('series', 'product'), ('top_n', 10)], False),
+        ('chart:all:columnar', '/api/chart-data/', [('type', 'all'), ('format', 'columnar')], False),
+        ('chart:all:binary', '/api/chart-data/', [('type', 'all'), ('format', 'binary')], False),
+    ]
+    for name, params in table_filters.items():
+        scenarios.append((f'table:{name}', '/table/', params, False))
+        scenarios.append((f'table_rows:{name}', '/table/rows/', params, False))
+    for name in ('none', 'year', 'year+month'):
+        scenarios.append((f'manage:{name}', '/manage/', table_filters[name], True))
+    scenarios += [
+        ('export:csv:year', '/export/', [('format', 'csv'), ('year', year)], False),
+        ('analytics:quarterly', '/api/analytics/quarterly/', [], False),
+        ('analytics:top-months', '/api/analytics/top-months/', [('limit', 10)], False),
+        ('analytics:products', '/api/analytics/products/', [], False),
+    ]
+    return [(name, f'{path}?{urlencode(params)}' if params else path, login) for name, path, params, login in scenarios]
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеры производительности представлений: задержка, число SQL-запросов и пик памяти '
+        'для каждого сценария. Результат сохраняется в JSON для сравнения версий'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Число замеров на сценарий')
+        parser.add_argument('--warmup', type=int, default=2, help='Число прогревочных запросов на сценарий')
+        parser.add_argument('--cold', action='store_true', help='Очищать кэш ответов перед каждым запросом')
+        parser.add_argument('--only', help='Выполнить только сценарии, имя которых содержит эту строку')
+        parser.add_argument('--output', help='Сохранить результат в JSON-файл')
+        parser.add_argument('--compare', help='JSON-файл базового прогона для сравнения')
+        parser.add_argument(
+            '--threshold', type=float, default=10,
+            help='Порог ухудшения в процентах при сравнении (по умолчанию 10)',
+        )
+        parser.add_argument(
+            '--fail-on-regression', action='store_true', help='Завершиться с ошибкой при ухудшении',
+        )
+
+    def handle(self, *args, **options):
+        last_year = MonthlyTotal.objects.order_by('-year').values_list('year', flat=True).first()
+        if last_year is None:
+            raise CommandError('Нет данных: сначала выполните generate_sales')
+        products = list(ProductTotal.objects.order_by('-revenue').values_list('product_name', flat=True)[:3])
+
+        scenarios = build_scenarios(last_year, products)
+        if options['only']:
+            scenarios = [scenario for scenario in scenarios if options['only'] in scenario[0]]
+
+        client = Client()
+        user, created = User.objects.get_or_create(username=BENCHMARK_USER, defaults={'is_staff': True})
+        try:
+            client.force_login(user)
+            results = {}
+            for name, url, _ in scenarios:
+                results[name] = self.measure(client, url, options)
+                self.stdout.write(
+                    f'{name:32} {results[name]["p50_ms"]:9.2f} мс  p95 {results[name]["p95_ms"]:9.2f} мс  '
+                    f'SQL {results[name]["queries"]:3}  память {results[name]["peak_memory_kb"]:9.1f} КиБ'
+                )
+        finally:
+            if created:
+                user.delete()
+
+        report = {'meta': self.meta(options), 'results': results}
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f'Результат сохранен в {options["output"]}'))
+        if options['compare']:
+            self.compare(report, options)
+
+    def request(self, client, url, cold):
+        if cold:
+            cache.get_backend().clear()
+        response = client.get(url)
+        # Потоковые ответы читаются целиком, чтобы замер включал формирование тела
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def measure(self, client, url, options):
+        for _ in range(options['warmup']):
+            self.request(client, url, options['cold'])
+
+        latencies = []
+        queries = 0
+        for _ in range(options['iterations']):
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                response, body = self.request(client, url, options['cold'])
+                latencies.append(time.perf_counter() - start)
+            queries = max(queries, len(context.captured_queries))
+
+        # Память замеряется отдельным запросом: tracemalloc замедляет выполнение
+        tracemalloc.start()
+        try:
+            self.request(client, url, options['cold'])
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'url': url,
+            'status': response.status_code,
+            'iterations': options['iterations'],
+            **latency_stats(latencies),
+            'queries': queries,
+            'peak_memory_kb': round(peak / 1024, 1),
+            'response_bytes': len(body),
+        }
+
+    def meta(self, options):
+        try:
+            revision = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR,
+            ).stdout.strip() or None
+        except OSError:
+            revision = None
+        return {
+            'created_at': timezone.now().isoformat(),
+            'revision': revision,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'rows': MonthlySales.objects.count(),
+            'products': ProductTotal.objects.count(),
+            'iterations': options['iterations'],
+            'cold_cache': options['cold'],
+        }
+
+    def compare(self, report, options):
+        with open(options['compare'], encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = []
+        self.stdout.write(f'\nСравнение с {options["compare"]} (ревизия {baseline["meta"].get("revision")}):')
+        for name, current in report['results'].items():
+            previous = baseline['results'].get(name)
+            if previous is None:
+                continue
+            changes = compare(previous, current, COMPARED_KEYS)
+            worse = [key for key, change in changes.items() if change > options['threshold']]
+            changes_text = '  '.join(f'{key} {change:+.1f}%' for key, change in changes.items())
+            self.stdout.write(f'{name:32} {changes_text}' + ('  УХУДШЕНИЕ' if worse else ''))
+            if worse:
+                regressions.append(name)
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f'Ухудшение в сценариях: {", ".join(regressions)}')
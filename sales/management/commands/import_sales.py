@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from sales.importer import SalesImporter, detect_format, iter_records
+
+
+class Command(BaseCommand):
+    help = 'Загружает данные о продажах из файла CSV или JSONL (upsert по году, месяцу и товару)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Формат файла (по умолчанию - по расширению)')
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Размер порции загрузки')
+        parser.add_argument('--max-errors', type=int, default=1000, help='Сколько ошибок выводить')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or detect_format(path)
+        importer = SalesImporter(chunk_size=options['chunk_size'], max_errors=options['max_errors'])
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as stream:
+                result = importer.run(iter_records(stream, fmt))
+        except OSError as exc:
+            raise CommandError(f'Не удалось прочитать файл: {exc}')
+
+        for line_no, errors in result.errors:
+            details = '; '.join(f'{field}: {" ".join(messages)}' for field, messages in errors.items())
+            self.stderr.write(f'Строка {line_no}: {details}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано строк: {result.processed}, загружено: {result.imported}, '
+            f'с ошибками: {result.error_count}'
+        ))
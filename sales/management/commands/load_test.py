@@ -0,0 +1,61 @@
+import json
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sales.benchmarks import compare, summarize
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест запущенного сервера (WSGI или ASGI): задержки p50/p99 '
+        'и пропускная способность. Например, для сравнения режимов соединений с БД: '
+        'запуск с DB_POOL=0 и --output base.json, затем с DB_POOL=1 и --compare base.json'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='Адрес, например http://127.0.0.1:8000/api/chart-data/?type=all')
+        parser.add_argument('--requests', type=int, default=1000, help='Число запросов')
+        parser.add_argument('--concurrency', type=int, default=20, help='Число одновременных клиентов')
+        parser.add_argument('--warmup', type=int, default=50, help='Число прогревочных запросов (не учитываются)')
+        parser.add_argument('--output', help='Сохранить результат в JSON-файл')
+        parser.add_argument('--compare', help='JSON-файл с результатом базового прогона')
+
+    def handle(self, *args, **options):
+        url = options['url']
+        for _ in range(options['warmup']):
+            self.fetch(url)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            results = list(executor.map(lambda _: self.fetch(url), range(options['requests'])))
+        elapsed = time.perf_counter() - start
+
+        latencies = [latency for latency, ok in results if ok]
+        errors = len(results) - len(latencies)
+        if not latencies:
+            raise CommandError('Все запросы завершились ошибкой')
+
+        result = summarize(latencies, elapsed)
+        result.update({'url': url, 'concurrency': options['concurrency'], 'errors': errors})
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as baseline:
+                result['change_percent'] = compare(json.load(baseline), result)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(result, output, indent=2, ensure_ascii=False)
+        self.stdout.write(json.dumps(result, indent=2, ensure_ascii=False))
+
+    def fetch(self, url):
+        """Время запроса в секундах и признак успешного ответа"""
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url, timeout=30) as response:
+                response.read()
+                ok = response.status < 500
+        except (urllib.error.URLError, OSError):
+            ok = False
+        return time.perf_counter() - start, ok
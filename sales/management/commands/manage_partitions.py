@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from sales import partitions
+
+
+class Command(BaseCommand):
+    help = (
+        'Секции monthly_sales по годам: создание секций на будущие годы, '
+        'архивация старых лет без блокировки таблицы и восстановление из архива'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=2, help='На сколько лет вперед создать секции (по умолчанию 2)')
+        parser.add_argument('--from-year', type=int, help='Создать секции начиная с этого года')
+        parser.add_argument('--list', action='store_true', help='Показать секции и архив')
+        parser.add_argument('--archive', type=int, metavar='YEAR', help='Отсоединить секцию года и перенести в архив')
+        parser.add_argument('--dump', help='Выгрузить архивируемый год в CSV-файл')
+        parser.add_argument('--drop', action='store_true', help='Удалить секцию после архивации')
+        parser.add_argument('--restore', type=int, metavar='YEAR', help='Вернуть секцию года из архива')
+
+    def handle(self, *args, **options):
+        try:
+            if options['archive']:
+                count = partitions.archive_year(options['archive'], options['dump'], options['drop'])
+                self.stdout.write(self.style.SUCCESS(
+                    f'Секция за {options["archive"]} год отсоединена, строк: {count}'
+                ))
+            elif options['restore']:
+                partitions.restore_year(options['restore'])
+                self.stdout.write(self.style.SUCCESS(f'Секция за {options["restore"]} год восстановлена'))
+            elif not options['list']:
+                current_year = timezone.now().year
+                first = options['from_year'] or current_year
+                created = partitions.ensure_years(first, current_year + options['ahead'])
+                if created:
+                    self.stdout.write(self.style.SUCCESS(
+                        f'Созданы секции: {", ".join(map(str, created))}'
+                    ))
+                else:
+                    self.stdout.write('Все секции уже созданы')
+
+            years = partitions.year_partitions()
+            self.stdout.write(f'Секции: {years[0]}-{years[-1]}' if years else 'Секций по годам нет')
+            archived = partitions.archived_years()
+            if archived:
+                self.stdout.write(f'В архиве: {", ".join(map(str, archived))}')
+        except partitions.PartitioningError as exc:
+            raise CommandError(exc)
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from sales import changes
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет старую часть ленты изменений (sales_changes). Клиенты с версией старше '
+        'оставшейся части загрузят диаграммы заново. Удобно запускать по расписанию (cron)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-versions', type=int, default=10000,
+            help='Сколько последних версий данных оставить в ленте (по умолчанию 10000)',
+        )
+
+    def handle(self, *args, **options):
+        deleted = changes.prune(options['keep_versions'])
+        self.stdout.write(self.style.SUCCESS(f'Удалено строк ленты изменений: {deleted}'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from sales import rollups
+from sales.models import MonthlyTotal, ProductTotal, ProductYearTotal
+
+
+class Command(BaseCommand):
+    help = 'Полностью пересчитывает сводные таблицы продаж по таблице monthly_sales'
+
+    def handle(self, *args, **options):
+        rollups.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Сводные таблицы пересчитаны: месяцев - {MonthlyTotal.objects.count()}, '
+            f'товаров - {ProductTotal.objects.count()}, '
+            f'товаров по годам - {ProductYearTotal.objects.count()}'
+        ))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from sales import analytics
+
+
+class Command(BaseCommand):
+    help = (
+        'Обновляет материализованные представления аналитики (REFRESH ... CONCURRENTLY). '
+        'Удобно запускать по расписанию (cron)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--if-needed', action='store_true',
+            help='Обновлять, только если накопилось ANALYTICS_REFRESH_THRESHOLD изменений',
+        )
+        parser.add_argument(
+            '--blocking', action='store_true',
+            help='Обычный REFRESH без CONCURRENTLY (быстрее, но блокирует чтение)',
+        )
+
+    def handle(self, *args, **options):
+        if not analytics.is_materialized():
+            self.stdout.write('Представления не материализованы (не PostgreSQL) - обновление не требуется')
+            return
+        pending = analytics.pending_changes()
+        if options['if_needed']:
+            refreshed = analytics.refresh_if_needed()
+        else:
+            refreshed = analytics.refresh(concurrently=not options['blocking'])
+        if refreshed:
+            self.stdout.write(self.style.SUCCESS(f'Представления обновлены, учтено изменений: {pending}'))
+        else:
+            self.stdout.write(f'Обновление не выполнено, изменений после прошлого обновления: {pending}')
@@ -0,0 +1,205 @@
+"""
+Метрики запросов: число SQL-запросов, время в БД, время рендеринга шаблонов
+и сериализации. Для каждого запроса отдаются в заголовке Server-Timing,
+а по представлениям накапливаются гистограммы, доступные на /metrics/.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connections
+
+
+# Границы корзин гистограмм
+TIME_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+STAGES = ('template', 'serialize')
+
+
+class Histogram:
+    """Кумулятивная гистограмма в формате Prometheus"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+
+class MetricsRegistry:
+    """Гистограммы по представлениям в памяти процесса"""
+
+    METRICS = {
+        'request_duration_ms': TIME_BUCKETS_MS,
+        'db_duration_ms': TIME_BUCKETS_MS,
+        'db_queries': COUNT_BUCKETS,
+        'template_duration_ms': TIME_BUCKETS_MS,
+        'serialize_duration_ms': TIME_BUCKETS_MS,
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def observe(self, view_name, values):
+        with self._lock:
+            histograms = self._views.get(view_name)
+            if histograms is None:
+                histograms = {name: Histogram(buckets) for name, buckets in self.METRICS.items()}
+                self._views[view_name] = histograms
+            for name, value in values.items():
+                histograms[name].observe(value)
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    def snapshot(self):
+        """Копия счетчиков: {представление: {метрика: (корзины, сумма, количество)}}"""
+        with self._lock:
+            return {
+                view_name: {
+                    name: (list(histogram.cumulative()), histogram.sum, histogram.count)
+                    for name, histogram in histograms.items()
+                }
+                for view_name, histograms in self._views.items()
+            }
+
+    def render_prometheus(self):
+        """Текстовый формат экспозиции Prometheus"""
+        lines = []
+        snapshot = self.snapshot()
+        for name in self.METRICS:
+            metric = f'sales_{name}'
+            lines.append(f'# TYPE {metric} histogram')
+            for view_name, histograms in sorted(snapshot.items()):
+                buckets, total, count = histograms[name]
+                for bound, value in buckets:
+                    lines.append(f'{metric}_bucket{{view="{view_name}",le="{bound}"}} {value}')
+                lines.append(f'{metric}_sum{{view="{view_name}"}} {total:.3f}')
+                lines.append(f'{metric}_count{{view="{view_name}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+class RequestMetrics:
+    """Метрики одного запроса"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.stages = dict.fromkeys(STAGES, 0.0)
+        # Асинхронные представления выполняют запросы из нескольких потоков
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        # Обертка выполнения SQL (connection.execute_wrapper)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.db_time += elapsed
+                self.queries += 1
+
+
+# Метрики текущего запроса; контекст переносится и в потоки sync_to_async
+current_metrics = ContextVar('current_metrics', default=None)
+
+
+@contextmanager
+def track_queries():
+    """Учитывает SQL-запросы текущего потока в метриках текущего HTTP-запроса"""
+    request_metrics = current_metrics.get()
+    with ExitStack() as stack:
+        if request_metrics is not None:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(request_metrics))
+        yield
+
+
+@contextmanager
+def stage(request, name):
+    """Замер этапа обработки запроса ('template' или 'serialize')"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        request_metrics = getattr(request, 'metrics', None)
+        if request_metrics is not None:
+            request_metrics.stages[name] += time.perf_counter() - start
+
+
+class QueryMetricsMiddleware:
+    """Собирает метрики запроса, добавляет заголовок Server-Timing и пополняет гистограммы"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.metrics = RequestMetrics()
+        token = current_metrics.set(request.metrics)
+        start = time.perf_counter()
+        try:
+            with track_queries():
+                response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        request.metrics = RequestMetrics()
+        token = current_metrics.set(request.metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, time.perf_counter() - start)
+
+    def finish(self, request, response, duration):
+        request_metrics = request.metrics
+        timings = [
+            f'db;dur={request_metrics.db_time * 1000:.2f};desc="SQL x{request_metrics.queries}"',
+        ]
+        for name, value in request_metrics.stages.items():
+            if value:
+                timings.append(f'{name};dur={value * 1000:.2f}')
+        timings.append(f'total;dur={duration * 1000:.2f}')
+        response['Server-Timing'] = ', '.join(timings)
+
+        match = request.resolver_match
+        if match is not None:
+            registry.observe(match.view_name, {
+                'request_duration_ms': duration * 1000,
+                'db_duration_ms': request_metrics.db_time * 1000,
+                'db_queries': request_metrics.queries,
+                'template_duration_ms': request_metrics.stages['template'] * 1000,
+                'serialize_duration_ms': request_metrics.stages['serialize'] * 1000,
+            })
+        return response
@@ -0,0 +1,82 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:59
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_rollups(apps, schema_editor):
+    """Заполняет сводные таблицы по уже загруженным данным"""
+    MonthlySales = apps.get_model('sales', 'MonthlySales')
+    aggregates = {'quantity': Sum('quantity'), 'revenue': Sum('revenue'), 'rows': Count('id')}
+    groupings = [
+        ('MonthlyTotal', ('year', 'month')),
+        ('ProductTotal', ('product_name',)),
+        ('ProductYearTotal', ('product_name', 'year')),
+    ]
+    for model_name, fields in groupings:
+        model = apps.get_model('sales', model_name)
+        data = MonthlySales.objects.values(*fields).annotate(**aggregates).order_by()
+        model.objects.bulk_create(model(**item) for item in data)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_name', models.CharField(max_length=200, unique=True, verbose_name='Название товара')),
+                ('quantity', models.BigIntegerField(default=0, verbose_name='Количество проданных единиц')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='Выручка')),
+                ('rows', models.IntegerField(default=0, verbose_name='Количество записей')),
+            ],
+            options={
+                'verbose_name': 'Итог по товару',
+                'verbose_name_plural': 'Итоги по товарам',
+                'db_table': 'product_totals',
+                'ordering': ['product_name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductYearTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_name', models.CharField(max_length=200, verbose_name='Название товара')),
+                ('year', models.IntegerField(verbose_name='Год')),
+                ('quantity', models.BigIntegerField(default=0, verbose_name='Количество проданных единиц')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='Выручка')),
+                ('rows', models.IntegerField(default=0, verbose_name='Количество записей')),
+            ],
+            options={
+                'verbose_name': 'Итог по товару за год',
+                'verbose_name_plural': 'Итоги по товарам за год',
+                'db_table': 'product_year_totals',
+                'ordering': ['year', 'product_name'],
+                'unique_together': {('year', 'product_name')},
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlyTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField(verbose_name='Год')),
+                ('month', models.IntegerField(choices=[(1, 'Январь'), (2, 'Февраль'), (3, 'Март'), (4, 'Апрель'), (5, 'Май'), (6, 'Июнь'), (7, 'Июль'), (8, 'Август'), (9, 'Сентябрь'), (10, 'Октябрь'), (11, 'Ноябрь'), (12, 'Декабрь')], verbose_name='Месяц')),
+                ('quantity', models.BigIntegerField(default=0, verbose_name='Количество проданных единиц')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='Выручка')),
+                ('rows', models.IntegerField(default=0, verbose_name='Количество записей')),
+            ],
+            options={
+                'verbose_name': 'Итог по месяцу',
+                'verbose_name_plural': 'Итоги по месяцам',
+                'db_table': 'monthly_totals',
+                'ordering': ['year', 'month'],
+                'unique_together': {('year', 'month')},
+            },
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
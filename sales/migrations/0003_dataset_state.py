@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:00
+
+from django.db import migrations, models
+
+
+def create_state(apps, schema_editor):
+    DatasetState = apps.get_model('sales', 'DatasetState')
+    DatasetState.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0002_rollup_tables'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DatasetState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0, verbose_name='Версия данных')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Время изменения')),
+            ],
+            options={
+                'verbose_name': 'Состояние данных',
+                'verbose_name_plural': 'Состояние данных',
+                'db_table': 'dataset_state',
+            },
+        ),
+        migrations.RunPython(create_state, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:02
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0003_dataset_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasetstate',
+            name='catalog_updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время изменения справочника'),
+        ),
+        migrations.AddField(
+            model_name='datasetstate',
+            name='catalog_version',
+            field=models.BigIntegerField(default=0, verbose_name='Версия справочника фильтров'),
+        ),
+    ]
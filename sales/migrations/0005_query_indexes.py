@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0004_catalog_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='monthlysales',
+            index=models.Index(fields=['-year', '-month', 'product_name', 'id'], name='monthly_sales_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='monthlysales',
+            index=models.Index(fields=['product_name', 'year', 'month'], include=('revenue', 'quantity'), name='monthly_sales_product_idx'),
+        ),
+    ]
@@ -0,0 +1,133 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:18
+
+from django.db import migrations, models
+
+
+# Аналитика строится по сводным таблицам (те же суммы, что и по monthly_sales,
+# но обновление читает O(месяцев + товаров) строк вместо всей таблицы продаж)
+VIEWS = {
+    'sales_quarterly_revenue': """
+        SELECT year * 10 + (month - 1) / 3 + 1 AS id,
+               year,
+               (month - 1) / 3 + 1 AS quarter,
+               SUM(quantity) AS quantity,
+               SUM(revenue) AS revenue
+        FROM monthly_totals
+        GROUP BY year, (month - 1) / 3 + 1
+    """,
+    'sales_month_revenue': """
+        SELECT year * 100 + month AS id,
+               year,
+               month,
+               quantity,
+               revenue,
+               RANK() OVER (ORDER BY revenue DESC) AS revenue_rank
+        FROM monthly_totals
+    """,
+    'sales_product_averages': """
+        SELECT product_name,
+               rows AS months,
+               quantity,
+               revenue,
+               ROUND(quantity * 1.0 / rows, 2) AS avg_quantity,
+               ROUND(revenue * 1.0 / rows, 2) AS avg_revenue
+        FROM product_totals
+        WHERE rows > 0
+    """,
+}
+
+# Уникальные индексы нужны для REFRESH MATERIALIZED VIEW CONCURRENTLY
+INDEXES = [
+    'CREATE UNIQUE INDEX sales_quarterly_revenue_id ON sales_quarterly_revenue (id)',
+    'CREATE UNIQUE INDEX sales_month_revenue_id ON sales_month_revenue (id)',
+    'CREATE INDEX sales_month_revenue_rank ON sales_month_revenue (revenue_rank)',
+    'CREATE UNIQUE INDEX sales_product_averages_name ON sales_product_averages (product_name)',
+]
+
+
+def create_views(apps, schema_editor):
+    """В PostgreSQL - материализованные представления, в остальных СУБД - обычные"""
+    postgresql = schema_editor.connection.vendor == 'postgresql'
+    for name, sql in VIEWS.items():
+        kind = 'MATERIALIZED VIEW' if postgresql else 'VIEW'
+        schema_editor.execute(f'CREATE {kind} {name} AS {sql}')
+    if postgresql:
+        for sql in INDEXES:
+            schema_editor.execute(sql)
+
+
+def drop_views(apps, schema_editor):
+    kind = 'MATERIALIZED VIEW' if schema_editor.connection.vendor == 'postgresql' else 'VIEW'
+    for name in VIEWS:
+        schema_editor.execute(f'DROP {kind} IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0005_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthRevenue',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('year', models.IntegerField(verbose_name='Год')),
+                ('month', models.IntegerField(verbose_name='Месяц')),
+                ('quantity', models.BigIntegerField(verbose_name='Количество проданных единиц')),
+                ('revenue', models.DecimalField(decimal_places=2, max_digits=18, verbose_name='Выручка')),
+                ('revenue_rank', models.BigIntegerField(verbose_name='Место по выручке')),
+            ],
+            options={
+                'verbose_name': 'Выручка по месяцам',
+                'verbose_name_plural': 'Выручка по месяцам',
+                'db_table': 'sales_month_revenue',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductAverage',
+            fields=[
+                ('product_name', models.CharField(max_length=200, primary_key=True, serialize=False, verbose_name='Название товара')),
+                ('months', models.IntegerField(verbose_name='Количество месяцев')),
+                ('quantity', models.BigIntegerField(verbose_name='Количество проданных единиц')),
+                ('revenue', models.DecimalField(decimal_places=2, max_digits=18, verbose_name='Выручка')),
+                ('avg_quantity', models.DecimalField(decimal_places=2, max_digits=18, verbose_name='Среднее количество')),
+                ('avg_revenue', models.DecimalField(decimal_places=2, max_digits=18, verbose_name='Средняя выручка')),
+            ],
+            options={
+                'verbose_name': 'Средние продажи товара',
+                'verbose_name_plural': 'Средние продажи товаров',
+                'db_table': 'sales_product_averages',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='QuarterlyRevenue',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('year', models.IntegerField(verbose_name='Год')),
+                ('quarter', models.IntegerField(verbose_name='Квартал')),
+                ('quantity', models.BigIntegerField(verbose_name='Количество проданных единиц')),
+                ('revenue', models.DecimalField(decimal_places=2, max_digits=18, verbose_name='Выручка')),
+            ],
+            options={
+                'verbose_name': 'Выручка по кварталам',
+                'verbose_name_plural': 'Выручка по кварталам',
+                'db_table': 'sales_quarterly_revenue',
+                'managed': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='datasetstate',
+            name='analytics_refreshed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Время обновления аналитики'),
+        ),
+        migrations.AddField(
+            model_name='datasetstate',
+            name='analytics_version',
+            field=models.BigIntegerField(default=0, verbose_name='Версия данных аналитики'),
+        ),
+        migrations.RunPython(create_views, drop_views),
+    ]
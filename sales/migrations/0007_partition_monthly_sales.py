@@ -0,0 +1,95 @@
+from django.db import migrations
+from django.utils import timezone
+
+
+# Секции по годам: monthly_sales_y<год>; годы до первой секции попадают в
+# monthly_sales_history, после последней - в monthly_sales_future
+# (диапазоны с MINVALUE/MAXVALUE вместо DEFAULT-секции, чтобы годы можно было
+# отсоединять через DETACH PARTITION ... CONCURRENTLY)
+TABLE = 'monthly_sales'
+BACKUP = 'monthly_sales_unpartitioned'
+
+
+def _table_definition(cursor):
+    """Индексы, ограничения (кроме первичного ключа) и последовательность id таблицы"""
+    cursor.execute("""
+        SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = %s::regclass AND contype IN ('u', 'c', 'f') AND conparentid = 0
+    """, [TABLE])
+    constraints = cursor.fetchall()
+    cursor.execute("""
+        SELECT i.indexrelid::regclass::text, pg_get_indexdef(i.indexrelid) FROM pg_index i
+        WHERE i.indrelid = %s::regclass
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+    """, [TABLE])
+    indexes = cursor.fetchall()
+    cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [TABLE, 'id'])
+    sequence = cursor.fetchone()[0]
+    return constraints, indexes, sequence
+
+
+def _rebuild(schema_editor, partitioned):
+    """Пересоздает monthly_sales секционированной (или обычной) таблицей с теми же данными и индексами"""
+    with schema_editor.connection.cursor() as cursor:
+        constraints, indexes, sequence = _table_definition(cursor)
+        cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {BACKUP}')
+        if sequence:
+            # Освобождаем имя последовательности для новой таблицы
+            cursor.execute(f'ALTER SEQUENCE {sequence} RENAME TO {BACKUP}_id_seq')
+
+        if partitioned:
+            cursor.execute(f'CREATE TABLE {TABLE} (LIKE {BACKUP}) PARTITION BY RANGE (year)')
+            cursor.execute(f'SELECT MIN(year), MAX(year) FROM {BACKUP}')
+            first, last = cursor.fetchone()
+            current_year = timezone.now().year
+            first = min(first or current_year, current_year)
+            last = max(last or current_year, current_year + 1)
+            cursor.execute(
+                f'CREATE TABLE {TABLE}_history PARTITION OF {TABLE} FOR VALUES FROM (MINVALUE) TO ({first})'
+            )
+            for year in range(first, last + 1):
+                cursor.execute(
+                    f'CREATE TABLE {TABLE}_y{year} PARTITION OF {TABLE} FOR VALUES FROM ({year}) TO ({year + 1})'
+                )
+            cursor.execute(
+                f'CREATE TABLE {TABLE}_future PARTITION OF {TABLE} FOR VALUES FROM ({last + 1}) TO (MAXVALUE)'
+            )
+            # Ключ секционирования должен входить в первичный ключ
+            primary_key = '(id, year)'
+        else:
+            cursor.execute(f'CREATE TABLE {TABLE} (LIKE {BACKUP})')
+            primary_key = '(id)'
+
+        cursor.execute(f'CREATE SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id')
+        cursor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{TABLE}_id_seq')")
+        cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {BACKUP}')
+        cursor.execute(f"SELECT setval('{TABLE}_id_seq', COALESCE(MAX(id), 0) + 1, false) FROM {TABLE}")
+        cursor.execute(f'DROP TABLE {BACKUP}')
+
+        cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY {primary_key}')
+        for name, definition in constraints:
+            cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}')
+        for name, definition in indexes:
+            # Определение индекса ссылается на таблицу по имени monthly_sales
+            cursor.execute(definition)
+
+
+def partition(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        _rebuild(schema_editor, partitioned=True)
+
+
+def unpartition(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        _rebuild(schema_editor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0006_analytics_views'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, unpartition),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:29
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def start_feed(apps, schema_editor):
+    """Сброс на текущей версии: клиенты с более ранней версией загрузят диаграммы заново"""
+    DatasetState = apps.get_model('sales', 'DatasetState')
+    SalesChange = apps.get_model('sales', 'SalesChange')
+    state = DatasetState.objects.filter(pk=1).first()
+    SalesChange.objects.create(version=state.version if state else 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0007_partition_monthly_sales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(verbose_name='Версия данных')),
+                ('year', models.IntegerField(null=True, verbose_name='Год')),
+                ('month', models.IntegerField(null=True, verbose_name='Месяц')),
+                ('product_name', models.CharField(max_length=200, null=True, verbose_name='Название товара')),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время изменения')),
+            ],
+            options={
+                'verbose_name': 'Изменение данных',
+                'verbose_name_plural': 'Лента изменений',
+                'db_table': 'sales_changes',
+                'ordering': ['version', 'id'],
+                'indexes': [models.Index(fields=['version'], name='sales_changes_version_idx')],
+            },
+        ),
+        migrations.RunPython(start_feed, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+
+# Триграммные GIN-индексы для поиска товаров по подстроке и с опечатками:
+# product_totals - автодополнение в фильтрах, monthly_sales - поиск в админке
+INDEXES = {
+    'product_totals_name_trgm_idx': 'product_totals',
+    'monthly_sales_name_trgm_idx': 'monthly_sales',
+}
+
+
+def create_indexes(apps, schema_editor):
+    """Только PostgreSQL: в остальных СУБД поиск выполняется LIKE без индекса"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table in INDEXES.items():
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin (product_name gin_trgm_ops)')
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0008_change_feed'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
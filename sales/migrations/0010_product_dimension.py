@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0009_product_trigram_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Product',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=200, unique=True, verbose_name='Название товара')),
+            ],
+            options={
+                'verbose_name': 'Товар',
+                'verbose_name_plural': 'Товары',
+                'db_table': 'products',
+                'ordering': ['name'],
+            },
+        ),
+        # Ключ товара заполняется в 0011, название удаляется в 0012
+        migrations.AddField(
+            model_name='monthlysales',
+            name='product',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='sales', to='sales.product', verbose_name='Товар'),
+        ),
+        migrations.AlterField(
+            model_name='monthlysales',
+            name='product_name',
+            field=models.CharField(max_length=200, null=True, verbose_name='Название товара'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations
+
+
+def fill_products(apps, schema_editor):
+    """Справочник товаров из названий в monthly_sales и ключи товаров в записях"""
+    schema_editor.execute("""
+        INSERT INTO products (name)
+        SELECT DISTINCT product_name FROM monthly_sales ORDER BY product_name
+    """)
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("""
+            UPDATE monthly_sales AS m SET product_id = p.id
+            FROM products AS p WHERE p.name = m.product_name
+        """)
+    else:
+        schema_editor.execute("""
+            UPDATE monthly_sales SET product_id = (
+                SELECT p.id FROM products AS p WHERE p.name = monthly_sales.product_name
+            )
+        """)
+
+
+def fill_product_names(apps, schema_editor):
+    schema_editor.execute("""
+        UPDATE monthly_sales SET product_name = (
+            SELECT p.name FROM products AS p WHERE p.id = monthly_sales.product_id
+        ), product_id = NULL
+    """)
+    schema_editor.execute('DELETE FROM products')
+
+
+class Migration(migrations.Migration):
+
+    # Отдельная миграция (транзакция): в PostgreSQL после UPDATE с отложенной
+    # проверкой внешнего ключа нельзя менять таблицу в той же транзакции
+    dependencies = [
+        ('sales', '0010_product_dimension'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_products, fill_product_names),
+    ]
@@ -0,0 +1,62 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def move_trigram_index(apps, schema_editor):
+    """Поиск товара в админке теперь идет по справочнику: триграммный индекс - на products.name"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS monthly_sales_name_trgm_idx')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS products_name_trgm_idx ON products USING gin (name gin_trgm_ops)'
+    )
+
+
+def restore_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS products_name_trgm_idx')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS monthly_sales_name_trgm_idx ON monthly_sales '
+        'USING gin (product_name gin_trgm_ops)'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0011_backfill_products'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_trigram_index, restore_trigram_index),
+        migrations.RemoveIndex(
+            model_name='monthlysales',
+            name='monthly_sales_order_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='monthlysales',
+            name='monthly_sales_product_idx',
+        ),
+        migrations.AlterUniqueTogether(
+            name='monthlysales',
+            unique_together={('year', 'month', 'product')},
+        ),
+        migrations.RemoveField(
+            model_name='monthlysales',
+            name='product_name',
+        ),
+        migrations.AlterField(
+            model_name='monthlysales',
+            name='product',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='sales', to='sales.product', verbose_name='Товар'),
+        ),
+        migrations.AddIndex(
+            model_name='monthlysales',
+            index=models.Index(fields=['-year', '-month', 'product', 'id'], name='monthly_sales_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='monthlysales',
+            index=models.Index(fields=['product', 'year', 'month'], include=('revenue', 'quantity'), name='monthly_sales_product_idx'),
+        ),
+    ]
@@ -1,4 +1,64 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
+
+
+class ProductManager(models.Manager):
+    
+    def ids_for(self, names):
+        """Ключи товаров по названиям {название: id}; недостающие товары создаются"""
+        names = set(names)
+        ids = dict(self.filter(name__in=names).values_list('name', 'id'))
+        missing = names - ids.keys()
+        if missing:
+            # Параллельная загрузка могла создать те же товары - конфликты пропускаются
+            self.bulk_create([Product(name=name) for name in missing], ignore_conflicts=True)
+            ids.update(self.filter(name__in=missing).values_list('name', 'id'))
+        return ids
+    
+    def prune(self, ids):
+        """Удаляет товары ids, на которые не осталось записей о продажах; вызывается в транзакции записи"""
+        ids = set(ids)
+        if ids:
+            self.filter(pk__in=ids).exclude(
+                models.Exists(MonthlySales.objects.filter(product=models.OuterRef('pk')))
+            ).delete()
+
+
+class Product(models.Model):
+    """
+    Справочник товаров. Записи о продажах ссылаются на товар целочисленным
+    ключом: строки monthly_sales и индексы по товару короче, а группировка
+    и фильтры сравнивают числа, а не названия.
+    
+    Товар живет, пока на него есть записи: при удалении последней записи или
+    переносе ее на другой товар он удаляется (Product.objects.prune). Сводные
+    таблицы, лента изменений и поиск товаров хранят название, а не ключ: это
+    данные для вывода, и в них нет повторения названия на каждую запись.
+    """
+    
+    # 4-байтовый ключ: товаров заведомо меньше 2^31, а ключ повторяется в каждой записи о продажах
+    id = models.AutoField(primary_key=True)
+    name = models.CharField(max_length=200, unique=True, verbose_name='Название товара')
+    
+    objects = ProductManager()
+    
+    class Meta:
+        db_table = 'products'
+        verbose_name = 'Товар'
+        verbose_name_plural = 'Товары'
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.name
+
+
+def product_name_subquery(field='product_id'):
+    """
+    Подзапрос: название товара по ключу field внешнего запроса. Добавляется к
+    агрегирующему запросу после агрегатов - записи группируются по целочисленному
+    ключу, а название читается по первичному ключу products один раз на группу.
+    """
+    return models.Subquery(Product.objects.filter(pk=models.OuterRef(field)).order_by().values('name'))
 
 
 class MonthlySales(models.Model):
@@ -12,7 +72,10 @@ class MonthlySales(models.Model):
     
     year = models.IntegerField(verbose_name='Год')
     month = models.IntegerField(choices=MONTHS, verbose_name='Месяц')
-    product_name = models.CharField(max_length=200, verbose_name='Название товара')
+    # Индекс по товару - monthly_sales_product_idx (товар - его первое поле)
+    product = models.ForeignKey(
+        Product, on_delete=models.PROTECT, related_name='sales', db_index=False, verbose_name='Товар'
+    )
     quantity = models.IntegerField(verbose_name='Количество проданных единиц')
     revenue = models.DecimalField(max_digits=12, decimal_places=2, verbose_name='Выручка')
     
@@ -21,10 +84,193 @@ class MonthlySales(models.Model):
         verbose_name = 'Продажа по месяцам'
         verbose_name_plural = 'Продажи по месяцам'
         ordering = ['year', 'month']
-        unique_together = ['year', 'month', 'product_name']
+        unique_together = ['year', 'month', 'product']
+        indexes = [
+            # Таблица и управление: фильтр по году/месяцу и сортировка keyset-пагинации
+            models.Index(
+                fields=['-year', '-month', 'product', 'id'],
+                name='monthly_sales_order_idx',
+            ),
+            # Диаграммы с фильтром по товарам: агрегаты читаются только из индекса
+            models.Index(
+                fields=['product', 'year', 'month'],
+                include=['revenue', 'quantity'],
+                name='monthly_sales_product_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.get_month_display()} {self.year} - {self.product_name}"
     
+    # Название товара, заданное через product_name=..., до сохранения записи
+    _pending_product_name = None
+    
+    @property
+    def product_name(self):
+        """Название товара; запись по-прежнему можно создать с product_name=..."""
+        if self._pending_product_name is not None:
+            return self._pending_product_name
+        return self.product.name
+    
+    @product_name.setter
+    def product_name(self, value):
+        # Товар находится или создается в save(), в транзакции записи: при ошибке
+        # или без сохранения в справочнике не остается товара без записей
+        self._pending_product_name = value
+    
     def get_month_name(self):
         return dict(self.MONTHS)[self.month]
+    
+    def save(self, *args, **kwargs):
+        # Запись и обновление сводных таблиц (см. sales/signals.py) выполняются в одной транзакции
+        with transaction.atomic():
+            if self._pending_product_name is not None:
+                self.product = Product.objects.get_or_create(name=self._pending_product_name)[0]
+                self._pending_product_name = None
+            super().save(*args, **kwargs)
+
+
+class MonthlyTotal(models.Model):
+    """Сводная таблица: итоги продаж по месяцам"""
+    
+    year = models.IntegerField(verbose_name='Год')
+    month = models.IntegerField(choices=MonthlySales.MONTHS, verbose_name='Месяц')
+    quantity = models.BigIntegerField(default=0, verbose_name='Количество проданных единиц')
+    revenue = models.DecimalField(max_digits=18, decimal_places=2, default=0, verbose_name='Выручка')
+    rows = models.IntegerField(default=0, verbose_name='Количество записей')
+    
+    class Meta:
+        db_table = 'monthly_totals'
+        verbose_name = 'Итог по месяцу'
+        verbose_name_plural = 'Итоги по месяцам'
+        ordering = ['year', 'month']
+        unique_together = ['year', 'month']
+
+
+class ProductTotal(models.Model):
+    """Сводная таблица: итоги продаж по товарам за все время"""
+    
+    product_name = models.CharField(max_length=200, unique=True, verbose_name='Название товара')
+    quantity = models.BigIntegerField(default=0, verbose_name='Количество проданных единиц')
+    revenue = models.DecimalField(max_digits=18, decimal_places=2, default=0, verbose_name='Выручка')
+    rows = models.IntegerField(default=0, verbose_name='Количество записей')
+    
+    class Meta:
+        db_table = 'product_totals'
+        verbose_name = 'Итог по товару'
+        verbose_name_plural = 'Итоги по товарам'
+        ordering = ['product_name']
+
+
+class ProductYearTotal(models.Model):
+    """Сводная таблица: итоги продаж по товарам за год"""
+    
+    product_name = models.CharField(max_length=200, verbose_name='Название товара')
+    year = models.IntegerField(verbose_name='Год')
+    quantity = models.BigIntegerField(default=0, verbose_name='Количество проданных единиц')
+    revenue = models.DecimalField(max_digits=18, decimal_places=2, default=0, verbose_name='Выручка')
+    rows = models.IntegerField(default=0, verbose_name='Количество записей')
+    
+    class Meta:
+        db_table = 'product_year_totals'
+        verbose_name = 'Итог по товару за год'
+        verbose_name_plural = 'Итоги по товарам за год'
+        ordering = ['year', 'product_name']
+        unique_together = ['year', 'product_name']
+
+
+class DatasetState(models.Model):
+    """
+    Версия набора данных о продажах (единственная строка).
+    version увеличивается при каждом изменении, catalog_version - только при
+    появлении или исчезновении товара или года (меняются списки фильтров),
+    analytics_version - версия данных на момент обновления аналитических представлений.
+    """
+    
+    version = models.BigIntegerField(default=0, verbose_name='Версия данных')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Время изменения')
+    catalog_version = models.BigIntegerField(default=0, verbose_name='Версия справочника фильтров')
+    catalog_updated_at = models.DateTimeField(default=timezone.now, verbose_name='Время изменения справочника')
+    analytics_version = models.BigIntegerField(default=0, verbose_name='Версия данных аналитики')
+    analytics_refreshed_at = models.DateTimeField(null=True, blank=True, verbose_name='Время обновления аналитики')
+    
+    class Meta:
+        db_table = 'dataset_state'
+        verbose_name = 'Состояние данных'
+        verbose_name_plural = 'Состояние данных'
+
+
+class SalesChange(models.Model):
+    """
+    Лента изменений: ячейка (год, месяц, товар), измененная в версии данных version.
+    Строка без года, месяца и товара - сброс: изменилось все, клиенту нужно
+    загрузить диаграммы заново (см. sales/changes.py).
+    """
+    
+    version = models.BigIntegerField(verbose_name='Версия данных')
+    year = models.IntegerField(null=True, verbose_name='Год')
+    month = models.IntegerField(null=True, verbose_name='Месяц')
+    product_name = models.CharField(max_length=200, null=True, verbose_name='Название товара')
+    changed_at = models.DateTimeField(default=timezone.now, verbose_name='Время изменения')
+    
+    class Meta:
+        db_table = 'sales_changes'
+        verbose_name = 'Изменение данных'
+        verbose_name_plural = 'Лента изменений'
+        ordering = ['version', 'id']
+        indexes = [
+            models.Index(fields=['version'], name='sales_changes_version_idx'),
+        ]
+
+
+class QuarterlyRevenue(models.Model):
+    """
+    Аналитика: выручка по кварталам.
+    В PostgreSQL - материализованное представление (обновляется командой refresh_analytics).
+    """
+    
+    id = models.IntegerField(primary_key=True)  # год * 10 + квартал
+    year = models.IntegerField(verbose_name='Год')
+    quarter = models.IntegerField(verbose_name='Квартал')
+    quantity = models.BigIntegerField(verbose_name='Количество проданных единиц')
+    revenue = models.DecimalField(max_digits=18, decimal_places=2, verbose_name='Выручка')
+    
+    class Meta:
+        managed = False
+        db_table = 'sales_quarterly_revenue'
+        verbose_name = 'Выручка по кварталам'
+        verbose_name_plural = 'Выручка по кварталам'
+
+
+class MonthRevenue(models.Model):
+    """Аналитика: месяцы с местом в рейтинге по выручке"""
+    
+    id = models.IntegerField(primary_key=True)  # год * 100 + месяц
+    year = models.IntegerField(verbose_name='Год')
+    month = models.IntegerField(verbose_name='Месяц')
+    quantity = models.BigIntegerField(verbose_name='Количество проданных единиц')
+    revenue = models.DecimalField(max_digits=18, decimal_places=2, verbose_name='Выручка')
+    revenue_rank = models.BigIntegerField(verbose_name='Место по выручке')
+    
+    class Meta:
+        managed = False
+        db_table = 'sales_month_revenue'
+        verbose_name = 'Выручка по месяцам'
+        verbose_name_plural = 'Выручка по месяцам'
+
+
+class ProductAverage(models.Model):
+    """Аналитика: средние продажи товара за месяц"""
+    
+    product_name = models.CharField(max_length=200, primary_key=True, verbose_name='Название товара')
+    months = models.IntegerField(verbose_name='Количество месяцев')
+    quantity = models.BigIntegerField(verbose_name='Количество проданных единиц')
+    revenue = models.DecimalField(max_digits=18, decimal_places=2, verbose_name='Выручка')
+    avg_quantity = models.DecimalField(max_digits=18, decimal_places=2, verbose_name='Среднее количество')
+    avg_revenue = models.DecimalField(max_digits=18, decimal_places=2, verbose_name='Средняя выручка')
+    
+    class Meta:
+        managed = False
+        db_table = 'sales_product_averages'
+        verbose_name = 'Средние продажи товара'
+        verbose_name_plural = 'Средние продажи товаров'
@@ -0,0 +1,149 @@
+"""
+Keyset (seek) пагинация.
+
+В отличие от django.core.paginator.Paginator не выполняет COUNT(*) и OFFSET:
+следующая страница выбирается условием "строго после последней показанной
+строки" по уникальному порядку сортировки, поэтому любая страница стоит
+столько же, сколько первая.
+"""
+import base64
+import json
+
+from django.db import connections
+from django.db.models import Q
+
+
+def encode_cursor(values):
+    """Курсор - значения ключа сортировки граничной строки в base64"""
+    data = json.dumps(values, ensure_ascii=False, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Значения ключа сортировки из курсора или None для некорректного курсора"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, UnicodeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+def approximate_count(queryset):
+    """
+    Примерное число строк запроса.
+    В PostgreSQL берется оценка планировщика из EXPLAIN - без сканирования таблицы;
+    в остальных СУБД выполняется обычный COUNT(*).
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    query = queryset.order_by().values('pk').query
+    sql, params = query.get_compiler(using=queryset.db).as_sql()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class KeysetPage:
+    """Страница keyset-пагинации; интерфейс совместим с Page для шаблонов"""
+
+    def __init__(self, object_list, paginator, has_next, has_previous, total=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.total = total
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next and self.object_list:
+            return self.paginator.cursor_for(self.object_list[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            return self.paginator.cursor_for(self.object_list[0])
+        return None
+
+
+class KeysetPaginator:
+    """
+    Пагинатор по уникальному порядку сортировки ordering,
+    например ('-year', '-month', 'product_id', 'id').
+    """
+
+    def __init__(self, queryset, ordering, per_page, with_total=False):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.with_total = with_total
+        self.fields = [field.lstrip('-') for field in self.ordering]
+
+    def cursor_for(self, obj):
+        return encode_cursor([getattr(obj, field) for field in self.fields])
+
+    def _reversed_ordering(self):
+        return [field[1:] if field.startswith('-') else '-' + field for field in self.ordering]
+
+    def _seek(self, values, forward):
+        """Условие "строка после (forward) или до граничной" для составного ключа сортировки"""
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            descending = field.startswith('-')
+            lookup = 'lt' if descending == forward else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        # Избыточная граница по первому полю: без нее OR-цепочку нельзя превратить в
+        # начало диапазона индекса, и глубокая страница читала бы все строки до курсора
+        first = self.ordering[0]
+        bound = 'lte' if first.startswith('-') == forward else 'gte'
+        return Q(**{f'{first.lstrip("-")}__{bound}': values[0]}) & condition
+
+    def get_page(self, after=None, before=None, last=False):
+        """
+        Страница после курсора after, до курсора before, последняя (last=True)
+        или первая, если ничего не задано. Некорректный курсор дает первую страницу.
+        """
+        limit = self.per_page + 1
+        after_values = decode_cursor(after) if after else None
+        before_values = decode_cursor(before) if before else None
+
+        if after_values and len(after_values) == len(self.fields):
+            rows = list(self.queryset.filter(self._seek(after_values, True)).order_by(*self.ordering)[:limit])
+            has_next, has_previous = len(rows) > self.per_page, True
+            rows = rows[:self.per_page]
+        elif last or (before_values and len(before_values) == len(self.fields)):
+            queryset = self.queryset
+            if not last:
+                queryset = queryset.filter(self._seek(before_values, False))
+            rows = list(queryset.order_by(*self._reversed_ordering())[:limit])
+            has_next, has_previous = not last, len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+        else:
+            rows = list(self.queryset.order_by(*self.ordering)[:limit])
+            has_next, has_previous = len(rows) > self.per_page, False
+            rows = rows[:self.per_page]
+
+        total = approximate_count(self.queryset) if self.with_total else None
+        return KeysetPage(rows, self, has_next, has_previous, total)
@@ -0,0 +1,178 @@
+"""
+Секционирование monthly_sales по годам (только PostgreSQL, см. миграцию 0007).
+
+Каждый год хранится в секции monthly_sales_y<год>, поэтому запросы с фильтром
+по году читают одну секцию (partition pruning), а старый год убирается
+отсоединением секции вместо DELETE. Годы раньше первой секции попадают в
+monthly_sales_history, позже последней - в monthly_sales_future; секции на
+будущие годы заранее создает команда manage_partitions.
+"""
+import re
+
+from django.db import connection, transaction
+
+from .models import MonthlySales
+from . import changes, rollups
+
+
+TABLE = MonthlySales._meta.db_table
+HISTORY = f'{TABLE}_history'
+FUTURE = f'{TABLE}_future'
+ARCHIVE_SCHEMA = 'sales_archive'
+
+YEAR_PARTITION_RE = re.compile(rf'^{TABLE}_y(\d+)$')
+
+# Названия товаров секции: сводные таблицы пересчитываются по ним
+_PRODUCT_NAMES_SQL = 'SELECT p.name FROM products p WHERE p.id IN (SELECT DISTINCT product_id FROM {table})'
+
+
+class PartitioningError(Exception):
+    pass
+
+
+def partition_name(year):
+    return f'{TABLE}_y{year}'
+
+
+def is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass)', [TABLE])
+        return cursor.fetchone()[0]
+
+
+def _require_partitioned():
+    if not is_partitioned():
+        raise PartitioningError('Таблица monthly_sales не секционирована (нужен PostgreSQL и миграция 0007)')
+
+
+def year_partitions():
+    """Годы с собственной секцией, по возрастанию"""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = %s::regclass
+        """, [TABLE])
+        names = [row[0] for row in cursor.fetchall()]
+    return sorted(int(match.group(1)) for match in map(YEAR_PARTITION_RE.match, names) if match)
+
+
+def archived_years():
+    """Годы, секции которых отсоединены и лежат в схеме архива"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT tablename FROM pg_tables WHERE schemaname = %s', [ARCHIVE_SCHEMA]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    return sorted(int(match.group(1)) for match in map(YEAR_PARTITION_RE.match, names) if match)
+
+
+def _split_catch_all(cursor, catch_all, years):
+    """
+    Выделяет из секции history/future собственные секции для годов years (подряд идущих).
+    Строки этих годов переносятся в новые секции, диапазон общей секции сужается.
+    """
+    first, last = min(years), max(years)
+    cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {catch_all}')
+    for year in years:
+        cursor.execute(
+            f'CREATE TABLE {partition_name(year)} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)',
+            [year, year + 1],
+        )
+    cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {catch_all} WHERE year BETWEEN %s AND %s', [first, last])
+    cursor.execute(f'DELETE FROM {catch_all} WHERE year BETWEEN %s AND %s', [first, last])
+    if catch_all == FUTURE:
+        bounds, params = 'FROM (%s) TO (MAXVALUE)', [last + 1]
+    else:
+        bounds, params = 'FROM (MINVALUE) TO (%s)', [first]
+    cursor.execute(f'ALTER TABLE {TABLE} ATTACH PARTITION {catch_all} FOR VALUES {bounds}', params)
+
+
+def ensure_years(first, last):
+    """
+    Создает недостающие секции для годов first..last; возвращает список созданных годов.
+    Выполняется в одной транзакции: DETACH/ATTACH общей секции берет короткую
+    эксклюзивную блокировку, поэтому секции лучше создавать заранее, пока она пуста.
+    """
+    _require_partitioned()
+    existing = year_partitions()
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        if existing and last > existing[-1]:
+            years = list(range(existing[-1] + 1, last + 1))
+            _split_catch_all(cursor, FUTURE, years)
+            created += years
+        if existing and first < existing[0]:
+            years = list(range(first, existing[0]))
+            _split_catch_all(cursor, HISTORY, years)
+            created += years
+        # Пропуски внутри диапазона (например, после архивации года) создаются обычными секциями
+        archived = set(archived_years())
+        for year in range(max(first, existing[0]), min(last, existing[-1]) + 1) if existing else ():
+            if year not in existing and year not in archived:
+                cursor.execute(
+                    f'CREATE TABLE {partition_name(year)} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)',
+                    [year, year + 1],
+                )
+                created.append(year)
+    return sorted(created)
+
+
+def archive_year(year, dump=None, drop=False):
+    """
+    Отсоединяет секцию года без блокировки таблицы (DETACH ... CONCURRENTLY)
+    и переносит ее в схему sales_archive. dump - файл для выгрузки CSV,
+    drop - удалить секцию после выгрузки. Сводные таблицы пересчитываются по
+    затронутым товарам. Возвращает число строк в секции.
+    """
+    _require_partitioned()
+    if year not in year_partitions():
+        raise PartitioningError(f'Нет секции за {year} год')
+    name = partition_name(year)
+    if connection.in_atomic_block:
+        raise PartitioningError('DETACH PARTITION CONCURRENTLY нельзя выполнять внутри транзакции')
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name} CONCURRENTLY')
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(_PRODUCT_NAMES_SQL.format(table=name))
+        products = {row[0] for row in cursor.fetchall()}
+        cursor.execute(f'SELECT COUNT(*) FROM {name}')
+        count = cursor.fetchone()[0]
+        cursor.execute(f'CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}')
+        cursor.execute(f'ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}')
+        rollups.refresh(years={year}, products=products)
+        changes.record_reset()
+
+    if dump:
+        with connection.cursor() as cursor, open(dump, 'w', encoding='utf-8', newline='') as output:
+            cursor.copy_expert(
+                f'COPY (SELECT s.id, s.year, s.month, p.name AS product_name, s.quantity, s.revenue '
+                f'FROM {ARCHIVE_SCHEMA}.{name} s JOIN products p ON p.id = s.product_id '
+                f'ORDER BY s.month, p.name) '
+                f'TO STDOUT WITH (FORMAT csv, HEADER)',
+                output,
+            )
+    if drop:
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE {ARCHIVE_SCHEMA}.{name}')
+    return count
+
+
+def restore_year(year):
+    """Возвращает секцию года из архива в monthly_sales"""
+    _require_partitioned()
+    if year not in archived_years():
+        raise PartitioningError(f'В архиве нет секции за {year} год')
+    name = partition_name(year)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {ARCHIVE_SCHEMA}.{name} SET SCHEMA public')
+        cursor.execute(
+            f'ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)', [year, year + 1]
+        )
+        cursor.execute(_PRODUCT_NAMES_SQL.format(table=name))
+        products = {row[0] for row in cursor.fetchall()}
+        rollups.refresh(years={year}, products=products)
+        changes.record_reset()
@@ -0,0 +1,145 @@
+"""Инкрементальное обновление сводных таблиц продаж"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from .models import MonthlySales, MonthlyTotal, Product, ProductTotal, ProductYearTotal, product_name_subquery
+from . import cache, changes
+
+
+def _bump(model, keys, quantity, revenue, rows):
+    """
+    Прибавляет приращение к строке сводной таблицы, создавая или удаляя ее при необходимости.
+    Возвращает True, если строка группы была создана или удалена.
+    """
+    updated = model.objects.filter(**keys).update(
+        quantity=F('quantity') + quantity,
+        revenue=F('revenue') + revenue,
+        rows=F('rows') + rows,
+    )
+    if updated:
+        if rows < 0:
+            # Группа опустела - убираем строку, чтобы она не попадала в диаграммы
+            deleted, _ = model.objects.filter(**keys, rows__lte=0).delete()
+            return bool(deleted)
+        return False
+
+    try:
+        with transaction.atomic():
+            model.objects.create(**keys, quantity=quantity, revenue=revenue, rows=rows)
+    except IntegrityError:
+        # Строку успела создать параллельная транзакция
+        return _bump(model, keys, quantity, revenue, rows)
+    return True
+
+
+def apply_change(year, month, product_name, quantity, revenue, rows=1):
+    """
+    Применяет изменение одной записи MonthlySales ко всем сводным таблицам.
+    Для удаления записи передаются отрицательные значения и rows=-1.
+    """
+    _bump(MonthlyTotal, {'year': year, 'month': month}, quantity, revenue, rows)
+    _bump(ProductTotal, {'product_name': product_name}, quantity, revenue, rows)
+    # Пары (товар, год) покрывают и появление нового товара, и появление нового года
+    if _bump(ProductYearTotal, {'product_name': product_name, 'year': year}, quantity, revenue, rows):
+        cache.bump_version()
+        cache.bump_catalog_version()
+
+
+def apply_deltas(deltas):
+    """
+    Применяет к сводным таблицам приращения массовой операции: deltas -
+    (год, месяц, товар, количество, выручка, записи). Приращения суммируются
+    по группам, и каждая строка сводной таблицы обновляется один раз. Версия
+    справочника увеличивается, только если пара (товар, год) появилась или исчезла.
+    Вызывается в транзакции массовой записи.
+    """
+    groups = {MonthlyTotal: {}, ProductTotal: {}, ProductYearTotal: {}}
+    for year, month, product_name, quantity, revenue, rows in deltas:
+        for model, keys in (
+            (MonthlyTotal, (('year', year), ('month', month))),
+            (ProductTotal, (('product_name', product_name),)),
+            (ProductYearTotal, (('product_name', product_name), ('year', year))),
+        ):
+            total = groups[model].setdefault(keys, [0, 0, 0])
+            total[0] += quantity
+            total[1] += revenue
+            total[2] += rows
+    catalog_changed = False
+    for model, totals in groups.items():
+        for keys, (quantity, revenue, rows) in totals.items():
+            if quantity or revenue or rows:
+                changed = _bump(model, dict(keys), quantity, revenue, rows)
+                catalog_changed = catalog_changed or (changed and model is ProductYearTotal)
+    cache.bump_version()
+    if catalog_changed:
+        cache.bump_catalog_version()
+
+
+AGGREGATES = {
+    'quantity': Sum('quantity'),
+    'revenue': Sum('revenue'),
+    'rows': Count('id'),
+}
+
+
+def _by_product(groups):
+    """Итоги групп запроса values('product_id', ...): пары (название товара, поля строки сводной таблицы)"""
+    rows = groups.annotate(**AGGREGATES).annotate(product_name=product_name_subquery()).order_by()
+    for item in rows:
+        del item['product_id']
+        yield item.pop('product_name'), item
+
+
+def _product_years(years):
+    return set(ProductYearTotal.objects.filter(year__in=years).values_list('product_name', 'year'))
+
+
+def refresh(years=None, products=None):
+    """
+    Пересчет сводных таблиц после массовых операций, минующих сигналы.
+    Пересчитываются только группы затронутых годов и товаров; без аргументов -
+    все таблицы целиком. Вызывается в транзакции массовой записи.
+    """
+    full = years is None and products is None
+    years = set(years or ())
+    products = set(products or ())
+    fact = MonthlySales.objects.all()
+    with transaction.atomic():
+        # Пары (товар, год) до пересчета: версия справочника меняется, только если набор пар изменился
+        pairs = None if full else _product_years(years)
+        if full:
+            MonthlyTotal.objects.all().delete()
+            ProductTotal.objects.all().delete()
+            ProductYearTotal.objects.all().delete()
+        else:
+            MonthlyTotal.objects.filter(year__in=years).delete()
+            ProductTotal.objects.filter(product_name__in=products).delete()
+            ProductYearTotal.objects.filter(year__in=years).delete()
+
+        months = fact if full else fact.filter(year__in=years)
+        MonthlyTotal.objects.bulk_create(
+            MonthlyTotal(**item)
+            for item in months.values('year', 'month').annotate(**AGGREGATES).order_by()
+        )
+        product_rows = fact if full else fact.filter(
+            product__in=Product.objects.filter(name__in=products).values('id')
+        )
+        # Группировка по ключу товара, в сводные таблицы записывается название
+        ProductTotal.objects.bulk_create(
+            ProductTotal(product_name=product_name, **totals)
+            for product_name, totals in _by_product(product_rows.values('product_id'))
+        )
+        ProductYearTotal.objects.bulk_create(
+            ProductYearTotal(product_name=product_name, **totals)
+            for product_name, totals in _by_product(months.values('product_id', 'year'))
+        )
+        cache.bump_version()
+        if full or _product_years(years) != pairs:
+            cache.bump_catalog_version()
+        if full:
+            changes.record_reset()
+
+
+def rebuild():
+    """Полный пересчет сводных таблиц по таблице monthly_sales"""
+    refresh()
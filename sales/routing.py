@@ -0,0 +1,192 @@
+"""
+Чтение данных для диаграмм и таблицы с реплик PostgreSQL.
+
+Представления только для чтения помечаются декоратором read_from_replica:
+на время запроса модели приложения sales читаются с одной из реплик
+DATABASE_REPLICAS, запись и все остальные запросы идут в default.
+
+Реплика выбирается один раз на запрос (версия данных, ETag и сами данные
+читаются из одной базы и согласованы между собой). Отставание реплики
+проверяется не чаще раза в REPLICA_CHECK_INTERVAL секунд; реплика с
+отставанием больше REPLICA_MAX_LAG или недоступная пропускается, а если
+подходящих реплик нет - чтение идет из default.
+
+После записи (POST и т.п. от вошедшего пользователя) ReadYourWritesMiddleware
+ставит cookie, и REPLICA_STICKY_SECONDS запросы этого браузера читают из
+default - пользователь сразу видит свои изменения, даже если реплика отстает.
+"""
+import random
+import threading
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+
+PIN_COOKIE = 'sales_primary_until'
+
+# Отставание реплики в секундах; для сервера не в режиме восстановления (обычная база) - 0
+LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+# База для чтения в текущем запросе: None - чтение из default
+_read_target = ContextVar('read_target', default=None)
+
+
+class ReplicaHealth:
+    """Отставание реплик с кэшированием результата проверки в памяти процесса"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked = {}
+
+    def lag(self, alias):
+        """Отставание реплики в секундах или None, если реплика недоступна"""
+        connection = connections[alias]
+        if connection.vendor != 'postgresql':
+            return 0
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(LAG_SQL)
+                return float(cursor.fetchone()[0])
+        except DatabaseError:
+            return None
+
+    def is_usable(self, alias):
+        now = time.monotonic()
+        with self._lock:
+            checked = self._checked.get(alias)
+        if checked is None or now - checked[0] >= settings.REPLICA_CHECK_INTERVAL:
+            lag = self.lag(alias)
+            checked = (now, lag is not None and lag <= settings.REPLICA_MAX_LAG)
+            with self._lock:
+                self._checked[alias] = checked
+        return checked[1]
+
+    def reset(self):
+        with self._lock:
+            self._checked.clear()
+
+
+health = ReplicaHealth()
+
+
+def choose_replica():
+    """Случайная реплика с допустимым отставанием или None"""
+    replicas = list(settings.DATABASE_REPLICAS)
+    random.shuffle(replicas)
+    for alias in replicas:
+        if health.is_usable(alias):
+            return alias
+    return None
+
+
+def _is_pinned(request):
+    """Браузер недавно записывал данные и должен читать из default"""
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def read_from_replica(view):
+    """
+    Декоратор представления только для чтения (синхронного или асинхронного).
+    База выбирается до первого запроса: параллельные потоки асинхронного
+    представления читают из одной и той же базы.
+    """
+    def target(request):
+        if not settings.DATABASE_REPLICAS or _is_pinned(request):
+            return None
+        return choose_replica() or 'default'
+
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            # Проверка отставания реплики - синхронный запрос к БД
+            token = _read_target.set(await sync_to_async(target)(request))
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _read_target.reset(token)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = _read_target.set(target(request))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _read_target.reset(token)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Чтение моделей sales в помеченных представлениях - с реплики, все остальное - default"""
+
+    def db_for_read(self, model, **hints):
+        alias = _read_target.get()
+        if alias is None or model._meta.app_label != 'sales':
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема реплик повторяет default через репликацию
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReadYourWritesMiddleware:
+    """После изменения данных пользователем его запросы некоторое время читают из default"""
+
+    sync_capable = True
+    async_capable = True
+
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        if self.should_pin(request, response):
+            self.pin(response)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        # Пользователь загружается из сессии синхронным запросом к БД
+        if await sync_to_async(self.should_pin)(request, response):
+            self.pin(response)
+        return response
+
+    def should_pin(self, request, response):
+        return (
+            bool(settings.DATABASE_REPLICAS)
+            and request.method not in self.SAFE_METHODS
+            and response.status_code < 400
+            and request.user.is_authenticated
+        )
+
+    def pin(self, response):
+        seconds = settings.REPLICA_STICKY_SECONDS
+        response.set_cookie(
+            PIN_COOKIE, f'{time.time() + seconds:.0f}', max_age=seconds, httponly=True, samesite='Lax',
+        )
@@ -0,0 +1,77 @@
+"""Обработчики сигналов модели MonthlySales"""
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import MonthlySales, Product
+from . import analytics, cache, changes, rollups
+
+
+def _revenue(instance):
+    """Выручка записи в виде Decimal (в форму и в create() может прийти float)"""
+    return MonthlySales._meta.get_field('revenue').to_python(instance.revenue)
+
+
+@receiver(pre_save, sender=MonthlySales)
+def remember_previous_values(sender, instance, **kwargs):
+    """Запоминает значения записи до изменения, чтобы вычесть их из сводных таблиц"""
+    instance._previous_values = None
+    if instance.pk:
+        instance._previous_values = MonthlySales.objects.filter(pk=instance.pk).values(
+            'year', 'month', 'quantity', 'revenue', 'product_id', product_name=F('product__name')
+        ).first()
+
+
+@receiver(post_save, sender=MonthlySales)
+def sales_saved(sender, instance, **kwargs):
+    """Новая версия данных и поправка сводных таблиц после сохранения записи"""
+    cache.bump_version()
+    previous = getattr(instance, '_previous_values', None)
+    cells = [(instance.year, instance.month, instance.product_name)]
+    if previous:
+        cells.append((previous['year'], previous['month'], previous['product_name']))
+    changes.record(cells)
+    if previous:
+        same_group = (
+            previous['year'] == instance.year
+            and previous['month'] == instance.month
+            and previous['product_name'] == instance.product_name
+        )
+        if same_group:
+            # Запись осталась в тех же группах - достаточно одной поправки
+            rollups.apply_change(
+                instance.year, instance.month, instance.product_name,
+                instance.quantity - previous['quantity'],
+                _revenue(instance) - previous['revenue'],
+                rows=0,
+            )
+            return
+        rollups.apply_change(
+            previous['year'], previous['month'], previous['product_name'],
+            -previous['quantity'], -previous['revenue'], rows=-1,
+        )
+        if previous['product_id'] != instance.product_id:
+            # Запись перенесена на другой товар - прежний мог остаться без записей
+            Product.objects.prune([previous['product_id']])
+    rollups.apply_change(
+        instance.year, instance.month, instance.product_name,
+        instance.quantity, _revenue(instance),
+    )
+
+
+@receiver(post_delete, sender=MonthlySales)
+def sales_deleted(sender, instance, **kwargs):
+    """Новая версия данных и поправка сводных таблиц после удаления записи"""
+    cache.bump_version()
+    changes.record([(instance.year, instance.month, instance.product_name)])
+    rollups.apply_change(
+        instance.year, instance.month, instance.product_name,
+        -instance.quantity, -_revenue(instance), rows=-1,
+    )
+    Product.objects.prune([instance.product_id])
+
+
+@receiver(cache.dataset_changed)
+def schedule_analytics_refresh(sender, **kwargs):
+    """Автоматическое обновление аналитических представлений после накопления изменений"""
+    analytics.schedule_refresh()
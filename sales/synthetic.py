@@ -0,0 +1,59 @@
+"""
+Генератор синтетических данных о продажах для нагрузочных тестов и замеров.
+
+Данные детерминированы при одинаковом seed и похожи на реальные: у каждой
+категории свой диапазон цен, продажи имеют сезонность (пик в ноябре-декабре),
+у товара есть годовой тренд, а новые товары появляются не с первого года.
+"""
+import random
+from decimal import Decimal
+
+
+# Категория: диапазон цены за единицу (руб.) и типичные продажи в месяц (шт.)
+CATEGORIES = [
+    ('Ноутбук', (40000, 150000), 40),
+    ('Смартфон', (15000, 100000), 120),
+    ('Планшет', (20000, 80000), 50),
+    ('Наушники', (2000, 30000), 200),
+    ('Монитор', (10000, 60000), 60),
+    ('Клавиатура', (1000, 10000), 150),
+    ('Мышь', (500, 5000), 250),
+    ('Принтер', (8000, 40000), 30),
+    ('Телевизор', (25000, 200000), 35),
+    ('Умные часы', (5000, 50000), 80),
+]
+
+# Множители продаж по месяцам
+SEASONALITY = [0.85, 0.8, 0.9, 0.95, 1.0, 0.95, 0.9, 0.95, 1.05, 1.1, 1.25, 1.6]
+
+KOPECK = Decimal('0.01')
+
+
+def product_names(count):
+    """Уникальные названия товаров: категория и номер модели"""
+    return [f'{CATEGORIES[i % len(CATEGORIES)][0]} M{i // len(CATEGORIES) + 1:04d}' for i in range(count)]
+
+
+def generate_rows(products=100, years=5, start_year=2020, seed=42):
+    """
+    Строки (год, месяц, товар, количество, выручка) по товарам и месяцам.
+    Примерно products * years * 12 строк; товары, появившиеся позже, дают меньше.
+    """
+    rng = random.Random(seed)
+    for index, name in enumerate(product_names(products)):
+        _, (min_price, max_price), base_quantity = CATEGORIES[index % len(CATEGORIES)]
+        price = rng.uniform(min_price, max_price)
+        quantity_scale = base_quantity * rng.lognormvariate(0, 0.5)
+        growth = rng.uniform(0.9, 1.3)
+        # Четверть товаров появляется в одном из первых лет периода
+        first_year = start_year + (rng.randrange(max(1, years // 2)) if rng.random() < 0.25 else 0)
+
+        for year in range(first_year, start_year + years):
+            trend = growth ** (year - start_year)
+            for month in range(1, 13):
+                quantity = round(quantity_scale * trend * SEASONALITY[month - 1] * rng.lognormvariate(0, 0.2))
+                if quantity <= 0:
+                    continue
+                # Скидки и акции: цена продажи немного ниже прайсовой
+                revenue = Decimal(quantity * price * rng.uniform(0.85, 1.0)).quantize(KOPECK)
+                yield year, month, name, quantity, revenue
@@ -1,6 +1,23 @@
-from django.test import TestCase, Client
+import contextlib
+import gzip
+import struct
+import threading
+from unittest import skipUnless
+
+import psycopg2
+from asgiref.sync import sync_to_async
+from psycopg2 import extensions
+from django.test import AsyncClient, TestCase, TransactionTestCase, Client
 from django.urls import reverse
-from .models import MonthlySales
+from django.utils.html import escape
+from django.utils.http import urlencode
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from decimal import Decimal
+
+from chart_service.pooled_postgresql.pool import ConnectionPool, PoolTimeout
+from .models import MonthlySales, MonthlyTotal, MonthRevenue, Product, ProductTotal, ProductYearTotal
+from . import analytics, cache, rollups
 import json
 
 
@@ -34,6 +51,64 @@ class MonthlySalesModelTest(TestCase):
         self.assertEqual(self.sales.get_month_name(), 'Январь')
 
 
+class ProductDimensionTest(TestCase):
+    """Тесты справочника товаров"""
+
+    def test_sales_share_product(self):
+        """Тест: записи с одним названием ссылаются на один товар"""
+        first = MonthlySales.objects.create(year=2024, month=1, product_name='Ноутбук', quantity=1, revenue=10)
+        second = MonthlySales.objects.create(year=2024, month=2, product_name='Ноутбук', quantity=2, revenue=20)
+        self.assertEqual(first.product_id, second.product_id)
+        self.assertEqual(Product.objects.count(), 1)
+        self.assertEqual(Product.objects.ids_for(['Ноутбук', 'Планшет']).keys(), {'Ноутбук', 'Планшет'})
+        self.assertEqual(Product.objects.count(), 2)
+    
+    def test_product_created_only_with_sale(self):
+        """Тест: товар по названию создается в транзакции сохранения записи"""
+        from django.db import IntegrityError, transaction
+        sale = MonthlySales(year=2024, month=1, product_name='Ноутбук', quantity=1, revenue=10)
+        self.assertEqual(sale.product_name, 'Ноутбук')
+        self.assertFalse(Product.objects.exists())
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            MonthlySales.objects.create(year=2024, month=1, product_name='Ноутбук', quantity=None, revenue=10)
+        self.assertFalse(Product.objects.exists())
+        sale.save()
+        self.assertEqual(Product.objects.get().name, 'Ноутбук')
+
+    def test_unused_products_removed(self):
+        """Тест: товар без записей удаляется после переноса и удаления записей"""
+        from . import bulk
+        sale = MonthlySales.objects.create(year=2024, month=1, product_name='Ноутбук', quantity=1, revenue=10)
+        MonthlySales.objects.create(year=2024, month=2, product_name='Планшет', quantity=1, revenue=10)
+        sale.product_name = 'Ноутбук Pro'
+        sale.save()
+        self.assertEqual(set(Product.objects.values_list('name', flat=True)), {'Ноутбук Pro', 'Планшет'})
+        sale.delete()
+        bulk.delete_sales(MonthlySales.objects.filter(month=2))
+        self.assertFalse(Product.objects.exists())
+    
+    def test_form_rejects_duplicate(self):
+        """Тест: форма не допускает вторую запись того же товара за месяц"""
+        from .forms import MonthlySalesForm
+        MonthlySales.objects.create(year=2024, month=1, product_name='Ноутбук', quantity=1, revenue=10)
+        data = {'year': 2024, 'month': 1, 'product_name': 'Ноутбук', 'quantity': 2, 'revenue': 20}
+        self.assertFalse(MonthlySalesForm(data).is_valid())
+        form = MonthlySalesForm(dict(data, month=2))
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.save().product.name, 'Ноутбук')
+
+    def test_table_rows_query_count(self):
+        """Тест: названия товаров на странице таблицы не загружаются по одному"""
+        for month in range(1, 13):
+            MonthlySales.objects.create(
+                year=2024, month=month, product_name=f'Товар {month}', quantity=1, revenue=10
+            )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('sales:table_rows'))
+        self.assertContains(response, 'Товар 12')
+        self.assertLessEqual(len(queries.captured_queries), 3)
+
+
 class SalesViewsTest(TestCase):
     """Тесты представлений"""
     
@@ -114,6 +189,74 @@ class ChartAPITest(TestCase):
         self.assertIn('labels', data)
         self.assertIn('datasets', data)
     
+    def test_all_charts_api(self):
+        """Тест API всех диаграмм одним запросом"""
+        response = self.client.get('/api/chart-data/?type=all')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        for chart_type in ('line', 'bar', 'pie'):
+            single = json.loads(self.client.get(f'/api/chart-data/?type={chart_type}').content)
+            self.assertEqual(data[chart_type], single)
+    
+    def test_all_charts_api_single_query(self):
+        """Тест: с фильтром по товарам все диаграммы строятся одним агрегирующим запросом"""
+        # Версия данных для ключа кэша + один GROUP BY
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                '/api/chart-data/?type=all&year=2024&products[]=Ноутбук&products[]=Смартфон'
+            )
+        data = json.loads(response.content)
+        self.assertEqual(len(data['line']['labels']), 12)
+        self.assertEqual(data['bar']['labels'], ['Ноутбук', 'Смартфон'])
+        self.assertEqual(data['pie']['datasets'][0]['data'], [1250000.0, 600000.0])
+    
+    def test_line_chart_gaps_filled(self):
+        """Тест: месяцы без данных между первым и последним заполняются нулями"""
+        MonthlySales.objects.create(
+            year=2025, month=3, product_name='Ноутбук',
+            quantity=5, revenue=250000.00
+        )
+        for query in ('type=line', 'type=line&products[]=Ноутбук'):
+            data = json.loads(self.client.get(f'/api/chart-data/?{query}').content)
+            self.assertEqual(len(data['labels']), 15)
+            self.assertEqual(data['labels'][0], 'Январь 2024')
+            self.assertEqual(data['labels'][12], 'Январь 2025')
+            self.assertEqual(data['labels'][-1], 'Март 2025')
+            values = data['datasets'][0]['data']
+            self.assertEqual(values[2:14], [0] * 12)
+            self.assertEqual(values[-1], 250000.0)
+    
+    def test_product_series_line_chart(self):
+        """Тест линейного графика с отдельными рядами товаров и рядом «Другие»"""
+        MonthlySales.objects.create(
+            year=2024, month=2, product_name='Планшет',
+            quantity=1, revenue=1000.00
+        )
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/chart-data/?type=line&series=product&top_n=2')
+        data = json.loads(response.content)
+        self.assertEqual(data['labels'], ['Январь 2024', 'Февраль 2024'])
+        self.assertEqual([dataset['label'] for dataset in data['datasets']], ['Ноутбук', 'Смартфон', 'Другие'])
+        self.assertEqual(data['datasets'][0]['data'], [500000.0, 750000.0])
+        self.assertEqual(data['datasets'][2]['data'], [0, 1000.0])
+        colors = [dataset['borderColor'] for dataset in data['datasets']]
+        self.assertEqual(len(set(colors)), 3)
+    
+    def test_top_n_product_charts(self):
+        """Тест свертки товаров вне top_n в гистограмме и круговой диаграмме"""
+        for query in ('type=all&top_n=1', 'type=all&top_n=1&products[]=Ноутбук&products[]=Смартфон'):
+            data = json.loads(self.client.get(f'/api/chart-data/?{query}').content)
+            self.assertEqual(data['bar']['labels'], ['Ноутбук', 'Другие'])
+            self.assertEqual(data['bar']['datasets'][0]['data'], [25, 20])
+            self.assertEqual(data['pie']['datasets'][0]['data'], [1250000.0, 600000.0])
+            self.assertEqual(len(data['line']['datasets']), 1)
+    
+    def test_invalid_series_params(self):
+        """Тест неверных параметров режима рядов"""
+        for query in ('series=month', 'top_n=0', 'top_n=abc', 'top_n=1000'):
+            response = self.client.get(f'/api/chart-data/?type=line&{query}')
+            self.assertEqual(response.status_code, 400)
+    
     def test_invalid_chart_type(self):
         """Тест неверного типа диаграммы"""
         response = self.client.get('/api/chart-data/?type=invalid')
@@ -157,7 +300,7 @@ class DatabaseQueryTest(TestCase):
     
     def test_filter_by_product(self):
         """Тест фильтрации по товару"""
-        sales = MonthlySales.objects.filter(product_name='Ноутбук')
+        sales = MonthlySales.objects.filter(product__name='Ноутбук')
         self.assertEqual(sales.count(), 12)
     
     def test_aggregate_revenue(self):
@@ -166,3 +309,1506 @@ class DatabaseQueryTest(TestCase):
         total = MonthlySales.objects.aggregate(total=Sum('revenue'))
         self.assertIsNotNone(total['total'])
         self.assertGreater(float(total['total']), 0)
+
+
+class RollupTest(TestCase):
+    """Тесты сводных таблиц"""
+    
+    def setUp(self):
+        self.sale = MonthlySales.objects.create(
+            year=2024, month=1, product_name='Ноутбук',
+            quantity=10, revenue=500000.00
+        )
+        MonthlySales.objects.create(
+            year=2024, month=1, product_name='Смартфон',
+            quantity=20, revenue=600000.00
+        )
+    
+    def snapshot(self):
+        return (
+            list(MonthlyTotal.objects.values_list('year', 'month', 'quantity', 'revenue', 'rows')),
+            list(ProductTotal.objects.values_list('product_name', 'quantity', 'revenue', 'rows')),
+            list(ProductYearTotal.objects.values_list('product_name', 'year', 'quantity', 'revenue', 'rows')),
+        )
+    
+    def test_create_updates_rollups(self):
+        """Тест пополнения сводных таблиц при добавлении записей"""
+        total = MonthlyTotal.objects.get(year=2024, month=1)
+        self.assertEqual(total.quantity, 30)
+        self.assertEqual(total.revenue, Decimal('1100000.00'))
+        self.assertEqual(total.rows, 2)
+        self.assertEqual(ProductTotal.objects.get(product_name='Ноутбук').quantity, 10)
+    
+    def test_edit_within_group(self):
+        """Тест изменения значений записи"""
+        self.sale.quantity = 15
+        self.sale.save()
+        self.assertEqual(MonthlyTotal.objects.get(year=2024, month=1).quantity, 35)
+        self.assertEqual(ProductYearTotal.objects.get(product_name='Ноутбук', year=2024).quantity, 15)
+    
+    def test_edit_moves_group(self):
+        """Тест переноса записи в другой месяц"""
+        self.sale.month = 2
+        self.sale.save()
+        self.assertEqual(MonthlyTotal.objects.get(year=2024, month=1).quantity, 20)
+        self.assertEqual(MonthlyTotal.objects.get(year=2024, month=2).quantity, 10)
+    
+    def test_delete_removes_empty_groups(self):
+        """Тест удаления опустевших групп"""
+        self.sale.delete()
+        self.assertFalse(ProductTotal.objects.filter(product_name='Ноутбук').exists())
+        self.assertEqual(MonthlyTotal.objects.get(year=2024, month=1).rows, 1)
+    
+    def test_rebuild_matches_incremental(self):
+        """Тест совпадения полного пересчета с инкрементальным обновлением"""
+        self.sale.month = 3
+        self.sale.save()
+        incremental = self.snapshot()
+        rollups.rebuild()
+        self.assertEqual(self.snapshot(), incremental)
+    
+    def test_chart_api_reads_rollups(self):
+        """Тест: без фильтра по товарам API не обращается к таблице monthly_sales"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/chart-data/?type=all')
+        self.assertEqual(response.status_code, 200)
+        for query in queries.captured_queries:
+            self.assertNotIn('"monthly_sales"', query['sql'])
+        data = json.loads(response.content)
+        self.assertEqual(data['pie']['labels'], ['Смартфон', 'Ноутбук'])
+
+
+class ChartCacheTest(TestCase):
+    """Тесты кэша ответов API диаграмм"""
+    
+    def setUp(self):
+        cache.get_backend().clear()
+        self.sale = MonthlySales.objects.create(
+            year=2024, month=1, product_name='Ноутбук',
+            quantity=10, revenue=500000.00
+        )
+    
+    def test_repeated_request_served_from_cache(self):
+        """Тест: повторный запрос не выполняет агрегацию"""
+        url = '/api/chart-data/?type=bar&products[]=Ноутбук'
+        first = self.client.get(url)
+        with self.assertNumQueries(1):  # только чтение версии данных
+            second = self.client.get(url)
+        self.assertEqual(first.content, second.content)
+    
+    def test_filters_are_normalized(self):
+        """Тест: порядок товаров в фильтре не влияет на ключ кэша"""
+        self.client.get('/api/chart-data/?type=pie&products[]=Б&products[]=Ноутбук')
+        with self.assertNumQueries(1):
+            self.client.get('/api/chart-data/?type=pie&products[]=Ноутбук&products[]=Б&products[]=Б')
+    
+    def test_write_invalidates_cache(self):
+        """Тест: после изменения данных возвращается новый ответ"""
+        url = '/api/chart-data/?type=bar'
+        self.client.get(url)
+        self.sale.quantity = 99
+        self.sale.save()
+        data = json.loads(self.client.get(url).content)
+        self.assertEqual(data['datasets'][0]['data'], [99])
+    
+    def test_lru_backend_is_bounded(self):
+        """Тест ограничения размера LRU-кэша"""
+        backend = cache.LRUBackend(max_size=2)
+        backend.set('a', 1)
+        backend.set('b', 2)
+        backend.get('a')
+        backend.set('c', 3)
+        self.assertIsNone(backend.get('b'))
+        self.assertEqual(backend.get('a'), 1)
+        self.assertEqual(backend.get('c'), 3)
+    
+    def test_django_cache_backend(self):
+        """Тест общего бэкенда на базе кэш-фреймворка Django"""
+        with self.settings(CHART_CACHE_BACKEND='django'):
+            cache.reset_backend()
+            try:
+                self.assertIsInstance(cache.get_backend(), cache.DjangoCacheBackend)
+                self.client.get('/api/chart-data/?type=line')
+                with self.assertNumQueries(1):
+                    self.client.get('/api/chart-data/?type=line')
+            finally:
+                cache.reset_backend()
+
+
+class ConditionalRequestTest(TestCase):
+    """Тесты ETag и ответов 304"""
+    
+    def setUp(self):
+        self.sale = MonthlySales.objects.create(
+            year=2024, month=1, product_name='Ноутбук',
+            quantity=10, revenue=500000.00
+        )
+    
+    def test_chart_api_not_modified(self):
+        """Тест: совпавший If-None-Match возвращает 304 без агрегации"""
+        url = '/api/chart-data/?type=all&products[]=Ноутбук'
+        etag = self.client.get(url)['ETag']
+        self.assertTrue(etag.startswith('"'))
+        with self.assertNumQueries(1):  # только чтение версии данных
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+    
+    def test_etag_depends_on_filters(self):
+        """Тест: разные фильтры дают разные ETag"""
+        first = self.client.get('/api/chart-data/?type=line&year=2024')['ETag']
+        second = self.client.get('/api/chart-data/?type=line')['ETag']
+        self.assertNotEqual(first, second)
+        response = self.client.get('/api/chart-data/?type=line', HTTP_IF_NONE_MATCH=first)
+        self.assertEqual(response.status_code, 200)
+    
+    def test_etag_changes_after_write(self):
+        """Тест: после изменения данных старый ETag не подходит"""
+        url = '/api/chart-data/?type=bar'
+        etag = self.client.get(url)['ETag']
+        self.sale.quantity = 11
+        self.sale.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+    
+    def test_table_not_modified(self):
+        """Тест: страница таблицы не рендерится повторно без изменений"""
+        url = reverse('sales:table') + '?year=2024'
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+    
+    def test_table_etag_depends_on_user(self):
+        """Тест: ETag страницы учитывает пользователя"""
+        from django.contrib.auth.models import User
+        url = reverse('sales:table')
+        etag = self.client.get(url)['ETag']
+        user = User.objects.create_user('manager', password='secret-pass-123')
+        self.client.force_login(user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class KeysetPaginationTest(TestCase):
+    """Тесты keyset-пагинации"""
+    
+    def setUp(self):
+        for year in (2023, 2024):
+            for month in range(1, 13):
+                for product in ('Ноутбук', 'Планшет'):
+                    MonthlySales.objects.create(
+                        year=year, month=month, product_name=product,
+                        quantity=month, revenue=1000.00 * month
+                    )
+        self.ordered = list(MonthlySales.objects.order_by('-year', '-month', 'product_id', 'id'))
+    
+    def paginator(self, queryset=None):
+        from .pagination import KeysetPaginator
+        from .views import SALES_ORDERING
+        return KeysetPaginator(queryset or MonthlySales.objects.all(), SALES_ORDERING, 10)
+    
+    def test_forward_walk_covers_all_rows(self):
+        """Тест: переход по страницам вперед проходит все записи по порядку"""
+        paginator = self.paginator()
+        page = paginator.get_page()
+        self.assertFalse(page.has_previous())
+        seen = list(page)
+        while page.has_next():
+            page = paginator.get_page(after=page.next_cursor)
+            seen.extend(page)
+        self.assertEqual(seen, self.ordered)
+        self.assertEqual(len(page), 8)
+    
+    def test_previous_page(self):
+        """Тест возврата на предыдущую страницу"""
+        paginator = self.paginator()
+        second = paginator.get_page(after=paginator.get_page().next_cursor)
+        first = paginator.get_page(before=second.previous_cursor)
+        self.assertEqual(list(first), self.ordered[:10])
+        self.assertFalse(first.has_previous())
+    
+    def test_last_page(self):
+        """Тест последней страницы"""
+        page = self.paginator().get_page(last=True)
+        self.assertEqual(list(page), self.ordered[-10:])
+        self.assertFalse(page.has_next())
+        self.assertTrue(page.has_previous())
+    
+    def test_invalid_cursor_gives_first_page(self):
+        """Тест: некорректный курсор открывает первую страницу"""
+        page = self.paginator().get_page(after='не-курсор')
+        self.assertEqual(list(page), self.ordered[:10])
+    
+    def test_table_view_keeps_filters_in_links(self):
+        """Тест: ссылки пагинации сохраняют фильтры"""
+        response = self.client.get(reverse('sales:table'), {'year': 2024, 'products': ['Ноутбук']})
+        self.assertEqual(len(response.context['sales_data']), 12)
+        self.assertEqual(response.context['filter_query'], 'year=2024&products=%D0%9D%D0%BE%D1%83%D1%82%D0%B1%D1%83%D0%BA')
+        self.assertNotContains(response, 'Следующая')
+        response = self.client.get(reverse('sales:table'), {'year': 2024})
+        page = response.context['sales_data']
+        next_link = response.context['page_links']['next']
+        self.assertEqual(next_link, '?' + urlencode({'year': 2024, 'after': page.next_cursor}))
+        self.assertContains(response, f'href="{escape(next_link)}"')
+        self.assertEqual(page.total, 24)
+    
+    def test_previous_link_after_end(self):
+        """Тест: на пустой странице за концом данных ссылка назад ведет на последнюю страницу"""
+        cursor = self.paginator().cursor_for(self.ordered[-1])
+        response = self.client.get(reverse('sales:table'), {'year': 2023, 'after': cursor})
+        self.assertEqual(len(response.context['sales_data']), 0)
+        self.assertEqual(response.context['page_links']['previous'], '?year=2023&last=1')
+        self.assertNotContains(response, 'before=None')
+    
+    def test_rows_partial(self):
+        """Тест: отдельный фрагмент записей с той же страницей, без макета и фильтров"""
+        response = self.client.get(reverse('sales:table'), {'year': 2024})
+        cursor = response.context['sales_data'].next_cursor
+        page = self.client.get(reverse('sales:table'), {'year': 2024, 'after': cursor})
+        rows = self.client.get(reverse('sales:table_rows'), {'year': 2024, 'after': cursor})
+        self.assertEqual(list(rows.context['sales_data']), list(page.context['sales_data']))
+        self.assertNotContains(rows, 'filterForm')
+        self.assertNotContains(rows, '<html')
+        self.assertContains(rows, 'Предыдущая')
+
+
+class FilterCatalogTest(TestCase):
+    """Тесты справочника значений фильтров"""
+    
+    def setUp(self):
+        cache.get_backend().clear()
+        self.sale = MonthlySales.objects.create(
+            year=2024, month=1, product_name='Ноутбук',
+            quantity=10, revenue=500000.00
+        )
+    
+    def catalog_version(self):
+        return cache.get_state()[1]
+    
+    def products(self):
+        return self.client.get(reverse('sales:product_search')).json()['results']
+    
+    def test_pages_do_not_scan_fact_table_for_options(self):
+        """Тест: списки фильтров не читаются из monthly_sales"""
+        self.client.get(reverse('sales:index'))
+        self.products()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('sales:index'))
+            products = self.products()
+        self.assertEqual(list(response.context['years']), [2024])
+        self.assertEqual(products, ['Ноутбук'])
+        for query in queries.captured_queries:
+            self.assertNotIn('monthly_sales', query['sql'])
+    
+    def test_value_change_keeps_catalog_version(self):
+        """Тест: изменение значений не сбрасывает справочник"""
+        version = self.catalog_version()
+        self.sale.quantity = 20
+        self.sale.save()
+        self.assertEqual(self.catalog_version(), version)
+    
+    def test_new_product_and_year_refresh_catalog(self):
+        """Тест: новый товар и новый год попадают в фильтры"""
+        self.client.get(reverse('sales:table'))
+        self.products()
+        MonthlySales.objects.create(
+            year=2025, month=3, product_name='Смартфон',
+            quantity=5, revenue=100000.00
+        )
+        response = self.client.get(reverse('sales:table'))
+        self.assertEqual(list(response.context['years']), [2025, 2024])
+        self.assertEqual(self.products(), ['Ноутбук', 'Смартфон'])
+    
+    def test_filter_panel_fragment_follows_catalog_version(self):
+        """Тест: закэшированная панель фильтров обновляется с версией справочника"""
+        self.assertNotContains(self.client.get(reverse('sales:table')), '<option value="2025"')
+        MonthlySales.objects.create(
+            year=2025, month=3, product_name='Смартфон',
+            quantity=5, revenue=100000.00
+        )
+        response = self.client.get(reverse('sales:table'), {'year': 2025})
+        self.assertContains(response, '<option value="2025">')
+        self.assertContains(response, 'data-selected-year="2025"')
+    
+    def test_filter_panel_key_ignores_query(self):
+        """Тест: выбранные год и месяц не входят в ключ закэшированной панели фильтров"""
+        from django.core.cache import caches
+        from django.core.cache.utils import make_template_fragment_key
+        for year, month in (('2024', '1'), ('1999', '12'), ('', '')):
+            response = self.client.get(reverse('sales:table'), {'year': year, 'month': month})
+            self.assertContains(response, f'data-selected-year="{year}" data-selected-month="{month}"')
+        key = make_template_fragment_key('sales_filter_panel', [response.context['catalog_version']])
+        self.assertIsNotNone(caches['default'].get(key))
+    
+    def test_removed_product_leaves_catalog(self):
+        """Тест: удаленный товар исчезает из фильтров"""
+        version = self.catalog_version()
+        self.sale.delete()
+        self.assertNotEqual(self.catalog_version(), version)
+        self.assertEqual(self.products(), [])
+
+
+class ProductSearchTest(TestCase):
+    """Тесты автодополнения товаров"""
+    
+    def setUp(self):
+        cache.get_backend().clear()
+        # Латиница: SQLite сравнивает без учета регистра только ASCII
+        for name in ['Gaming laptop', 'Laptop', 'Laptop Pro', 'Phone']:
+            MonthlySales.objects.create(year=2024, month=1, product_name=name, quantity=1, revenue=100)
+    
+    def search(self, **params):
+        return self.client.get(reverse('sales:product_search'), params)
+    
+    def test_prefix_matches_first(self):
+        """Тест: совпадения с начала названия выводятся раньше подстроки"""
+        data = self.search(q='lap').json()
+        self.assertEqual(data['results'], ['Laptop', 'Laptop Pro', 'Gaming laptop'])
+        self.assertFalse(data['has_more'])
+    
+    def test_limit_and_offset(self):
+        """Тест: список товаров выдается порциями"""
+        first = self.search(limit=3).json()
+        self.assertEqual(first['results'], ['Gaming laptop', 'Laptop', 'Laptop Pro'])
+        self.assertTrue(first['has_more'])
+        second = self.search(limit=3, offset=3).json()
+        self.assertEqual(second, {'results': ['Phone'], 'has_more': False})
+    
+    def test_like_wildcards_are_literal(self):
+        """Тест: символы % и _ в запросе не считаются шаблоном"""
+        self.assertEqual(self.search(q='%').json()['results'], [])
+    
+    def test_invalid_params(self):
+        """Тест неверных параметров"""
+        self.assertEqual(self.search(limit=0).status_code, 400)
+        self.assertEqual(self.search(limit=101).status_code, 400)
+        self.assertEqual(self.search(offset=-1).status_code, 400)
+    
+    def test_pages_do_not_embed_products(self):
+        """Тест: страница не выводит весь список товаров"""
+        response = self.client.get(reverse('sales:table'), {'products': ['Phone']})
+        self.assertContains(response, 'value="Phone"')
+        self.assertNotContains(response, 'value="Laptop"')
+
+
+class ImportTest(TestCase):
+    """Тесты потоковой загрузки данных"""
+    
+    CSV_DATA = (
+        'year,month,product_name,quantity,revenue\n'
+        '2024,1,Ноутбук,10,500000.00\n'
+        '2024,2,Ноутбук,12,600000.00\n'
+        '2024,13,Ноутбук,1,1.00\n'
+        '2024,3,Планшет,abc,1.00\n'
+        '2024,1,Ноутбук,11,550000.00\n'
+    )
+    
+    def setUp(self):
+        MonthlySales.objects.create(
+            year=2024, month=2, product_name='Ноутбук',
+            quantity=1, revenue=100.00
+        )
+    
+    def run_import(self, text, fmt='csv', chunk_size=2):
+        import io
+        from .importer import SalesImporter, iter_records
+        return SalesImporter(chunk_size=chunk_size).run(iter_records(io.StringIO(text), fmt))
+    
+    def test_csv_import_with_upsert_and_errors(self):
+        """Тест загрузки CSV: обновление существующих записей и ошибки по строкам"""
+        result = self.run_import(self.CSV_DATA)
+        self.assertEqual(result.processed, 5)
+        self.assertEqual(result.imported, 3)
+        self.assertEqual([line_no for line_no, _ in result.errors], [4, 5])
+        self.assertIn('month', result.errors[0][1])
+        self.assertIn('quantity', result.errors[1][1])
+        self.assertEqual(MonthlySales.objects.count(), 2)
+        self.assertEqual(MonthlySales.objects.get(year=2024, month=1).quantity, 11)
+        self.assertEqual(MonthlySales.objects.get(year=2024, month=2).quantity, 12)
+    
+    def test_import_keeps_rollups_consistent(self):
+        """Тест: после загрузки сводные таблицы совпадают с полным пересчетом"""
+        self.run_import(self.CSV_DATA)
+        self.assertEqual(ProductTotal.objects.get(product_name='Ноутбук').quantity, 23)
+        snapshot = RollupTest.snapshot(self)
+        rollups.rebuild()
+        self.assertEqual(RollupTest.snapshot(self), snapshot)
+    
+    @skipUnless(connection.vendor == 'postgresql', 'Временные таблицы загрузки есть только в PostgreSQL')
+    def test_chunks_inside_outer_transaction(self):
+        """Тест: порции во внешней транзакции не учитываются в сводных таблицах повторно"""
+        from django.db import transaction
+        from django.db.models import Sum
+        with transaction.atomic():
+            result = self.run_import(self.CSV_DATA + '2024,2,Ноутбук,13,650000.00\n')
+        self.assertEqual(result.imported, 4)
+        self.assertEqual(MonthlySales.objects.get(year=2024, month=2).quantity, 13)
+        facts = MonthlySales.objects.aggregate(quantity=Sum('quantity'), revenue=Sum('revenue'))
+        totals = MonthlyTotal.objects.aggregate(quantity=Sum('quantity'), revenue=Sum('revenue'))
+        self.assertEqual(totals, facts)
+        self.assertEqual(ProductTotal.objects.get(product_name='Ноутбук').quantity, facts['quantity'])
+        snapshot = RollupTest.snapshot(self)
+        rollups.rebuild()
+        self.assertEqual(RollupTest.snapshot(self), snapshot)
+    
+    def test_jsonl_import(self):
+        """Тест загрузки JSONL"""
+        text = (
+            '{"year": 2023, "month": 5, "product_name": "Смартфон", "quantity": 3, "revenue": "900.50"}\n'
+            '\n'
+            'не json\n'
+        )
+        result = self.run_import(text, fmt='jsonl')
+        self.assertEqual(result.imported, 1)
+        self.assertEqual(result.errors[0][0], 3)
+        self.assertEqual(MonthlySales.objects.get(year=2023).revenue, Decimal('900.50'))
+    
+    def test_import_command(self):
+        """Тест команды import_sales"""
+        import tempfile
+        from django.core.management import call_command
+        from io import StringIO
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='utf-8', delete=False) as stream:
+            stream.write(self.CSV_DATA)
+        out, err = StringIO(), StringIO()
+        call_command('import_sales', stream.name, stdout=out, stderr=err)
+        self.assertIn('загружено: 3', out.getvalue())
+        self.assertIn('Строка 4', err.getvalue())
+    
+    def test_upload_requires_login(self):
+        """Тест: загрузка файла доступна только после входа"""
+        response = self.client.get(reverse('sales:import'))
+        self.assertEqual(response.status_code, 302)
+    
+    def test_upload_endpoint(self):
+        """Тест загрузки файла через веб-интерфейс"""
+        from django.contrib.auth.models import User
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        self.client.force_login(User.objects.create_user('manager', password='secret-pass-123'))
+        upload = SimpleUploadedFile('sales.csv', self.CSV_DATA.encode('utf-8'))
+        response = self.client.post(reverse('sales:import'), {'file': upload}, HTTP_ACCEPT='application/json')
+        data = json.loads(response.content)
+        self.assertEqual(data['imported'], 3)
+        self.assertEqual(data['error_count'], 2)
+
+
+class ExportTest(TestCase):
+    """Тесты потоковой выгрузки"""
+    
+    def setUp(self):
+        MonthlySales.objects.create(
+            year=2024, month=1, product_name='Ноутбук',
+            quantity=10, revenue=500000.00
+        )
+        MonthlySales.objects.create(
+            year=2023, month=5, product_name='Смартфон',
+            quantity=20, revenue=600000.50
+        )
+    
+    def test_csv_export(self):
+        """Тест выгрузки CSV"""
+        response = self.client.get(reverse('sales:export'))
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertEqual(content.splitlines(), [
+            'year,month,product_name,quantity,revenue',
+            '2024,1,Ноутбук,10,500000.00',
+            '2023,5,Смартфон,20,600000.50',
+        ])
+    
+    def test_ndjson_export_with_filters(self):
+        """Тест выгрузки NDJSON с фильтрами таблицы"""
+        response = self.client.get(reverse('sales:export'), {'format': 'ndjson', 'products': ['Смартфон']})
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [{
+            'year': 2023, 'month': 5, 'product_name': 'Смартфон',
+            'quantity': 20, 'revenue': '600000.50',
+        }])
+    
+    def test_gzip_export(self):
+        """Тест сжатой выгрузки"""
+        import gzip
+        response = self.client.get(reverse('sales:export'), {'year': 2024, 'gzip': '1'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        content = gzip.decompress(b''.join(response.streaming_content)).decode('utf-8')
+        self.assertEqual(content.splitlines()[1:], ['2024,1,Ноутбук,10,500000.00'])
+    
+    def test_export_roundtrip_through_import(self):
+        """Тест: выгрузка загружается обратно импортом без ошибок"""
+        import io
+        from .importer import SalesImporter, iter_records
+        content = b''.join(self.client.get(reverse('sales:export')).streaming_content).decode('utf-8')
+        result = SalesImporter().run(iter_records(io.StringIO(content), 'csv'))
+        self.assertEqual((result.imported, result.error_count), (2, 0))
+    
+    def test_invalid_format(self):
+        """Тест неверного формата выгрузки"""
+        response = self.client.get(reverse('sales:export'), {'format': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN-планы проверяются только в PostgreSQL')
+class QueryPlanTest(TestCase):
+    """
+    Тесты: запросы, которые выполняют представления, используют индексы monthly_sales.
+    Таблица заполняется синтетическими данными (~18 тыс. записей), настройки
+    планировщика не меняются - проверяется выбор самого планировщика.
+    """
+    
+    @classmethod
+    def setUpTestData(cls):
+        from .models import Product
+        from .synthetic import generate_rows
+        rows = list(generate_rows(products=300, years=5))
+        product_ids = Product.objects.ids_for(row[2] for row in rows)
+        MonthlySales.objects.bulk_create(
+            (
+                MonthlySales(year=year, month=month, product_id=product_ids[name], quantity=quantity, revenue=revenue)
+                for year, month, name, quantity, revenue in rows
+            ),
+            batch_size=2000,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE monthly_sales')
+            cursor.execute('ANALYZE products')
+    
+    def setUp(self):
+        cache.get_backend().clear()
+    
+    def view_plans(self, path, params):
+        """Планы запросов к monthly_sales, выполненных представлением"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        plans = []
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                sql = query['sql']
+                if 'monthly_sales' in sql and sql.lstrip().upper().startswith('SELECT'):
+                    cursor.execute('EXPLAIN ' + sql)
+                    plans.append('\n'.join(row[0] for row in cursor.fetchall()))
+        self.assertTrue(plans)
+        return response, plans
+    
+    def assertUsesIndex(self, plans, index='monthly_sales_'):
+        for plan in plans:
+            self.assertNotRegex(plan, r'Seq Scan on monthly_sales')
+            self.assertIn(index, plan)
+    
+    def test_sales_table_pages(self):
+        """Тест: первая и следующая страницы таблицы читаются из индекса порядка записей"""
+        response, plans = self.view_plans(reverse('sales:table_rows'), {'year': 2023})
+        self.assertUsesIndex(plans[:1], 'monthly_sales_order_idx')
+        cursor = response.context['sales_data'].next_cursor
+        _, plans = self.view_plans(reverse('sales:table_rows'), {'year': 2023, 'after': cursor})
+        self.assertUsesIndex(plans[:1], 'monthly_sales_order_idx')
+        self.assertRegex(plans[0], r'Index Cond: .*year')
+    
+    def test_keyset_seek_page(self):
+        """Тест: глубокая страница без фильтров начинает чтение индекса с курсора"""
+        from .pagination import KeysetPaginator
+        from .views import SALES_ORDERING
+        # Курсор в самом старом году: перед ним почти вся таблица
+        oldest = MonthlySales.objects.order_by(*SALES_ORDERING).last()
+        row = MonthlySales.objects.filter(year=oldest.year).order_by(*SALES_ORDERING).first()
+        cursor = KeysetPaginator(MonthlySales.objects.all(), SALES_ORDERING, 20).cursor_for(row)
+        _, plans = self.view_plans(reverse('sales:table_rows'), {'after': cursor})
+        self.assertUsesIndex(plans[:1], 'monthly_sales_order_idx')
+        self.assertRegex(plans[0], r'Index Cond: .*year <=')
+    
+    def test_manage_sales_query(self):
+        """Тест: страница управления с фильтром по году и месяцу"""
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_user('manager', password='secret-pass-123'))
+        _, plans = self.view_plans(reverse('sales:manage'), {'year': 2023, 'month': 3})
+        self.assertUsesIndex(plans[:1])
+    
+    def test_chart_query_with_products(self):
+        """Тест: API диаграмм с фильтром по товарам читает индекс по товару"""
+        from .synthetic import product_names
+        _, plans = self.view_plans('/api/chart-data/', {
+            'type': 'all', 'year': 2023, 'products[]': product_names(2),
+        })
+        self.assertUsesIndex(plans, 'monthly_sales_product_idx')
+
+
+class MetricsTest(TestCase):
+    """Тесты метрик запросов"""
+    
+    def setUp(self):
+        from .metrics import registry
+        registry.reset()
+        MonthlySales.objects.create(
+            year=2024, month=1, product_name='Ноутбук',
+            quantity=10, revenue=500000.00
+        )
+    
+    def test_server_timing_header(self):
+        """Тест заголовка Server-Timing"""
+        response = self.client.get(reverse('sales:table'))
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="SQL x\d+"')
+        self.assertIn('template;dur=', timing)
+        self.assertIn('total;dur=', timing)
+    
+    def test_metrics_endpoint(self):
+        """Тест выдачи гистограмм по представлениям"""
+        from django.contrib.auth.models import User
+        self.client.get('/api/chart-data/?type=all&products[]=Ноутбук')
+        self.assertEqual(self.client.get(reverse('sales:metrics')).status_code, 403)
+        self.client.force_login(User.objects.create_user('admin', password='secret-pass-123', is_staff=True))
+        response = self.client.get(reverse('sales:metrics'))
+        body = response.content.decode()
+        self.assertIn('sales_db_queries_count{view="sales:chart_data"} 1', body)
+        self.assertIn('sales_serialize_duration_ms_bucket{view="sales:chart_data",le="+Inf"} 1', body)
+    
+    def test_metrics_token(self):
+        """Тест доступа к метрикам по токену"""
+        with self.settings(METRICS_TOKEN='secret'):
+            response = self.client.get(reverse('sales:metrics'), HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(response.status_code, 200)
+            response = self.client.get(reverse('sales:metrics'), HTTP_AUTHORIZATION='Bearer wrong')
+            self.assertEqual(response.status_code, 403)
+
+
+class QueryBudgetTest(TestCase):
+    """
+    Бюджеты SQL-запросов по представлениям.
+    Тест падает, если представление начинает выполнять больше запросов,
+    например из-за N+1 в шаблоне или отключенного кэша.
+    """
+    
+    BUDGETS = {
+        'index': 3,
+        'chart_all': 3,
+        'chart_products': 2,
+        'table': 5,
+        'manage': 7,
+        'export': 1,
+    }
+    
+    def setUp(self):
+        from django.contrib.auth.models import User
+        cache.get_backend().clear()
+        for month in range(1, 13):
+            for product in ('Ноутбук', 'Смартфон', 'Планшет'):
+                MonthlySales.objects.create(
+                    year=2024, month=month, product_name=product,
+                    quantity=month, revenue=1000.00 * month
+                )
+        self.user = User.objects.create_user('manager', password='secret-pass-123')
+    
+    def assertWithinBudget(self, name, url, data=None):
+        cache.get_backend().clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, data)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(
+            len(queries), self.BUDGETS[name],
+            f'{name}: {len(queries)} запросов при бюджете {self.BUDGETS[name]}:\n'
+            + '\n'.join(query['sql'] for query in queries.captured_queries)
+        )
+    
+    def test_index(self):
+        self.assertWithinBudget('index', reverse('sales:index'))
+    
+    def test_chart_api(self):
+        self.assertWithinBudget('chart_all', '/api/chart-data/?type=all&year=2024')
+        self.assertWithinBudget('chart_products', '/api/chart-data/?type=all&products[]=Ноутбук')
+    
+    def test_table(self):
+        self.assertWithinBudget('table', reverse('sales:table'), {'year': 2024, 'products': ['Ноутбук']})
+    
+    def test_manage(self):
+        self.client.force_login(self.user)
+        self.assertWithinBudget('manage', reverse('sales:manage'), {'year': 2024})
+    
+    def test_export(self):
+        self.assertWithinBudget('export', reverse('sales:export'))
+
+
+class AsyncViewsTest(TransactionTestCase):
+    """
+    Тесты асинхронных представлений.
+    Запросы выполняются в отдельных потоках со своими соединениями,
+    поэтому данные должны быть зафиксированы (TransactionTestCase).
+    """
+    
+    def setUp(self):
+        cache.get_backend().clear()
+        cache.get_state()
+        for month in (1, 2):
+            for product in ('Ноутбук', 'Смартфон'):
+                MonthlySales.objects.create(
+                    year=2024, month=month, product_name=product,
+                    quantity=month * 10, revenue=1000.00 * month
+                )
+    
+    async def test_async_chart_matches_sync(self):
+        """Тест: асинхронный API возвращает те же данные, что и синхронный"""
+        client = AsyncClient()
+        for query in ('type=all', 'type=all&year=2024', 'type=line&products[]=Ноутбук', 'type=pie'):
+            async_response = await client.get(f'/api/async/chart-data/?{query}')
+            sync_response = await sync_to_async(self.client.get)(f'/api/chart-data/?{query}')
+            self.assertEqual(async_response.status_code, 200)
+            self.assertEqual(json.loads(async_response.content), json.loads(sync_response.content))
+    
+    async def test_async_chart_not_modified(self):
+        """Тест ответа 304 асинхронного API"""
+        client = AsyncClient()
+        etag = (await client.get('/api/async/chart-data/?type=bar'))['ETag']
+        response = await client.get('/api/async/chart-data/?type=bar', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+    
+    async def test_async_invalid_chart_type(self):
+        """Тест неверного типа диаграммы"""
+        response = await AsyncClient().get('/api/async/chart-data/?type=invalid')
+        self.assertEqual(response.status_code, 400)
+    
+    async def test_async_table(self):
+        """Тест асинхронной страницы таблицы"""
+        response = await AsyncClient().get(reverse('sales:table_async'), {'year': 2024})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['sales_data']), 4)
+        self.assertEqual(list(response.context['years']), [2024])
+        self.assertIn('SQL x', response['Server-Timing'])
+
+
+class FakeConnection:
+    """Заглушка соединения psycopg2 для тестов пула"""
+    
+    def __init__(self):
+        self.closed = 0
+        self.autocommit = True
+        self.rollbacks = 0
+        self.info = type('Info', (), {'transaction_status': extensions.TRANSACTION_STATUS_IDLE})()
+    
+    def cursor(self):
+        return contextlib.nullcontext(type('Cursor', (), {'execute': lambda self, sql: None})())
+    
+    def rollback(self):
+        self.rollbacks += 1
+        self.info.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+    
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTest(TestCase):
+    """Тесты пула соединений"""
+    
+    def test_connection_reused(self):
+        """Тест: возвращенное соединение выдается повторно"""
+        pool = ConnectionPool(max_size=2)
+        conn = pool.getconn(FakeConnection)
+        pool.putconn(conn)
+        self.assertIs(pool.getconn(FakeConnection), conn)
+        self.assertEqual(pool.size, 1)
+    
+    def test_open_transaction_rolled_back(self):
+        """Тест отката незавершенной транзакции при возврате"""
+        pool = ConnectionPool()
+        conn = pool.getconn(FakeConnection)
+        conn.info.transaction_status = extensions.TRANSACTION_STATUS_INTRANS
+        pool.putconn(conn)
+        self.assertEqual(conn.rollbacks, 1)
+        self.assertIs(pool.getconn(FakeConnection), conn)
+    
+    def test_broken_and_expired_connections_discarded(self):
+        """Тест: закрытые и устаревшие соединения не возвращаются в пул"""
+        pool = ConnectionPool(max_lifetime=60)
+        broken = pool.getconn(FakeConnection)
+        pool.putconn(broken)
+        broken.closed = 2
+        self.assertIsNot(pool.getconn(FakeConnection), broken)
+        
+        expired = pool.getconn(FakeConnection)
+        pool._created[expired] -= 120
+        pool.putconn(expired)
+        self.assertTrue(expired.closed)
+        self.assertEqual(pool.size, 1)
+    
+    def test_pool_size_limit(self):
+        """Тест ожидания свободного соединения при заполненном пуле"""
+        pool = ConnectionPool(max_size=1, timeout=0.05)
+        conn = pool.getconn(FakeConnection)
+        with self.assertRaises(PoolTimeout):
+            pool.getconn(FakeConnection)
+        
+        threading.Timer(0.01, pool.putconn, [conn]).start()
+        pool.timeout = 5
+        self.assertIs(pool.getconn(FakeConnection), conn)
+    
+    def test_failed_connect_releases_slot(self):
+        """Тест: ошибка подключения не занимает место в пуле"""
+        pool = ConnectionPool(max_size=1, timeout=0)
+        
+        def fail():
+            raise psycopg2.OperationalError('connection refused')
+        
+        with self.assertRaises(psycopg2.OperationalError):
+            pool.getconn(fail)
+        self.assertEqual(pool.size, 0)
+        self.assertIsInstance(pool.getconn(FakeConnection), FakeConnection)
+
+
+class ChartFormatTest(TestCase):
+    """Тесты компактных форматов ответа API диаграмм и сжатия"""
+    
+    def setUp(self):
+        cache.get_backend().clear()
+        MonthlySales.objects.create(
+            year=2024, month=1, product_name='Ноутбук',
+            quantity=10, revenue=500000.55
+        )
+        MonthlySales.objects.create(
+            year=2024, month=3, product_name='Смартфон',
+            quantity=20, revenue=600000.10
+        )
+    
+    def test_columnar_format(self):
+        """Тест колоночного формата: целые копейки и штуки, без стилей"""
+        response = self.client.get('/api/chart-data/?type=all&format=columnar')
+        self.assertEqual(response['Content-Type'], 'application/vnd.sales.chart+json')
+        data = json.loads(response.content)
+        self.assertEqual(data['line']['labels'], ['Январь 2024', 'Февраль 2024', 'Март 2024'])
+        self.assertEqual(data['line']['values'], [[50000055, 0, 60000010]])
+        self.assertEqual(data['line']['scale'], 100)
+        self.assertEqual(data['bar']['values'], [[20, 10]])
+        self.assertEqual(data['pie']['labels'], ['Смартфон', 'Ноутбук'])
+        self.assertNotIn('backgroundColor', response.content.decode())
+    
+    def test_binary_format(self):
+        """Тест бинарного формата: заголовок JSON и значения float64 с выравниванием"""
+        response = self.client.get(
+            '/api/chart-data/?type=line', HTTP_ACCEPT='application/vnd.sales.chart+binary'
+        )
+        self.assertEqual(response['Content-Type'], 'application/vnd.sales.chart+binary')
+        content = response.content
+        self.assertEqual(content[:4], b'SCHB')
+        header_length = struct.unpack('<I', content[4:8])[0]
+        header = json.loads(content[8:8 + header_length])
+        chart = header['charts']['line']
+        data_offset = -(-(8 + header_length) // 8) * 8
+        values = struct.unpack(f'<{chart["length"]}d', content[data_offset:])
+        self.assertEqual(values, (50000055.0, 0.0, 60000010.0))
+        self.assertEqual(chart['series'], ['Выручка (руб.)'])
+        self.assertIsNone(chart['other'])
+
+    def test_columnar_large_revenue_exact(self):
+        """Тест: большая выручка переводится в копейки без ошибки округления float"""
+        from . import formats
+        chart = {'labels': ['Ноутбук'], 'datasets': [{'label': 'Выручка (руб.)', 'data': [Decimal('79383551599327.29')]}]}
+        self.assertEqual(formats.to_columns(chart, 'pie')['values'], [[7938355159932729]])
+        # Формат json отдает выручку числом
+        data = json.loads(self.client.get('/api/chart-data/?type=pie').content)
+        self.assertEqual(data['datasets'][0]['data'], [600000.1, 500000.55])
+
+    def test_other_flag(self):
+        """Тест: ряд "Другие" отмечается номером, а не названием; товар «Другие» - обычный ряд"""
+        MonthlySales.objects.create(
+            year=2024, month=2, product_name='Другие',
+            quantity=30, revenue=900000
+        )
+        data = json.loads(self.client.get('/api/chart-data/?type=all&format=columnar&series=product&top_n=1').content)
+        self.assertEqual(data['bar']['labels'], ['Другие', 'Другие'])
+        self.assertEqual(data['bar']['other'], 1)
+        self.assertEqual(data['pie']['other'], 1)
+        self.assertEqual(data['line']['series'], ['Другие', 'Другие'])
+        self.assertEqual(data['line']['other'], 1)
+
+        data = json.loads(self.client.get('/api/chart-data/?type=bar&format=columnar').content)
+        self.assertEqual(data['labels'], ['Другие', 'Смартфон', 'Ноутбук'])
+        self.assertIsNone(data['other'])
+
+    def test_format_in_etag(self):
+        """Тест: разные форматы одного запроса имеют разные ETag"""
+        json_etag = self.client.get('/api/chart-data/?type=bar')['ETag']
+        binary_etag = self.client.get(
+            '/api/chart-data/?type=bar', HTTP_ACCEPT='application/vnd.sales.chart+binary'
+        )['ETag']
+        self.assertNotEqual(json_etag, binary_etag)
+        self.assertEqual(self.client.get('/api/chart-data/?type=bar&format=xml').status_code, 400)
+    
+    def test_gzip_compression(self):
+        """Тест сжатия ответа и ответа 304 на слабый ETag сжатого представления"""
+        response = self.client.get('/api/chart-data/?type=all', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        data = json.loads(gzip.decompress(response.content))
+        self.assertEqual(data['bar']['labels'], ['Смартфон', 'Ноутбук'])
+        self.assertTrue(response['ETag'].startswith('W/'))
+        
+        response = self.client.get(
+            '/api/chart-data/?type=all', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+        
+        response = self.client.get('/api/chart-data/?type=all', HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+    
+    def test_brotli_compression(self):
+        """Тест: brotli предпочитается gzip, без модуля brotli - сжатие gzip"""
+        from unittest import mock
+        import brotli
+        from . import http
+        response = self.client.get('/api/chart-data/?type=all', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(json.loads(brotli.decompress(response.content))['bar']['labels'], ['Смартфон', 'Ноутбук'])
+        with mock.patch.object(http, 'brotli', None):
+            response = self.client.get('/api/chart-data/?type=all', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+    
+    def test_json_encoders_match(self):
+        """Тест: orjson и стандартный json дают одинаковые данные колоночного формата"""
+        from unittest import mock
+        from . import formats
+        self.assertIsNotNone(formats.orjson)
+        data = json.loads(self.client.get('/api/chart-data/?type=all&format=columnar').content)
+        fast = formats.dumps(data)
+        with mock.patch.object(formats, 'orjson', None):
+            fallback = formats.dumps(data)
+        self.assertEqual(json.loads(fast), json.loads(fallback))
+        self.assertEqual(json.loads(fast), data)
+
+
+class AnalyticsTest(TestCase):
+    """Тесты аналитических представлений и API"""
+    
+    def setUp(self):
+        for month, revenue in ((1, 1000), (2, 3000), (4, 2000)):
+            MonthlySales.objects.create(
+                year=2024, month=month, product_name='Ноутбук',
+                quantity=month, revenue=revenue
+            )
+        MonthlySales.objects.create(
+            year=2023, month=12, product_name='Смартфон',
+            quantity=5, revenue=500.50
+        )
+        # В PostgreSQL представления материализованы и показывают данные после обновления
+        analytics.refresh()
+    
+    def test_quarterly(self):
+        """Тест выручки по кварталам"""
+        data = json.loads(self.client.get('/api/analytics/quarterly/?year=2024').content)
+        self.assertEqual(
+            [(row['year'], row['quarter'], Decimal(row['revenue'])) for row in data['results']],
+            [(2024, 1, Decimal('4000')), (2024, 2, Decimal('2000'))]
+        )
+        self.assertEqual(self.client.get('/api/analytics/quarterly/?year=abc').status_code, 400)
+    
+    def test_top_months(self):
+        """Тест рейтинга месяцев по выручке"""
+        data = json.loads(self.client.get('/api/analytics/top-months/?limit=2').content)
+        self.assertEqual(
+            [(row['year'], row['month'], row['revenue_rank']) for row in data['results']],
+            [(2024, 2, 1), (2024, 4, 2)]
+        )
+        self.assertEqual(self.client.get('/api/analytics/top-months/?limit=0').status_code, 400)
+    
+    def test_product_averages(self):
+        """Тест средних продаж товаров"""
+        data = json.loads(self.client.get('/api/analytics/products/').content)
+        laptop = data['results'][0]
+        self.assertEqual(laptop['product_name'], 'Ноутбук')
+        self.assertEqual(laptop['months'], 3)
+        self.assertEqual(Decimal(laptop['avg_revenue']), Decimal('2000'))
+        self.assertEqual(Decimal(laptop['avg_quantity']), Decimal('2.33'))
+        self.assertEqual(Decimal(data['results'][1]['avg_revenue']), Decimal('500.50'))
+    
+    @skipUnless(connection.vendor == 'postgresql', 'Материализованные представления есть только в PostgreSQL')
+    def test_refresh_threshold(self):
+        """Тест: представления обновляются после накопления порога изменений"""
+        self.assertEqual(analytics.pending_changes(), 0)
+        MonthlySales.objects.create(
+            year=2024, month=5, product_name='Ноутбук',
+            quantity=1, revenue=100000
+        )
+        self.assertEqual(MonthRevenue.objects.filter(year=2024, month=5).count(), 0)
+        self.assertGreater(analytics.pending_changes(), 0)
+        with self.settings(ANALYTICS_REFRESH_THRESHOLD=1):
+            self.assertTrue(analytics.refresh_if_needed())
+        self.assertEqual(MonthRevenue.objects.get(year=2024, month=5).revenue_rank, 1)
+        self.assertEqual(analytics.pending_changes(), 0)
+
+
+class PartitioningTest(TransactionTestCase):
+    """
+    Тесты секционирования monthly_sales по годам.
+    DETACH PARTITION CONCURRENTLY нельзя выполнять в транзакции, поэтому TransactionTestCase.
+    """
+    
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            from . import partitions
+            partitions.ensure_years(2023, 2024)
+        for year in (2023, 2024):
+            for product in ('Ноутбук', 'Смартфон'):
+                MonthlySales.objects.create(
+                    year=year, month=1, product_name=product,
+                    quantity=10, revenue=1000.00
+                )
+    
+    @skipUnless(connection.vendor == 'postgresql', 'Секционирование есть только в PostgreSQL')
+    def test_partition_pruning(self):
+        """Тест: запрос с фильтром по году читает только секцию этого года"""
+        from .filters import filter_sales
+        plan = filter_sales(year='2024').explain()
+        self.assertIn('monthly_sales_y2024', plan)
+        self.assertNotIn('monthly_sales_y2023', plan)
+    
+    @skipUnless(connection.vendor == 'postgresql', 'Секционирование есть только в PostgreSQL')
+    def test_future_partitions_created(self):
+        """Тест: секции будущих лет выделяются из общей секции вместе с ее строками"""
+        from . import partitions
+        last = partitions.year_partitions()[-1]
+        MonthlySales.objects.create(year=last + 3, month=1, product_name='Ноутбук', quantity=1, revenue=1)
+        self.assertEqual(partitions.ensure_years(last, last + 3), [last + 1, last + 2, last + 3])
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM monthly_sales_y{last + 3}')
+            self.assertEqual(cursor.fetchone()[0], 1)
+        self.assertEqual(partitions.ensure_years(last, last + 3), [])
+    
+    @skipUnless(connection.vendor == 'postgresql', 'Секционирование есть только в PostgreSQL')
+    def test_archive_and_restore_year(self):
+        """Тест архивации года: данные и сводные таблицы без этого года, затем восстановление"""
+        from . import partitions
+        self.assertEqual(partitions.archive_year(2023), 2)
+        self.assertFalse(MonthlySales.objects.filter(year=2023).exists())
+        self.assertFalse(MonthlyTotal.objects.filter(year=2023).exists())
+        self.assertEqual(ProductTotal.objects.get(product_name='Ноутбук').rows, 1)
+        self.assertEqual(partitions.archived_years(), [2023])
+        
+        partitions.restore_year(2023)
+        self.assertEqual(MonthlySales.objects.filter(year=2023).count(), 2)
+        self.assertEqual(ProductTotal.objects.get(product_name='Ноутбук').rows, 2)
+    
+    @skipUnless(connection.vendor != 'postgresql', 'Проверка для СУБД без секционирования')
+    def test_command_requires_postgresql(self):
+        """Тест: без PostgreSQL команда сообщает, что секционирование недоступно"""
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        with self.assertRaises(CommandError):
+            call_command('manage_partitions')
+
+
+class SyntheticDataTest(TestCase):
+    """Тесты генератора синтетических данных и замеров производительности"""
+    
+    def test_generate_rows_deterministic(self):
+        """Тест: при одном seed генератор выдает одинаковые уникальные строки"""
+        from .synthetic import generate_rows
+        rows = list(generate_rows(products=5, years=2, start_year=2023, seed=1))
+        self.assertEqual(rows, list(generate_rows(products=5, years=2, start_year=2023, seed=1)))
+        self.assertEqual(len({row[:3] for row in rows}), len(rows))
+        self.assertTrue(all(row[3] > 0 and row[4] > 0 for row in rows))
+    
+    def test_generate_sales_command(self):
+        """Тест команды generate_sales: строки загружены, сводные таблицы согласованы"""
+        from django.core.management import call_command
+        from django.db.models import Sum
+        from io import StringIO
+        MonthlySales.objects.create(year=2000, month=1, product_name='Старый', quantity=1, revenue=1)
+        call_command('generate_sales', products=4, years=2, start_year=2023, clear=True, stdout=StringIO())
+        self.assertFalse(MonthlySales.objects.filter(year=2000).exists())
+        self.assertEqual(ProductTotal.objects.count(), 4)
+        self.assertEqual(
+            MonthlyTotal.objects.aggregate(total=Sum('revenue'))['total'],
+            MonthlySales.objects.aggregate(total=Sum('revenue'))['total'],
+        )
+    
+    def test_benchmark_command(self):
+        """Тест команды benchmark_sales: JSON с замерами и сравнение с базовым прогоном"""
+        import os
+        import tempfile
+        from django.core.management import call_command
+        from io import StringIO
+        call_command('generate_sales', products=3, years=1, start_year=2024, stdout=StringIO())
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'baseline.json')
+            call_command('benchmark_sales', iterations=2, warmup=0, only='chart:all', output=output, stdout=StringIO())
+            with open(output, encoding='utf-8') as report_file:
+                report = json.load(report_file)
+            result = report['results']['chart:all:year']
+            self.assertEqual(result['status'], 200)
+            self.assertIn('p95_ms', result)
+            self.assertGreater(result['peak_memory_kb'], 0)
+            self.assertEqual(report['meta']['rows'], 36)
+            
+            out = StringIO()
+            call_command('benchmark_sales', iterations=2, warmup=0, only='chart:all:none', compare=output, stdout=out)
+            self.assertIn('Сравнение с', out.getvalue())
+
+
+class BulkOperationsTest(TestCase):
+    """Тесты массового редактирования и удаления записей"""
+    
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'secret-pass-123')
+        self.client.force_login(self.user)
+        self.sales = [
+            MonthlySales.objects.create(
+                year=2024, month=month, product_name=product, quantity=10, revenue=1000
+            )
+            for month in (1, 2) for product in ('Ноутбук', 'Смартфон', 'Планшет')
+        ]
+    
+    def edit_data(self, changes):
+        data = {'form-TOTAL_FORMS': len(self.sales), 'form-INITIAL_FORMS': len(self.sales), 'next': '/manage/?year=2024'}
+        for index, sale in enumerate(self.sales):
+            quantity, revenue = changes.get(sale.pk, (sale.quantity, sale.revenue))
+            data.update({
+                f'form-{index}-id': sale.pk,
+                f'form-{index}-quantity': quantity,
+                f'form-{index}-revenue': revenue,
+            })
+        return data
+    
+    def test_manage_page_renders_edit_form(self):
+        """Тест: страница управления содержит поля редактирования и флажки выбора"""
+        response = self.client.get(reverse('sales:manage'))
+        self.assertContains(response, 'name="form-TOTAL_FORMS"')
+        self.assertContains(response, f'name="ids" value="{self.sales[0].pk}"')
+    
+    def test_bulk_edit_single_update(self):
+        """Тест: изменения страницы сохраняются одним UPDATE, сводные таблицы пересчитаны"""
+        changes = {self.sales[0].pk: (15, '1500.50'), self.sales[4].pk: (5, '400')}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('sales:bulk_edit'), self.edit_data(changes))
+        self.assertRedirects(response, '/manage/?year=2024', fetch_redirect_response=False)
+        updates = [query for query in queries.captured_queries if query['sql'].startswith('UPDATE "monthly_sales"')]
+        self.assertEqual(len(updates), 1)
+        self.sales[0].refresh_from_db()
+        self.assertEqual(self.sales[0].revenue, Decimal('1500.50'))
+        self.assertEqual(MonthlyTotal.objects.get(year=2024, month=1).quantity, 35)
+        self.assertEqual(ProductTotal.objects.get(product_name=self.sales[4].product_name).quantity, 15)
+    
+    def test_bulk_edit_invalid(self):
+        """Тест: при ошибке в строке ничего не сохраняется"""
+        data = self.edit_data({self.sales[0].pk: (15, '1500'), self.sales[1].pk: ('много', '1')})
+        self.client.post(reverse('sales:bulk_edit'), data)
+        self.sales[0].refresh_from_db()
+        self.assertEqual(self.sales[0].quantity, 10)
+    
+    def test_bulk_delete_selected(self):
+        """Тест удаления выбранных записей: подтверждение, затем один DELETE"""
+        ids = [self.sales[0].pk, self.sales[1].pk]
+        response = self.client.post(reverse('sales:bulk_delete'), {'ids': ids})
+        self.assertTemplateUsed(response, 'sales/confirm_bulk_delete.html')
+        self.assertEqual(response.context['count'], 2)
+        self.assertEqual(MonthlySales.objects.count(), 6)
+        
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('sales:bulk_delete'), {'ids': ids, 'confirm': '1'})
+        deletes = [query for query in queries.captured_queries if query['sql'].startswith('DELETE FROM "monthly_sales"')]
+        self.assertEqual(len(deletes), 1)
+        self.assertEqual(MonthlySales.objects.count(), 4)
+        self.assertEqual(MonthlyTotal.objects.get(year=2024, month=1).rows, 1)
+        self.assertEqual(ProductTotal.objects.get(product_name='Ноутбук').rows, 1)
+    
+    def test_bulk_delete_filtered(self):
+        """Тест удаления всех записей по фильтру"""
+        url = reverse('sales:bulk_delete') + '?year=2024&month=2'
+        self.client.post(url, {'scope': 'filtered', 'confirm': '1'})
+        self.assertEqual(sorted(MonthlySales.objects.values_list('month', flat=True).distinct()), [1])
+        self.assertFalse(MonthlyTotal.objects.filter(month=2).exists())
+        self.assertEqual(ProductTotal.objects.get(product_name='Ноутбук').rows, 1)
+    
+    def test_bulk_delete_filtered_requires_filter(self):
+        """Тест: удаление по фильтру без фильтров не выполняется"""
+        self.client.post(reverse('sales:bulk_delete'), {'scope': 'filtered', 'confirm': '1'})
+        self.assertEqual(MonthlySales.objects.count(), 6)
+    
+    def test_bulk_operations_apply_deltas(self):
+        """Тест: сводные таблицы правятся приращениями, версия справочника - только при исчезновении товара"""
+        from .models import DatasetState
+        
+        def catalog_version():
+            return DatasetState.objects.get(pk=1).catalog_version
+        
+        version = catalog_version()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('sales:bulk_edit'), self.edit_data({self.sales[0].pk: (15, '1500')}))
+        self.assertFalse([query for query in queries.captured_queries if query['sql'].startswith('DELETE')])
+        self.assertEqual(catalog_version(), version)
+        
+        self.client.post(reverse('sales:bulk_delete'), {'ids': [self.sales[0].pk], 'confirm': '1'})
+        self.assertEqual(catalog_version(), version)
+        self.client.post(reverse('sales:bulk_delete'), {'ids': [self.sales[3].pk], 'confirm': '1'})
+        self.assertEqual(catalog_version(), version + 1)
+        self.assertFalse(ProductTotal.objects.filter(product_name='Ноутбук').exists())
+        snapshot = RollupTest.snapshot(self)
+        rollups.rebuild()
+        self.assertEqual(RollupTest.snapshot(self), snapshot)
+    
+    def test_admin_bulk_actions(self):
+        """Тест действия удаления и табличного редактирования в админке"""
+        url = reverse('admin:sales_monthlysales_changelist')
+        self.client.post(url, {
+            'action': 'bulk_delete', '_selected_action': [self.sales[0].pk, self.sales[1].pk],
+        })
+        self.assertEqual(MonthlySales.objects.count(), 4)
+        self.assertEqual(ProductTotal.objects.get(product_name='Ноутбук').rows, 1)
+        
+        remaining = list(MonthlySales.objects.order_by('-year', '-month', '-pk'))
+        data = {'form-TOTAL_FORMS': len(remaining), 'form-INITIAL_FORMS': len(remaining), '_save': 'Сохранить'}
+        for index, sale in enumerate(remaining):
+            data.update({
+                f'form-{index}-id': sale.pk,
+                f'form-{index}-quantity': 20 if index == 0 else sale.quantity,
+                f'form-{index}-revenue': sale.revenue,
+            })
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+        updates = [query for query in queries.captured_queries if query['sql'].startswith('UPDATE "monthly_sales"')]
+        self.assertEqual(len(updates), 1)
+        remaining[0].refresh_from_db()
+        self.assertEqual(remaining[0].quantity, 20)
+        self.assertEqual(
+            ProductTotal.objects.get(product_name=remaining[0].product_name).quantity, 30
+        )
+
+
+@override_settings(INGEST_TOKENS=['erp-secret'])
+class IngestAPITest(TestCase):
+    """Тесты пакетной загрузки записей через API"""
+    
+    def setUp(self):
+        MonthlySales.objects.create(year=2024, month=1, product_name='Ноутбук', quantity=10, revenue=1000)
+    
+    def post(self, payload, token='erp-secret'):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        return self.client.post(
+            reverse('sales:ingest'), json.dumps(payload), content_type='application/json', headers=headers
+        )
+    
+    def test_requires_token(self):
+        """Тест: без верного токена запись не выполняется"""
+        self.assertEqual(self.post([], token=None).status_code, 401)
+        self.assertEqual(self.post([], token='wrong').status_code, 401)
+    
+    def test_outcomes_per_record(self):
+        """Тест исходов: новая запись, исправление, без изменений, ошибка и повтор ключа"""
+        records = [
+            {'year': 2024, 'month': 1, 'product_name': 'Ноутбук', 'quantity': 12, 'revenue': '1200.00'},
+            {'year': 2024, 'month': 2, 'product_name': 'Ноутбук', 'quantity': 5, 'revenue': '500'},
+            {'year': 2024, 'month': 13, 'product_name': 'Ноутбук', 'quantity': 5, 'revenue': '500'},
+            {'year': 2024, 'month': 3, 'product_name': 'Планшет', 'quantity': 1, 'revenue': '10'},
+            {'year': 2024, 'month': 3, 'product_name': 'Планшет', 'quantity': 2, 'revenue': '20'},
+        ]
+        data = json.loads(self.post({'records': records}).content)
+        self.assertEqual(
+            [result['status'] for result in data['results']],
+            ['updated', 'created', 'error', 'superseded', 'created'],
+        )
+        self.assertIn('month', data['results'][2]['errors'])
+        self.assertEqual(MonthlySales.objects.get(year=2024, month=3).quantity, 2)
+        self.assertEqual(MonthlyTotal.objects.get(year=2024, month=1).quantity, 12)
+        self.assertEqual(ProductTotal.objects.get(product_name='Ноутбук').quantity, 17)
+    
+    def test_repeated_batch_is_idempotent(self):
+        """Тест: повтор пакета ничего не меняет и не увеличивает версию данных"""
+        records = [{'year': 2024, 'month': 2, 'product_name': 'Смартфон', 'quantity': 3, 'revenue': '300'}]
+        self.post(records)
+        version = cache.get_version()
+        data = json.loads(self.post(records).content)
+        self.assertEqual(data['summary'], {'unchanged': 1})
+        self.assertEqual(cache.get_version(), version)
+        self.assertEqual(MonthlySales.objects.count(), 2)
+    
+    def test_batch_query_count_is_constant(self):
+        """Тест: число запросов не зависит от размера пакета"""
+        def count_queries(month, size):
+            records = [
+                {'year': 2023, 'month': month, 'product_name': f'Товар {index}', 'quantity': 1, 'revenue': '1'}
+                for index in range(size)
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                self.post(records)
+            return len(queries.captured_queries)
+        # В обоих пакетах есть новые товары - справочник пополняется одинаково
+        small = count_queries(1, 5)
+        self.assertEqual(count_queries(2, 50), small)
+    
+    def test_rejects_invalid_payload(self):
+        """Тест ответа на некорректное тело запроса"""
+        response = self.client.post(
+            reverse('sales:ingest'), 'not json', content_type='application/json',
+            headers={'Authorization': 'Bearer erp-secret'},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.post({'records': 'x'}).status_code, 400)
+
+
+class ChangeFeedTest(TestCase):
+    """Тесты ленты изменений и инкрементального обновления диаграмм"""
+    
+    def setUp(self):
+        self.sale = MonthlySales.objects.create(year=2024, month=1, product_name='Ноутбук', quantity=10, revenue=1000)
+        MonthlySales.objects.create(year=2024, month=1, product_name='Смартфон', quantity=5, revenue=500)
+        response = self.client.get('/api/chart-data/?type=all')
+        self.version = int(response['X-Data-Version'])
+    
+    def get_changes(self, query=''):
+        response = self.client.get(f'/api/chart-data/changes/?since={self.version}{query}')
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+    
+    def test_no_changes(self):
+        """Тест: без изменений ответ пустой и версия та же"""
+        data = self.get_changes()
+        self.assertEqual(data['version'], self.version)
+        self.assertEqual((data['line'], data['products'], data['reset']), ([], [], False))
+    
+    def test_changed_cells(self):
+        """Тест: возвращаются новые итоги только затронутых месяца и товара"""
+        self.sale.revenue = 1500
+        self.sale.quantity = 12
+        self.sale.save()
+        MonthlySales.objects.create(year=2024, month=3, product_name='Планшет', quantity=1, revenue=100)
+        data = self.get_changes()
+        self.assertEqual(data['line'], [
+            {'label': 'Январь 2024', 'value': 2000.0},
+            {'label': 'Март 2024', 'value': 100.0},
+        ])
+        self.assertEqual(data['products'], [
+            {'label': 'Ноутбук', 'quantity': 12, 'revenue': 1500.0},
+            {'label': 'Планшет', 'quantity': 1, 'revenue': 100.0},
+        ])
+        self.assertGreater(data['version'], self.version)
+    
+    def test_filters_and_removed_products(self):
+        """Тест фильтров ленты и удаления последней записи товара"""
+        MonthlySales.objects.create(year=2023, month=5, product_name='Смартфон', quantity=1, revenue=10)
+        self.sale.delete()
+        data = self.get_changes('&year=2024')
+        self.assertEqual(data['line'], [{'label': 'Январь 2024', 'value': 500.0}])
+        self.assertEqual(data['removed'], ['Ноутбук'])
+        
+        data = self.get_changes('&products[]=Смартфон')
+        self.assertEqual([item['label'] for item in data['line']], ['Май 2023'])
+        self.assertEqual(data['products'], [{'label': 'Смартфон', 'quantity': 6, 'revenue': 510.0}])
+    
+    def test_reset(self):
+        """Тест: полный пересчет, ряды по товарам и очистка ленты требуют полной загрузки"""
+        from . import changes
+        MonthlySales.objects.create(year=2024, month=2, product_name='Планшет', quantity=1, revenue=100)
+        self.assertTrue(self.get_changes('&series=product')['reset'])
+        self.assertFalse(self.get_changes()['reset'])
+        
+        rollups.rebuild()
+        self.assertTrue(self.get_changes()['reset'])
+        
+        self.version = changes.current_version()
+        MonthlySales.objects.create(year=2024, month=4, product_name='Планшет', quantity=1, revenue=100)
+        self.assertGreater(changes.prune(keep_versions=0), 0)
+        self.assertTrue(self.get_changes()['reset'])
+    
+    def test_bulk_operations_recorded(self):
+        """Тест: массовое удаление попадает в ленту"""
+        from . import bulk
+        bulk.delete_sales(MonthlySales.objects.filter(product__name='Смартфон'))
+        data = self.get_changes()
+        self.assertEqual(data['line'], [{'label': 'Январь 2024', 'value': 1000.0}])
+        self.assertEqual(data['removed'], ['Смартфон'])
+    
+    def test_invalid_since(self):
+        """Тест: некорректная версия - ошибка 400"""
+        response = self.client.get('/api/chart-data/changes/?since=abc')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_MAX_LAG=5, REPLICA_CHECK_INTERVAL=60)
+class ReplicaRoutingTest(TestCase):
+    """Тесты маршрутизации чтения на реплики"""
+    
+    def setUp(self):
+        from . import routing
+        self.routing = routing
+        self.router = routing.ReplicaRouter()
+        routing.health.reset()
+        self.addCleanup(routing.health.reset)
+    
+    def route(self, request, model=MonthlySales):
+        """База, которую выберет маршрутизатор для чтения model внутри представления только для чтения"""
+        @self.routing.read_from_replica
+        def view(request):
+            return self.router.db_for_read(model), self.router.db_for_read(model)
+        return view(request)
+    
+    def make_request(self, cookies=None):
+        from django.test import RequestFactory
+        request = RequestFactory().get('/api/chart-data/')
+        request.COOKIES.update(cookies or {})
+        return request
+    
+    def test_reads_from_replica(self):
+        """Тест: в представлении только для чтения модели sales читаются с реплики, остальные - из default"""
+        from unittest import mock
+        from django.contrib.auth.models import User
+        with mock.patch.object(self.routing.health, 'lag', return_value=0.5) as lag:
+            self.assertEqual(self.route(self.make_request()), ('replica1', 'replica1'))
+            self.assertEqual(self.route(self.make_request(), User), (None, None))
+            self.route(self.make_request())
+        # Отставание проверяется не чаще раза в REPLICA_CHECK_INTERVAL
+        self.assertEqual(lag.call_count, 1)
+        self.assertIsNone(self.router.db_for_read(MonthlySales))
+    
+    def test_lagging_replica_falls_back(self):
+        """Тест: отстающая или недоступная реплика не используется"""
+        from unittest import mock
+        with mock.patch.object(self.routing.health, 'lag', return_value=30):
+            self.assertEqual(self.route(self.make_request()), ('default', 'default'))
+        self.routing.health.reset()
+        with mock.patch.object(self.routing.health, 'lag', return_value=None):
+            self.assertEqual(self.route(self.make_request()), ('default', 'default'))
+    
+    def test_replica_chosen_once_before_reads(self):
+        """Тест: реплика выбирается до первого чтения, потоки представления читают из одной базы"""
+        from concurrent.futures import ThreadPoolExecutor
+        from contextvars import copy_context
+        from unittest import mock
+        
+        @self.routing.read_from_replica
+        def view(request):
+            self.assertEqual(choose.call_count, 1)
+            with ThreadPoolExecutor(4) as pool:
+                futures = [
+                    pool.submit(copy_context().run, self.router.db_for_read, MonthlySales) for _ in range(4)
+                ]
+                return {future.result() for future in futures}
+        
+        with mock.patch.object(self.routing, 'choose_replica', side_effect=['replica1', 'default']) as choose:
+            self.assertEqual(view(self.make_request()), {'replica1'})
+        self.assertEqual(choose.call_count, 1)
+    
+    def test_read_your_writes(self):
+        """Тест: после записи браузер некоторое время читает из default"""
+        import time
+        from unittest import mock
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_user('manager', password='secret-pass-123'))
+        response = self.client.post(reverse('sales:add'), {
+            'year': 2024, 'month': 1, 'product_name': 'Ноутбук', 'quantity': 1, 'revenue': '10',
+        })
+        cookie = response.cookies[self.routing.PIN_COOKIE]
+        self.assertGreater(float(cookie.value), time.time())
+        
+        with mock.patch.object(self.routing.health, 'lag', return_value=0):
+            pinned = self.make_request({self.routing.PIN_COOKIE: cookie.value})
+            self.assertEqual(self.route(pinned), (None, None))
+            expired = self.make_request({self.routing.PIN_COOKIE: str(time.time() - 1)})
+            self.assertEqual(self.route(expired), ('replica1', 'replica1'))
+    
+    def test_views_work_with_replica_routing(self):
+        """Тест: API диаграмм и таблица отвечают, если реплика совпадает с основной базой"""
+        from unittest import mock
+        MonthlySales.objects.create(year=2024, month=1, product_name='Ноутбук', quantity=1, revenue=10)
+        with mock.patch.object(self.routing, 'choose_replica', return_value='default'):
+            self.assertEqual(self.client.get('/api/chart-data/?type=all').status_code, 200)
+            self.assertEqual(self.client.get(reverse('sales:table')).status_code, 200)
@@ -1,16 +1,30 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 app_name = 'sales'
 
 urlpatterns = [
     path('', views.index, name='index'),
     path('api/chart-data/', views.get_chart_data, name='chart_data'),
+    path('api/chart-data/changes/', views.chart_changes, name='chart_changes'),
+    path('api/products/', views.product_search, name='product_search'),
     path('table/', views.sales_table, name='table'),
+    path('table/rows/', views.sales_table_rows, name='table_rows'),
+    path('api/async/chart-data/', async_views.get_chart_data, name='chart_data_async'),
+    path('async/table/', async_views.sales_table, name='table_async'),
+    path('api/analytics/quarterly/', views.analytics_quarterly, name='analytics_quarterly'),
+    path('api/analytics/top-months/', views.analytics_top_months, name='analytics_top_months'),
+    path('api/analytics/products/', views.analytics_products, name='analytics_products'),
+    path('api/sales/batch/', views.ingest_sales, name='ingest'),
+    path('export/', views.export_sales, name='export'),
     path('manage/', views.manage_sales, name='manage'),
+    path('manage/bulk-edit/', views.bulk_edit_sales, name='bulk_edit'),
+    path('manage/bulk-delete/', views.bulk_delete_sales, name='bulk_delete'),
     path('add/', views.add_sale, name='add'),
     path('edit/<int:pk>/', views.edit_sale, name='edit'),
     path('delete/<int:pk>/', views.delete_sale, name='delete'),
+    path('import/', views.import_sales, name='import'),
+    path('metrics/', views.metrics_view, name='metrics'),
     path('login/', views.user_login, name='login'),
     path('logout/', views.user_logout, name='logout'),
 ]
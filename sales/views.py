@@ -1,259 +1,381 @@
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse
-from django.db.models import Sum, Count
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
-from .models import MonthlySales
-from .forms import MonthlySalesForm
+from django.urls import reverse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import url_has_allowed_host_and_scheme, urlencode
+from django.views.decorators.cache import cache_control
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_POST
+from .models import DatasetState, MonthRevenue, MonthlySales, ProductAverage, QuarterlyRevenue
+from .forms import BulkEditFormSet, MonthlySalesForm
+from .filters import filter_sales, get_filters
+from .importer import SalesImporter, detect_format, iter_records, validate_record
+from .pagination import KeysetPaginator
+from . import bulk, cache, catalog, changes, charts, export, formats, http, metrics, routing
+import io
+import json
 
 
+# Список месяцев для фильтра
+MONTHS = MonthlySales.MONTHS
+
+# Порядок записей в таблицах; уникален благодаря id, что нужно для keyset-пагинации.
+# Совпадает с индексом monthly_sales_order_idx: страница читается из индекса без сортировки
+SALES_ORDERING = ('-year', '-month', 'product_id', 'id')
+
+
+def _get_keyset_page(request, paginator):
+    """Страница по параметрам after / before / last из запроса"""
+    return paginator.get_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        last=bool(request.GET.get('last')),
+    )
+
+
+def _filter_query(year, month, products):
+    """Строка параметров фильтра для ссылок пагинации"""
+    params = []
+    if year:
+        params.append(('year', year))
+    if month:
+        params.append(('month', month))
+    params.extend(('products', product) for product in products)
+    return urlencode(params)
+
+
+def _page_links(filter_query, page):
+    """Ссылки пагинации с параметрами фильтра - собираются один раз в представлении, а не в шаблоне"""
+    prefix = f'?{filter_query}&' if filter_query else '?'
+    links = {}
+    if page.has_previous():
+        links['first'] = f'?{filter_query}'
+        cursor = page.previous_cursor
+        # Пустая страница после курсора за концом данных: назад - к последней странице
+        links['previous'] = prefix + (urlencode({'before': cursor}) if cursor is not None else 'last=1')
+    if page.has_next():
+        links['next'] = prefix + urlencode({'after': page.next_cursor})
+        links['last'] = f'{prefix}last=1'
+    return links
+
+
+@routing.read_from_replica
 def index(request):
     """Главная страница с диаграммами"""
-    years = MonthlySales.objects.values_list('year', flat=True).distinct().order_by('-year')
-    products = MonthlySales.objects.values_list('product_name', flat=True).distinct().order_by('product_name')
-    
     context = {
-        'years': years,
-        'products': products,
+        'years': catalog.get_years(request),
+        'top_n': charts.DEFAULT_TOP_N,
     }
-    return render(request, 'sales/index.html', context)
+    with metrics.stage(request, 'template'):
+        return render(request, 'sales/index.html', context)
 
 
-def get_chart_data(request):
-    """API для получения данных для диаграмм"""
+def _chart_params(request):
+    """
+    Параметры API диаграмм: (тип, год, товары, режим рядов, top_n).
+    Возвращает текст ошибки вместо параметров, если они некорректны.
+    """
     chart_type = request.GET.get('type', 'line')
-    year = request.GET.get('year')
-    products = request.GET.getlist('products[]')  # Множественный выбор товаров
+    year, _, products = get_filters(request, 'products[]')  # Множественный выбор товаров
+    series = request.GET.get('series', 'total')
+    top_n = request.GET.get('top_n')
     
-    # Фильтрация данных
-    queryset = MonthlySales.objects.all()
-    if year:
-        queryset = queryset.filter(year=int(year))
-    if products:
-        queryset = queryset.filter(product_name__in=products)
+    if chart_type not in charts.CHART_TYPES:
+        return 'Invalid chart type'
+    if series not in charts.SERIES_MODES:
+        return 'Invalid series'
+    if top_n:
+        try:
+            top_n = int(top_n)
+        except ValueError:
+            return 'Invalid top_n'
+        if not 1 <= top_n <= charts.MAX_TOP_N:
+            return f'top_n must be between 1 and {charts.MAX_TOP_N}'
+    else:
+        top_n = None
     
-    if chart_type == 'line':
-        # Линейный график - выручка по месяцам
-        # Словарь для названий месяцев
-        month_names = {
-            1: 'Январь', 2: 'Февраль', 3: 'Март', 4: 'Апрель',
-            5: 'Май', 6: 'Июнь', 7: 'Июль', 8: 'Август',
-            9: 'Сентябрь', 10: 'Октябрь', 11: 'Ноябрь', 12: 'Декабрь'
-        }
-        
-        # Получаем данные из БД
-        data = queryset.values('month', 'year').annotate(
-            total_revenue=Sum('revenue')
-        ).order_by('year', 'month')
-        
-        if year:
-            # Если выбран конкретный год - показываем все 12 месяцев этого года
-            # Создаём словарь для быстрого поиска
-            data_dict = {item['month']: float(item['total_revenue']) for item in data}
-            
-            labels = []
-            values = []
-            for m in range(1, 13):
-                labels.append(f"{month_names[m]} {year}")
-                # Если данных нет - ставим 0
-                values.append(data_dict.get(m, 0))
-        else:
-            # Если год не выбран - показываем от первого до последнего месяца с данными
-            if data:
-                # Создаём словарь для быстрого поиска
-                data_dict = {(item['year'], item['month']): float(item['total_revenue']) for item in data}
-                
-                # Находим первый и последний месяц с данными
-                first_item = data[0]
-                last_item = data[len(data) - 1]
-                
-                start_year = first_item['year']
-                start_month = first_item['month']
-                end_year = last_item['year']
-                end_month = last_item['month']
-                
-                # Формируем все месяцы от первого до последнего
-                labels = []
-                values = []
-                
-                current_year = start_year
-                current_month = start_month
-                
-                while (current_year < end_year) or (current_year == end_year and current_month <= end_month):
-                    labels.append(f"{month_names[current_month]} {current_year}")
-                    values.append(data_dict.get((current_year, current_month), 0))
-                    
-                    # Переход к следующему месяцу
-                    current_month += 1
-                    if current_month > 12:
-                        current_month = 1
-                        current_year += 1
-            else:
-                labels = []
-                values = []
-        
-        return JsonResponse({
-            'labels': labels,
-            'datasets': [{
-                'label': 'Выручка (руб.)',
-                'data': values,
-                'borderColor': 'rgb(75, 192, 192)',
-                'backgroundColor': 'rgba(75, 192, 192, 0.2)',
-                'tension': 0.1
-            }]
-        })
+    year, products = cache.normalize_filters(year, products)
+    return chart_type, year, products, series, top_n
+
+
+@routing.read_from_replica
+@http.compress_response
+@cache_control(no_cache=True)
+@condition(etag_func=http.chart_etag)
+def get_chart_data(request):
+    """API для получения данных для диаграмм (format=json, columnar или binary)"""
+    params = _chart_params(request)
+    if isinstance(params, str):
+        return JsonResponse({'error': params}, status=400)
+    fmt = formats.negotiate(request)
+    if fmt is None:
+        return JsonResponse({'error': 'Invalid format'}, status=400)
     
-    elif chart_type == 'bar':
-        # Гистограмма - количество продаж по товарам
-        data = queryset.values('product_name').annotate(
-            total_quantity=Sum('quantity')
-        ).order_by('-total_quantity')
-        
-        labels = [item['product_name'] for item in data]
-        values = [item['total_quantity'] for item in data]
-        
-        return JsonResponse({
-            'labels': labels,
-            'datasets': [{
-                'label': 'Количество проданных единиц',
-                'data': values,
-                'backgroundColor': [
-                    'rgba(255, 99, 132, 0.7)',
-                    'rgba(54, 162, 235, 0.7)',
-                    'rgba(255, 206, 86, 0.7)',
-                    'rgba(75, 192, 192, 0.7)',
-                    'rgba(153, 102, 255, 0.7)',
-                ],
-                'borderColor': [
-                    'rgba(255, 99, 132, 1)',
-                    'rgba(54, 162, 235, 1)',
-                    'rgba(255, 206, 86, 1)',
-                    'rgba(75, 192, 192, 1)',
-                    'rgba(153, 102, 255, 1)',
-                ],
-                'borderWidth': 1
-            }]
-        })
+    # Ответ кэшируется по нормализованным параметрам, формату и версии данных;
+    # без фильтра по товарам данные берутся из сводных таблиц
+    def compute():
+        data = charts.get_chart(*params)
+        with metrics.stage(request, 'serialize'):
+            return formats.encode(data, params[0], fmt)
     
-    elif chart_type == 'pie':
-        # Круговая диаграмма - доля выручки по товарам
-        data = queryset.values('product_name').annotate(
-            total_revenue=Sum('revenue')
-        ).order_by('-total_revenue')
-        
-        labels = [item['product_name'] for item in data]
-        values = [float(item['total_revenue']) for item in data]
-        
-        return JsonResponse({
-            'labels': labels,
-            'datasets': [{
-                'label': 'Выручка (руб.)',
-                'data': values,
-                'backgroundColor': [
-                    'rgba(255, 99, 132, 0.8)',
-                    'rgba(54, 162, 235, 0.8)',
-                    'rgba(255, 206, 86, 0.8)',
-                    'rgba(75, 192, 192, 0.8)',
-                    'rgba(153, 102, 255, 0.8)',
-                    'rgba(255, 159, 64, 0.8)',
-                ],
-                'borderWidth': 2
-            }]
-        })
+    content = cache.get_or_compute('chart', params + (fmt,), compute, version=cache.request_version(request))
+    response = HttpResponse(content, content_type=formats.MEDIA_TYPES[fmt])
+    http.set_data_version(request, response)
+    patch_vary_headers(response, ('Accept',))
+    return response
+
+
+@routing.read_from_replica
+@cache_control(no_store=True)
+def chart_changes(request):
+    """
+    Изменения диаграмм после версии since (параметры фильтра - как у API диаграмм):
+    новые значения затронутых месяцев и товаров или reset, если диаграммы нужно загрузить заново
+    """
+    params = _chart_params(request)
+    if isinstance(params, str):
+        return JsonResponse({'error': params}, status=400)
+    try:
+        since = int(request.GET.get('since', ''))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid since'}, status=400)
     
-    return JsonResponse({'error': 'Invalid chart type'}, status=400)
+    _, year, products, series, top_n = params
+    # Ряды по товарам и "Другие" зависят от порядка товаров - точечно их не обновить
+    data = changes.delta(since, year, products, reset_on_change=series != 'total' or top_n is not None)
+    return JsonResponse(data)
+
+
+@routing.read_from_replica
+@cache_control(no_cache=True)
+def product_search(request):
+    """
+    Автодополнение товаров для фильтров: q - часть названия (допускаются опечатки),
+    limit - от 1 до 100 (по умолчанию 20), offset - смещение для "Показать еще"
+    """
+    limit = request.GET.get('limit', '20')
+    offset = request.GET.get('offset', '0')
+    if not limit.isdigit() or not 1 <= int(limit) <= 100:
+        return JsonResponse({'error': 'limit must be between 1 and 100'}, status=400)
+    if not offset.isdigit():
+        return JsonResponse({'error': 'Invalid offset'}, status=400)
+    data = catalog.search_products(request, request.GET.get('q', ''), int(limit), int(offset))
+    return JsonResponse(data)
 
 
+def _table_rows_context(request):
+    """Записи таблицы (страница по фильтрам запроса) и ссылки пагинации"""
+    year, month, products = get_filters(request)  # Множественный выбор товаров
+    queryset = filter_sales(year=year, month=month, products=products).select_related('product')
+    
+    # Keyset-пагинация: без COUNT(*) и OFFSET, число записей - оценка планировщика
+    paginator = KeysetPaginator(queryset, SALES_ORDERING, 20, with_total=True)  # 20 записей на страницу
+    sales_data = _get_keyset_page(request, paginator)
+    filter_query = _filter_query(year, month, products)
+    return {
+        'sales_data': sales_data,
+        'selected_year': year,
+        'selected_month': month,
+        'selected_products': products,
+        'filter_query': filter_query,
+        'page_links': _page_links(filter_query, sales_data),
+    }
+
+
+@routing.read_from_replica
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=http.page_etag)
 def sales_table(request):
     """Страница с таблицей данных"""
-    year = request.GET.get('year')
-    month = request.GET.get('month')
-    products = request.GET.getlist('products')  # Множественный выбор товаров
+    context = _table_rows_context(request)
+    context.update({
+        'years': catalog.get_years(request),
+        'catalog_version': cache.request_catalog_version(request),
+        'months': MONTHS,
+    })
+    with metrics.stage(request, 'template'):
+        return render(request, 'sales/table.html', context)
+
+
+@routing.read_from_replica
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=http.page_etag)
+def sales_table_rows(request):
+    """Только записи таблицы и пагинация: страница заменяет их без полной перерисовки"""
+    context = _table_rows_context(request)
+    with metrics.stage(request, 'template'):
+        return render(request, 'sales/table_rows.html', context)
+
+
+def export_sales(request):
+    """Потоковая выгрузка отфильтрованных данных в CSV или NDJSON"""
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in export.EXPORT_FORMATS:
+        return JsonResponse({'error': 'Invalid export format'}, status=400)
+    
+    year, month, products = get_filters(request)
+    queryset = filter_sales(year=year, month=month, products=products)
     
-    queryset = MonthlySales.objects.all()
+    compress = request.GET.get('gzip') == '1'
+    content_type, extension = export.EXPORT_FORMATS[fmt]
+    response = StreamingHttpResponse(
+        export.stream_sales(queryset.order_by(*SALES_ORDERING), fmt, compress),
+        content_type=content_type,
+    )
+    response['Content-Disposition'] = f'attachment; filename="sales.{extension}"'
+    if compress:
+        response['Content-Encoding'] = 'gzip'
+    return response
+
+
+def _analytics_response(queryset, fields):
+    """Строки аналитического представления и время его последнего обновления"""
+    refreshed_at = DatasetState.objects.filter(pk=1).values_list('analytics_refreshed_at', flat=True).first()
+    return JsonResponse({
+        'refreshed_at': refreshed_at,
+        'results': list(queryset.values(*fields)),
+    })
+
+
+@routing.read_from_replica
+@cache_control(max_age=60)
+def analytics_quarterly(request):
+    """Выручка по кварталам (необязательный фильтр year)"""
+    queryset = QuarterlyRevenue.objects.order_by('year', 'quarter')
+    year = request.GET.get('year')
     if year:
+        if not year.isdigit():
+            return JsonResponse({'error': 'Invalid year'}, status=400)
         queryset = queryset.filter(year=int(year))
-    if month:
-        queryset = queryset.filter(month=int(month))
-    if products:
-        queryset = queryset.filter(product_name__in=products)
-    
-    # Добавляем пагинацию
-    sales_list = queryset.order_by('-year', '-month')
-    paginator = Paginator(sales_list, 20)  # 20 записей на страницу
+    return _analytics_response(queryset, ('year', 'quarter', 'quantity', 'revenue'))
+
+
+@routing.read_from_replica
+@cache_control(max_age=60)
+def analytics_top_months(request):
+    """Месяцы с наибольшей выручкой (limit - от 1 до 100, по умолчанию 3)"""
+    limit = request.GET.get('limit', '3')
+    if not limit.isdigit() or not 1 <= int(limit) <= 100:
+        return JsonResponse({'error': 'limit must be between 1 and 100'}, status=400)
+    queryset = MonthRevenue.objects.order_by('revenue_rank', 'year', 'month')[:int(limit)]
+    return _analytics_response(queryset, ('year', 'month', 'quantity', 'revenue', 'revenue_rank'))
+
+
+@routing.read_from_replica
+@cache_control(max_age=60)
+def analytics_products(request):
+    """Средние продажи товаров за месяц"""
+    queryset = ProductAverage.objects.order_by('-avg_revenue', 'product_name')
+    return _analytics_response(
+        queryset, ('product_name', 'months', 'quantity', 'revenue', 'avg_quantity', 'avg_revenue')
+    )
+
+
+@login_required
+def manage_sales(request):
+    """Страница управления данными о продажах"""
+    # Получаем параметры фильтрации и фильтруем данные
+    year, month, products = get_filters(request)
+    queryset = filter_sales(year=year, month=month, products=products).select_related('product')
     
-    page_number = request.GET.get('page')
-    sales_data = paginator.get_page(page_number)
+    # Получаем отфильтрованные записи с keyset-пагинацией
+    paginator = KeysetPaginator(queryset, SALES_ORDERING, 10, with_total=True)  # 10 записей на страницу
+    sales_data = _get_keyset_page(request, paginator)
     
-    years = MonthlySales.objects.values_list('year', flat=True).distinct().order_by('-year')
-    all_products = MonthlySales.objects.values_list('product_name', flat=True).distinct().order_by('product_name')
+    filter_query = _filter_query(year, month, products)
     
-    # Список месяцев для фильтра
-    months = [
-        (1, 'Январь'), (2, 'Февраль'), (3, 'Март'), (4, 'Апрель'),
-        (5, 'Май'), (6, 'Июнь'), (7, 'Июль'), (8, 'Август'),
-        (9, 'Сентябрь'), (10, 'Октябрь'), (11, 'Ноябрь'), (12, 'Декабрь')
-    ]
+    # Форма табличного редактирования строк текущей страницы
+    formset = BulkEditFormSet(initial=[
+        {'id': sale.pk, 'quantity': sale.quantity, 'revenue': sale.revenue} for sale in sales_data
+    ])
     
     context = {
         'sales_data': sales_data,
-        'years': years,
-        'products': all_products,
-        'months': months,
+        'formset': formset,
+        'rows': zip(sales_data, formset),
+        'years': catalog.get_years(request),  # Товары фильтра загружаются через /api/products/
+        'catalog_version': cache.request_catalog_version(request),
+        'months': MONTHS,
         'selected_year': year,
         'selected_month': month,
         'selected_products': products,
+        'filter_query': filter_query,
+        'page_links': _page_links(filter_query, sales_data),
     }
-    return render(request, 'sales/table.html', context)
+    with metrics.stage(request, 'template'):
+        return render(request, 'sales/manage.html', context)
+
+
+def _next_url(request):
+    """Адрес страницы управления с теми же фильтрами и страницей (параметр next)"""
+    next_url = request.POST.get('next')
+    if next_url and url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        return next_url
+    return reverse('sales:manage')
+
+
+def _redirect_back(request):
+    return redirect(_next_url(request))
 
 
 @login_required
-def manage_sales(request):
-    """Страница управления данными о продажах"""
-    # Получаем параметры фильтрации
-    year = request.GET.get('year')
-    month = request.GET.get('month')
-    products = request.GET.getlist('products')
-    
-    # Фильтруем данные
-    queryset = MonthlySales.objects.all()
-    if year:
-        queryset = queryset.filter(year=int(year))
-    if month:
-        queryset = queryset.filter(month=int(month))
-    if products:
-        queryset = queryset.filter(product_name__in=products)
-    
-    # Получаем отфильтрованные записи с пагинацией
-    sales_list = queryset.order_by('-year', '-month', 'product_name')
-    paginator = Paginator(sales_list, 10)  # 10 записей на страницу
-    
-    page_number = request.GET.get('page')
-    sales_data = paginator.get_page(page_number)
-    
-    # Данные для фильтров
-    years = MonthlySales.objects.values_list('year', flat=True).distinct().order_by('-year')
-    all_products = MonthlySales.objects.values_list('product_name', flat=True).distinct().order_by('product_name')
+@require_POST
+def bulk_edit_sales(request):
+    """Сохранение табличного редактирования страницы записей одним запросом UPDATE"""
+    formset = BulkEditFormSet(request.POST)
+    if formset.is_valid():
+        updated = bulk.update_sales({
+            form.cleaned_data['id']: {field: form.cleaned_data[field] for field in bulk.EDITABLE_FIELDS}
+            for form in formset
+        })
+        messages.success(request, f'Обновлено записей: {updated}.')
+    else:
+        messages.error(request, 'Ошибка при сохранении изменений. Проверьте количество и выручку.')
+    return _redirect_back(request)
+
+
+@login_required
+@require_POST
+def bulk_delete_sales(request):
+    """
+    Удаление выбранных записей (ids) или всех записей по фильтру (scope=filtered,
+    фильтры в параметрах URL) одним запросом DELETE после подтверждения
+    """
+    year, month, products = get_filters(request)
+    queryset = filter_sales(year=year, month=month, products=products)
+    filtered = request.POST.get('scope') == 'filtered'
+    ids = [pk for pk in request.POST.getlist('ids') if pk.isdigit()]
+    if filtered:
+        if not (year or month or products):
+            messages.error(request, 'Для удаления по фильтру выберите год, месяц или товары.')
+            return _redirect_back(request)
+    elif ids:
+        queryset = queryset.filter(pk__in=ids)
+    else:
+        messages.error(request, 'Выберите записи для удаления.')
+        return _redirect_back(request)
     
-    # Список месяцев для фильтра
-    months = [
-        (1, 'Январь'), (2, 'Февраль'), (3, 'Март'), (4, 'Апрель'),
-        (5, 'Май'), (6, 'Июнь'), (7, 'Июль'), (8, 'Август'),
-        (9, 'Сентябрь'), (10, 'Октябрь'), (11, 'Ноябрь'), (12, 'Декабрь')
-    ]
+    if request.POST.get('confirm'):
+        deleted = bulk.delete_sales(queryset)
+        messages.success(request, f'Удалено записей: {deleted}.')
+        return _redirect_back(request)
     
     context = {
-        'sales_data': sales_data,
-        'years': years,
-        'products': all_products,
-        'months': months,
+        'count': queryset.count(),
+        'filtered': filtered,
+        'ids': ids,
         'selected_year': year,
         'selected_month': month,
+        'month_name': dict(MONTHS).get(int(month)) if month else None,
         'selected_products': products,
+        'filter_query': _filter_query(year, month, products),
+        'next': _next_url(request),
     }
-    return render(request, 'sales/manage.html', context)
+    return render(request, 'sales/confirm_bulk_delete.html', context)
 
 
 @login_required
@@ -319,6 +441,86 @@ def delete_sale(request, pk):
     return render(request, 'sales/confirm_delete.html', context)
 
 
+@login_required
+def import_sales(request):
+    """Загрузка данных из файла CSV / JSONL"""
+    result = None
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if upload is None:
+            messages.error(request, 'Выберите файл для загрузки.')
+        else:
+            # Файл читается потоково, порциями - большие файлы не загружаются в память целиком
+            stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+            result = SalesImporter().run(iter_records(stream, detect_format(upload.name)))
+            if request.headers.get('Accept') == 'application/json':
+                return JsonResponse(result.as_dict())
+            if result.error_count:
+                messages.warning(request, f'Загружено записей: {result.imported}, строк с ошибками: {result.error_count}.')
+            else:
+                messages.success(request, f'Загружено записей: {result.imported}.')
+    
+    return render(request, 'sales/import.html', {'result': result})
+
+
+@csrf_exempt
+@require_POST
+def ingest_sales(request):
+    """
+    Пакетная загрузка записей из внешних систем (JSON-массив записей или {"records": [...]}).
+    Записи применяются upsert'ом по (год, месяц, товар) одним запросом на пакет;
+    в ответе - исход каждой записи: created / updated / unchanged / error. Повтор того же
+    пакета ничего не меняет и возвращает unchanged.
+    """
+    if not http.bearer_token_valid(request, settings.INGEST_TOKENS):
+        return JsonResponse({'error': 'Invalid token'}, status=401)
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    records = payload.get('records') if isinstance(payload, dict) else payload
+    if not isinstance(records, list):
+        return JsonResponse({'error': 'Expected an array of records'}, status=400)
+    if len(records) > settings.INGEST_MAX_RECORDS:
+        return JsonResponse(
+            {'error': f'Too many records (max {settings.INGEST_MAX_RECORDS})'}, status=413
+        )
+    
+    results = []
+    rows = {}
+    for index, record in enumerate(records):
+        row, errors = validate_record(record) if isinstance(record, dict) else (
+            None, {'__all__': ['Ожидался JSON-объект']}
+        )
+        if errors:
+            results.append({'index': index, 'status': 'error', 'errors': errors})
+            continue
+        previous = rows.get(row[:3])
+        if previous is not None:
+            # Повтор ключа в пакете: применяется последняя запись
+            results[previous[0]]['status'] = 'superseded'
+        results.append({'index': index, 'status': None})
+        rows[row[:3]] = (len(results) - 1, row)
+    
+    if rows:
+        outcomes = SalesImporter().load([row for _, row in rows.values()])
+        for key, (position, _) in rows.items():
+            results[position]['status'] = outcomes[key]
+    
+    summary = {}
+    for result in results:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+    return JsonResponse({'summary': summary, 'results': results})
+
+
+def metrics_view(request):
+    """Гистограммы метрик по представлениям в формате Prometheus"""
+    authorized = request.user.is_staff or http.bearer_token_valid(request, [settings.METRICS_TOKEN])
+    if not authorized:
+        return HttpResponse(status=403)
+    return HttpResponse(metrics.registry.render_prometheus(), content_type='text/plain; version=0.0.4')
+
+
 def user_login(request):
     """Страница входа в систему"""
     if request.user.is_authenticated:
@@ -34,10 +34,10 @@ COMMENT ON COLUMN monthly_sales.product_name IS 'Название товара';
 COMMENT ON COLUMN monthly_sales.quantity IS 'Количество проданных единиц';
 COMMENT ON COLUMN monthly_sales.revenue IS 'Выручка в рублях';
 
--- Создание индексов для оптимизации запросов
-CREATE INDEX idx_monthly_sales_year ON monthly_sales(year);
-CREATE INDEX idx_monthly_sales_product ON monthly_sales(product_name);
-CREATE INDEX idx_monthly_sales_year_month ON monthly_sales(year, month);
+-- Создание индексов для оптимизации запросов (те же, что создают миграции Django)
+-- Фильтр по году/месяцу использует уникальный индекс (year, month, product_name)
+CREATE INDEX monthly_sales_order_idx ON monthly_sales(year DESC, month DESC, product_name, id);
+CREATE INDEX monthly_sales_product_idx ON monthly_sales(product_name, year, month) INCLUDE (revenue, quantity);
 
 -- Вставка тестовых данных
 INSERT INTO monthly_sales (year, month, product_name, quantity, revenue) VALUES
@@ -70,3 +70,10 @@ SELECT
 FROM monthly_sales
 GROUP BY year, quarter
 ORDER BY year, quarter;
+
+-- 9. Готовая аналитика из материализованных представлений
+-- (создаются миграциями, обновляются командой manage.py refresh_analytics;
+-- те же данные отдают /api/analytics/quarterly/, /top-months/ и /products/)
+SELECT year, quarter, revenue FROM sales_quarterly_revenue ORDER BY year, quarter;
+SELECT year, month, revenue FROM sales_month_revenue WHERE revenue_rank <= 3 ORDER BY revenue_rank;
+SELECT product_name, avg_revenue, avg_quantity FROM sales_product_averages ORDER BY avg_revenue DESC;
@@ -0,0 +1,127 @@
+/*
+ * Декодирование компактного бинарного формата API диаграмм (format=binary),
+ * построение данных Chart.js на клиенте и точечное обновление диаграмм по
+ * ленте изменений. Цвета совпадают с палитрой сервера.
+ */
+(function (window) {
+    'use strict';
+
+    const BASE_COLORS = [
+        [255, 99, 132], [54, 162, 235], [255, 206, 86],
+        [75, 192, 192], [153, 102, 255], [255, 159, 64],
+    ];
+    const OTHER_COLOR = [201, 203, 207];
+
+    function seriesColor(index, isOther, alpha) {
+        if (isOther) return `rgba(${OTHER_COLOR.join(', ')}, ${alpha})`;
+        if (index < BASE_COLORS.length) return `rgba(${BASE_COLORS[index].join(', ')}, ${alpha})`;
+        // Оттенки с шагом золотого угла, как в sales/charts.py
+        const hue = (index * 0.381966) % 1 * 360;
+        return `hsla(${hue.toFixed(1)}, 65%, 55%, ${alpha})`;
+    }
+
+    // other - номер ряда "Другие" (серый) или null; по названию ряд не определяется
+    function palette(names, alpha, other) {
+        return names.map((name, index) => seriesColor(index, index === other, alpha));
+    }
+
+    // Заголовок: 'SCHB', uint32 LE длина JSON, JSON, выравнивание до 8 байт, затем float64 LE
+    function decodeChartBinary(buffer) {
+        const view = new DataView(buffer);
+        const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+        if (magic !== 'SCHB') throw new Error('Неизвестный формат данных диаграмм');
+        const headerLength = view.getUint32(4, true);
+        const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 8, headerLength)));
+        const dataOffset = Math.ceil((8 + headerLength) / 8) * 8;
+        const values = new Float64Array(buffer, dataOffset);
+
+        const charts = {};
+        for (const [kind, chart] of Object.entries(header.charts)) {
+            charts[kind] = {
+                labels: chart.labels,
+                series: chart.series,
+                scale: chart.scale,
+                other: chart.other,
+                values: chart.series.map((_, i) => {
+                    const start = chart.offset + i * chart.length;
+                    return values.subarray(start, start + chart.length);
+                }),
+            };
+        }
+        return charts;
+    }
+
+    function toChartData(kind, chart) {
+        const data = series => Array.from(series, value => value / chart.scale);
+        if (kind === 'line') {
+            const single = chart.series.length === 1;
+            const borders = palette(chart.series, 1, chart.other);
+            const backgrounds = palette(chart.series, 0.2, chart.other);
+            return {
+                labels: chart.labels,
+                other: chart.other,
+                datasets: chart.series.map((name, i) => ({
+                    label: name,
+                    data: data(chart.values[i]),
+                    borderColor: single ? 'rgb(75, 192, 192)' : borders[i],
+                    backgroundColor: single ? 'rgba(75, 192, 192, 0.2)' : backgrounds[i],
+                    tension: 0.1,
+                })),
+            };
+        }
+        const style = kind === 'bar'
+            ? {
+                backgroundColor: palette(chart.labels, 0.7, chart.other),
+                borderColor: palette(chart.labels, 1, chart.other),
+                borderWidth: 1,
+            }
+            : {backgroundColor: palette(chart.labels, 0.8, chart.other), borderWidth: 2};
+        return {
+            labels: chart.labels,
+            other: chart.other,
+            datasets: [Object.assign({label: chart.series[0], data: data(chart.values[0])}, style)],
+        };
+    }
+
+    // Новые значения месяцев линейного графика; false - месяца нет на оси (нужна полная загрузка)
+    function applyLinePatch(chart, items) {
+        const dataset = chart.data.datasets[0];
+        for (const item of items) {
+            const index = chart.data.labels.indexOf(item.label);
+            if (index === -1) return false;
+            dataset.data[index] = item.value;
+        }
+        chart.update();
+        return true;
+    }
+
+    // Итоги товаров подставляются в диаграмму, порядок и цвета пересчитываются как на сервере
+    function patchProductChart(chart, kind, values, removed) {
+        const dataset = chart.data.datasets[0];
+        const other = chart.data.other ?? null;
+        // Ряд "Другие" хранится отдельно от товаров: у товара может быть такое же название
+        const otherValue = other === null ? null : dataset.data[other];
+        const totals = new Map();
+        chart.data.labels.forEach((label, i) => { if (i !== other) totals.set(label, dataset.data[i]); });
+        removed.forEach(label => totals.delete(label));
+        values.forEach(([label, value]) => totals.set(label, value));
+        const rows = [...totals].sort((a, b) => b[1] - a[1] || (a[0] < b[0] ? -1 : a[0] > b[0] ? 1 : 0));
+        if (other !== null) rows.push([chart.data.labels[other], otherValue]);
+        chart.data = toChartData(kind, {
+            labels: rows.map(row => row[0]),
+            series: [dataset.label],
+            values: [rows.map(row => row[1])],
+            scale: 1,
+            other: other === null ? null : rows.length - 1,
+        });
+        chart.update();
+    }
+
+    // Изменения из /api/chart-data/changes/: количество - в гистограмму, выручка - в круговую диаграмму
+    function applyProductPatch(barChart, pieChart, products, removed) {
+        patchProductChart(barChart, 'bar', products.map(item => [item.label, item.quantity]), removed);
+        patchProductChart(pieChart, 'pie', products.map(item => [item.label, item.revenue]), removed);
+    }
+
+    window.SalesCharts = {decodeChartBinary, toChartData, applyLinePatch, applyProductPatch};
+})(window);
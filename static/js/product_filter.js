@@ -0,0 +1,85 @@
+/*
+ * Фильтр товаров с поиском. Список товаров не встраивается в страницу, а
+ * загружается порциями из /api/products/ при открытии списка, вводе текста
+ * и нажатии "Показать еще". Выбранные товары остаются вверху списка и
+ * отправляются с формой как обычные флажки.
+ */
+(function (window, $) {
+    'use strict';
+
+    const PAGE_SIZE = 30;
+    const SEARCH_DELAY = 250;
+
+    let lastId = 0;
+
+    function checkbox(name, inputName, checked) {
+        const id = `productOption${++lastId}`;
+        const input = $('<input class="form-check-input product-checkbox" type="checkbox">')
+            .attr({id: id, value: name})
+            .prop('checked', checked);
+        if (inputName) input.attr('name', inputName);
+        const label = $('<label class="form-check-label">').attr('for', id).text(name);
+        return $('<div class="form-check">').append(input, label);
+    }
+
+    function init(menu) {
+        menu = $(menu);
+        const inputName = menu.data('input-name') || null;
+        const selectedList = menu.find('.product-selected');
+        const results = menu.find('.product-results');
+        const more = menu.find('.product-more');
+        const status = menu.find('.product-status');
+        let query = '';
+        let offset = 0;
+        let loaded = false;
+        let request = 0;
+        let timer = null;
+
+        function selectedValues() {
+            return selectedList.find('.product-checkbox:checked').map((_, input) => input.value).get();
+        }
+
+        function load(reset) {
+            if (reset) {
+                offset = 0;
+                // Снятые флажки убираются из выбранных при новом поиске
+                selectedList.find('.product-checkbox:not(:checked)').closest('.form-check').remove();
+            }
+            const current = ++request;
+            const params = new URLSearchParams({q: query, limit: PAGE_SIZE, offset: offset});
+            status.text('Загрузка...');
+            fetch(`/api/products/?${params.toString()}`)
+                .then(response => response.json())
+                .then(data => {
+                    if (current !== request) return;  // Пришел ответ на устаревший запрос
+                    const selected = new Set(selectedValues());
+                    if (reset) results.empty();
+                    data.results
+                        .filter(name => !selected.has(name))
+                        .forEach(name => results.append(checkbox(name, inputName, false)));
+                    offset += data.results.length;
+                    more.toggleClass('d-none', !data.has_more);
+                    status.text(offset || selected.size ? '' : 'Ничего не найдено');
+                    loaded = true;
+                });
+        }
+
+        menu.closest('.dropdown').on('show.bs.dropdown', () => {
+            if (!loaded) load(true);
+        });
+        menu.find('.product-search').on('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(() => {
+                query = this.value.trim();
+                load(true);
+            }, SEARCH_DELAY);
+        });
+        more.on('click', () => load(false));
+        // Отмеченный товар переносится к выбранным, чтобы не пропасть при следующем поиске
+        results.on('change', '.product-checkbox', function () {
+            if (this.checked) selectedList.append($(this).closest('.form-check'));
+        });
+    }
+
+    window.ProductFilter = {init};
+})(window, jQuery);